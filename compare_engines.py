@@ -0,0 +1,462 @@
+import argparse
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+from math import cos, sin, pi
+
+import roofeus.models as rfsm
+import roofeus.roofeus as rfs
+import roofeus.cache_optimizer as rfsc
+import roofeus.utils as rfsu
+from roofeus.mesh_arrays import create_mesh_arrays
+from roofeus.instancing import create_instanced_mesh, expand_instances
+from roofeus.template_generator import generate_template
+
+
+#######################################################################
+# Run this file to compare the roofeus engines with the reference one #
+#######################################################################
+
+
+class MeshSnapshot:
+    """
+    Engine output reduced to the geometry that would be created: vertex used by the faces (target vertex included)
+    and faces with 3 or more vertex
+    """
+    def __init__(self, positions, uvs, faces):
+        self.positions = positions  # (x, y, z)[]
+        self.uvs = uvs  # (u, v)[]
+        self.faces = faces  # int[][] - rows of positions and uvs
+
+
+def snapshot_from_lists(vertex_list, faces, target):
+    """
+    Snapshot of a create_mesh output
+    :param vertex_list: RFVertexData[] - output vertex
+    :param faces: int[][] - output faces (negative indices are target vertex)
+    :param target: RFTargetVertex[] - target face
+    :return: MeshSnapshot
+    """
+    rows = {}
+    positions = []
+    uvs = []
+    snapshot_faces = []
+    for face in [f for f in faces if len(f) >= 3]:
+        snapshot_face = []
+        for i in face:
+            if i not in rows:
+                rows[i] = len(positions)
+                if i >= 0:
+                    positions.append(tuple(vertex_list[i].coords_3d))
+                    uvs.append(tuple(vertex_list[i].coords_2d))
+                else:
+                    positions.append(tuple(target[-1 - i].coords))
+                    uvs.append(tuple(target[-1 - i].uvs))
+            snapshot_face.append(rows[i])
+        snapshot_faces.append(snapshot_face)
+    return MeshSnapshot(positions, uvs, snapshot_faces)
+
+
+def snapshot_from_arrays(arrays):
+    """
+    Snapshot of a create_mesh_arrays output
+    :param arrays: RFMeshArrays
+    :return: MeshSnapshot
+    """
+    faces = [arrays.face_indices[arrays.face_offsets[k]:arrays.face_offsets[k + 1]].tolist()
+             for k in range(0, len(arrays.face_offsets) - 1)]
+    positions = arrays.positions.tolist()
+    uvs = arrays.uvs.tolist()
+    rows = {}
+    snapshot_faces = []
+    for face in [f for f in faces if len(f) >= 3]:
+        snapshot_faces.append([rows.setdefault(i, len(rows)) for i in face])
+    used = sorted(rows, key=rows.get)
+    return MeshSnapshot([tuple(positions[i]) for i in used], [tuple(uvs[i]) for i in used], snapshot_faces)
+
+
+def snapshot_from_instanced(instanced, target, weld_tolerance=1e-4):
+    """
+    Snapshot of a create_instanced_mesh output, with the instances expanded. The instance vertex are welded with the
+    vertex in the same position and uv, because the tile vertex are repeated in every instance
+    :param instanced: RFInstancedMesh
+    :param target: RFTargetVertex[] - target face
+    :param weld_tolerance: size of the weld grid
+    :return: MeshSnapshot
+    """
+    snapshot = snapshot_from_lists(instanced.vertex_list, instanced.faces, target)
+    rows = {tuple([round(c / weld_tolerance) for c in snapshot.positions[row] + snapshot.uvs[row]]): row
+            for row in range(0, len(snapshot.positions))}
+    positions, uvs, faces = expand_instances(instanced)
+    positions = [tuple(p) for p in positions.tolist()]
+    uvs = [tuple(uv) for uv in uvs.tolist()]
+    instance_rows = []
+    for position, uv in zip(positions, uvs):
+        key = tuple([round(c / weld_tolerance) for c in position + uv])
+        if key not in rows:
+            # Values near a rounding limit can fall in the next key
+            near = [tuple([k + o for k, o in zip(key, offset)]) for offset in product((-1, 0, 1), repeat=len(key))]
+            rows[key] = next((rows[k] for k in near if k in rows), len(snapshot.positions))
+            if rows[key] == len(snapshot.positions):
+                snapshot.positions.append(position)
+                snapshot.uvs.append(uv)
+        instance_rows.append(rows[key])
+    snapshot.faces.extend([[instance_rows[i] for i in face] for face in faces])
+    return snapshot
+
+
+def run_cache_optimizer(template, target, fill_uncompleted):
+    vertex_list, faces, bounding_edge_list = rfs.create_mesh(template, target, fill_uncompleted)
+    vertex_list, faces, _bounding_edge_list, _acmr_before, _acmr_after = \
+        rfsc.optimize_vertex_cache(vertex_list, faces, bounding_edge_list)
+    return vertex_list, faces
+
+
+REFERENCE = (lambda template, target, fill: rfs.create_mesh(template, target, fill),
+             lambda output, target: snapshot_from_lists(output[0], output[1], target))
+
+# name: (run(template, target, fill_uncompleted), snapshot(run output, target))
+ENGINES = {
+    'arrays': (create_mesh_arrays,
+               lambda output, target: snapshot_from_arrays(output)),
+    'cache-optimizer': (run_cache_optimizer,
+                        lambda output, target: snapshot_from_lists(output[0], output[1], target)),
+    'vectorized': (lambda template, target, fill: rfs.create_mesh(template, target, fill, vectorized=True),
+                   lambda output, target: snapshot_from_lists(output[0], output[1], target)),
+    'instanced': (create_instanced_mesh, snapshot_from_instanced),
+}
+
+
+def grid_template(n, row_shift=0.0):
+    """
+    Template of n x n squares split in 2 triangles. Its vertex are over the cell borders
+    """
+    template = rfsm.RFTemplate()
+    template.row_shift = row_shift
+    for j in range(0, n):
+        for i in range(0, n):
+            template.vertex.append(rfsm.RFTemplateVertex(i / n, j / n))
+    template.calculate_ids()
+    cell_vertex = {
+        (0, 0): lambda v: v,
+        (1, 0): template.get_vertex_right,
+        (0, 1): template.get_vertex_bottom,
+        (1, 1): template.get_vertex_diag_cell,
+    }
+
+    def corner(i, j):
+        return cell_vertex[(i // n, j // n)](template.vertex[(j % n) * n + i % n])
+
+    for j in range(0, n):
+        for i in range(0, n):
+            a, b, c, d = corner(i, j), corner(i + 1, j), corner(i + 1, j + 1), corner(i, j + 1)
+            template.faces.append(rfsm.RFTemplateFace(a, b, c))
+            template.faces.append(rfsm.RFTemplateFace(a, c, d))
+    return template
+
+
+def random_template(rng):
+    heightmap = [[rng.random() for _ in range(0, 8)] for _ in range(0, 8)]
+    return generate_template(heightmap, rng.randint(4, 24), sample_resolution=16)
+
+
+def shifted_template(template, row_shift):
+    """
+    Copy of a template whose rows of cells are displaced row_shift from the previous one
+    """
+    template.row_shift = row_shift
+    return rfsu.copy_template(template)
+
+
+def create_target(uvs, rng):
+    """
+    Creates a target from its UVs, with 3d coords from a random linear transformation
+    """
+    m = [[rng.uniform(-2, 2) for _ in range(0, 3)] for _ in range(0, 2)]
+    target_context = rfsm.RFTargetContext()
+    return [target_context.create_vertex(*[u * m[0][k] + v * m[1][k] for k in range(0, 3)], u, v) for u, v in uvs]
+
+
+def random_polygon(rng, radius):
+    n = rng.randint(3, 6)
+    cx, cy = rng.uniform(-3, 3), rng.uniform(-3, 3)
+    angles = sorted([rng.uniform(0, 2 * pi) for _ in range(0, n)])
+    if rng.random() < 0.5:
+        angles.reverse()  # Clockwise targets
+    return [(cx + radius * cos(a), cy + radius * sin(a)) for a in angles]
+
+
+def star_polygon(rng, radius):
+    """
+    Star-shaped n-gon: its corners alternate between the outer radius and an inner one, so every inner corner is
+    reflex
+    """
+    n = rng.randint(3, 6) * 2
+    cx, cy = rng.uniform(-3, 3), rng.uniform(-3, 3)
+    inner = radius * rng.uniform(0.3, 0.7)
+    start = rng.uniform(0, 2 * pi)
+    direction = rng.choice([-1, 1])  # Clockwise or counter-clockwise
+    return [(cx + (radius if k % 2 == 0 else inner) * cos(start + direction * 2 * pi * k / n),
+             cy + (radius if k % 2 == 0 else inner) * sin(start + direction * 2 * pi * k / n)) for k in range(0, n)]
+
+
+def adversarial_uvs(rng, template):
+    """
+    Returns an adversarial target UV list and its description
+    """
+    kind = rng.choice(['integer corners', 'template vertex corners', 'degenerate', 'sliver', 'large', 'concave',
+                       'star'])
+    if kind == 'integer corners':
+        x, y = rng.randint(-3, 3), rng.randint(-3, 3)
+        w, h = rng.randint(1, 3), rng.randint(1, 3)
+        uvs = [(x, y), (x, y + h), (x + w, y + h), (x + w, y)][:rng.choice([3, 4])]
+    elif kind == 'template vertex corners':
+        v = [rng.choice(template.visible_vertex()).coords for _ in range(0, 3)]
+        size = rng.randint(1, 3)
+        uvs = [(v[0][0], v[0][1]), (v[1][0] + size, v[1][1]), (v[2][0] + size, v[2][1] + size)]
+    elif kind == 'degenerate':
+        x, y = rng.uniform(-2, 2), rng.uniform(-2, 2)
+        if rng.random() < 0.5:
+            uvs = [(x, y), (x + 1, y + 1), (x + 2, y + 2)]  # Aligned
+        else:
+            uvs = [(x, y), (x, y), (x + 1, y + 2)]  # Repeated corner
+    elif kind == 'sliver':
+        x, y = rng.uniform(-2, 2), rng.uniform(-2, 2)
+        uvs = [(x, y), (x + 3, y + 0.001), (x + 3, y - 0.001)]
+    elif kind == 'concave':
+        # One corner pulled towards the center makes it reflex
+        uvs = random_polygon(rng, rng.uniform(1, 4))
+        while len(uvs) < 4:
+            uvs = random_polygon(rng, rng.uniform(1, 4))
+        cx, cy = sum([uv[0] for uv in uvs]) / len(uvs), sum([uv[1] for uv in uvs]) / len(uvs)
+        k, pull = rng.randrange(0, len(uvs)), rng.uniform(0.1, 0.4)
+        uvs[k] = (cx + (uvs[k][0] - cx) * pull, cy + (uvs[k][1] - cy) * pull)
+    elif kind == 'star':
+        uvs = star_polygon(rng, rng.uniform(1, 4))
+    else:
+        uvs = random_polygon(rng, 6)
+    return uvs, kind
+
+
+def generate_cases(count, seed):
+    """
+    Generates random and adversarial templates and targets
+    :param count: number of cases
+    :param seed: random seed
+    :return: (description, template, uvs, target seed)[]
+    """
+    rng = random.Random(seed)
+    cases = []
+    for k in range(0, count):
+        if rng.random() < 0.3:
+            template, template_text = grid_template(rng.randint(1, 4)), 'grid template'
+        elif rng.random() < 0.2:
+            row_shift = rng.choice([0.5, 0.25, 1 / 3])
+            template, template_text = grid_template(1, row_shift), f'grid template shifted {row_shift:.2f}'
+        elif rng.random() < 0.2:
+            row_shift = rng.choice([0.5, 0.25, 1 / 3])
+            template = shifted_template(random_template(rng), row_shift)
+            template_text = f'random template shifted {row_shift:.2f}'
+        else:
+            template, template_text = random_template(rng), 'random template'
+        if rng.random() < 0.5:
+            uvs, target_text = adversarial_uvs(rng, template)
+        else:
+            uvs, target_text = random_polygon(rng, rng.uniform(0.2, 3)), 'random target'
+        cases.append((f"{template_text}, {target_text}", template, uvs, rng.random()))
+    return cases
+
+
+def vertex_key(mesh, row, tolerance):
+    return tuple([round(c / tolerance) for c in mesh.positions[row] + mesh.uvs[row]])
+
+
+def match_vertex(reference, snapshot, tolerance):
+    """
+    Pairs the vertex of two snapshots with the same position and uv (up to the tolerance)
+    :return: {snapshot row: reference row}
+    """
+    def key(row, mesh):
+        return vertex_key(mesh, row, tolerance)
+
+    reference_rows = {}
+    for row in range(0, len(reference.positions)):
+        reference_rows.setdefault(key(row, reference), []).append(row)
+
+    matched = {}
+    for row in range(0, len(snapshot.positions)):
+        row_key = key(row, snapshot)
+        # Values near a rounding limit can fall in the next key
+        for offset in product((0, -1, 1), repeat=len(row_key)):
+            candidates = reference_rows.get(tuple([k + o for k, o in zip(row_key, offset)]))
+            if candidates:
+                matched[row] = candidates.pop()
+                break
+    return matched
+
+
+def compare(reference, snapshot, target, tolerance):
+    """
+    Compares the output of an engine with the reference one
+    :param reference: MeshSnapshot - reference output
+    :param snapshot: MeshSnapshot - engine output
+    :param target: RFTargetVertex[] - target face
+    :param tolerance: maximum coordinate difference
+    :return: str[] - mismatch descriptions
+    """
+    mismatches = []
+    matched = match_vertex(reference, snapshot, tolerance)
+    missing = len(reference.positions) - len(matched)
+    extra = len(snapshot.positions) - len(matched)
+    if missing or extra:
+        mismatches.append(f"vertex: {missing} missing, {extra} extra")
+
+    # Faces are compared by the position of their vertex, because the reference can create several vertex in the
+    # same position
+    reference_keys = [vertex_key(reference, row, tolerance) for row in range(0, len(reference.positions))]
+    snapshot_keys = [reference_keys[matched[row]] if row in matched else ('extra', row)
+                     for row in range(0, len(snapshot.positions))]
+    reference_faces = Counter([frozenset([reference_keys[i] for i in f]) for f in reference.faces])
+    snapshot_faces = Counter([frozenset([snapshot_keys[i] for i in f]) for f in snapshot.faces])
+    missing = sum((reference_faces - snapshot_faces).values())
+    extra = sum((snapshot_faces - reference_faces).values())
+    if missing or extra:
+        mismatches.append(f"faces: {missing} missing, {extra} extra")
+
+    def on_border(uv):
+        for i in range(0, len(target)):
+            a, b = target[i].uvs, target[(i + 1) % len(target)].uvs
+            edge = (b[0] - a[0], b[1] - a[1])
+            length = (edge[0] ** 2 + edge[1] ** 2) ** 0.5
+            if length > 0 and abs(edge[0] * (uv[1] - a[1]) - edge[1] * (uv[0] - a[0])) / length < tolerance:
+                return True
+        return False
+
+    reference_border = Counter([reference_keys[r] for r in range(0, len(reference.uvs)) if on_border(reference.uvs[r])])
+    snapshot_border = Counter([snapshot_keys[r] for r in range(0, len(snapshot.uvs)) if on_border(snapshot.uvs[r])])
+    if reference_border != snapshot_border:
+        mismatches.append(f"border vertex: {sum((reference_border - snapshot_border).values())} missing, "
+                          f"{sum((snapshot_border - reference_border).values())} extra")
+    return mismatches
+
+
+def run_engine(engine, template, target, fill_uncompleted):
+    """
+    Runs an engine
+    :return: snapshot (None if it failed), error text, seconds
+    """
+    run, snapshot = engine
+    start = time.perf_counter()
+    try:
+        output = run(template, target, fill_uncompleted)
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    return snapshot(output, target), None, elapsed
+
+
+def compare_engines(engine_names, cases, fill_modes, tolerance):
+    """
+    Runs every case with the reference and the engines, and prints the mismatches and speedups
+    :return: number of mismatches
+    """
+    total_mismatches = 0
+    for name in engine_names:
+        reference_time = 0
+        engine_time = 0
+        mismatch_count = 0
+        for case_index, (description, template, uvs, target_seed) in enumerate(cases):
+            for fill_uncompleted in fill_modes:
+                target = create_target(uvs, random.Random(target_seed))
+                reference, reference_error, elapsed = run_engine(REFERENCE, template, target, fill_uncompleted)
+                reference_time += elapsed
+                snapshot, engine_error, elapsed = run_engine(ENGINES[name], template, target, fill_uncompleted)
+                engine_time += elapsed
+
+                if reference_error or engine_error:
+                    # Both must fail on the same cases
+                    mismatches = [] if reference_error and engine_error else \
+                        [f"reference error: {reference_error}, engine error: {engine_error}"]
+                else:
+                    mismatches = compare(reference, snapshot, target, tolerance)
+                for mismatch in mismatches:
+                    print(f"  {name} case {case_index} ({description}, fill {fill_uncompleted}): {mismatch}")
+                mismatch_count += len(mismatches)
+
+        speedup = reference_time / engine_time if engine_time > 0 else 0
+        print(f"{name}: {len(cases) * len(fill_modes)} runs, {mismatch_count} mismatches, "
+              f"reference {reference_time:.2f}s, engine {engine_time:.2f}s, speedup {speedup:.2f}x")
+        total_mismatches += mismatch_count
+    return total_mismatches
+
+
+def output_signature(output):
+    """
+    Exact description of a create_mesh output (vertex ids and data, faces and bounding edges), to compare runs
+    """
+    vertex_list, faces, bounding_edge_list = output
+    return [(v.index, tuple(v.coords_2d), tuple(v.coords_3d), v.inside) for v in vertex_list], faces, \
+        bounding_edge_list
+
+
+def check_concurrent_generation(cases, fill_modes, workers):
+    """
+    Runs every case from several threads at the same time and checks that the outputs are the same than the
+    sequential ones, and that the faces use the ids of their own target vertex (-1 to -len(target))
+    :return: number of mismatches
+    """
+    runs = []
+    for case_index, (description, template, uvs, target_seed) in enumerate(cases):
+        for fill_uncompleted in fill_modes:
+            runs.append((case_index, description, template, create_target(uvs, random.Random(target_seed)),
+                         fill_uncompleted))
+
+    def generate(run):
+        _case_index, _description, template, target, fill_uncompleted = run
+        try:
+            return output_signature(rfs.create_mesh(template, target, fill_uncompleted))
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+
+    sequential = [generate(run) for run in runs]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        concurrent = list(executor.map(generate, runs))
+
+    mismatches = 0
+    for (case_index, description, _template, target, fill_uncompleted), expected, output in \
+            zip(runs, sequential, concurrent):
+        errors = []
+        if output != expected:
+            errors.append("output differs from the sequential one")
+        if not isinstance(output, str):
+            target_ids = set([i for face in output[1] for i in face if i < 0])
+            if not target_ids <= set(range(-len(target), 0)):
+                errors.append(f"target ids {sorted(target_ids)} out of the target")
+        for error in errors:
+            print(f"  concurrent case {case_index} ({description}, fill {fill_uncompleted}): {error}")
+        mismatches += len(errors)
+    print(f"concurrent: {len(runs)} runs in {workers} threads, {mismatches} mismatches")
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compares the roofeus engines with the reference create_mesh.')
+    parser.add_argument("-e", "--engine", action="append", choices=list(ENGINES.keys()),
+                        help="Engine to compare (all if not set)")
+    parser.add_argument("-n", "--cases", type=int, default=100, help="Number of generated cases")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("-f", "--fill", action="append", choices=['border', 'vertex', 'none'],
+                        help="Fill mode (all if not set)")
+    parser.add_argument("-t", "--tolerance", type=float, default=1e-4, help="Maximum coordinate difference")
+    parser.add_argument("-w", "--workers", type=int, default=4,
+                        help="Threads of the concurrent generation check (0 to skip it)")
+    args = parser.parse_args()
+
+    all_cases = generate_cases(args.cases, args.seed)
+    errors = compare_engines(args.engine or list(ENGINES.keys()), all_cases, args.fill or ['border', 'vertex', 'none'],
+                             args.tolerance)
+    if args.workers > 0:
+        errors += check_concurrent_generation(all_cases, args.fill or ['border', 'vertex', 'none'], args.workers)
+    exit(1 if errors else 0)
@@ -0,0 +1,39 @@
+import argparse
+import matplotlib.image as mpimg
+
+from roofeus.template_generator import generate_template
+from roofeus.utils import write_template
+
+
+##############################################################
+# Run this file to create a template from a displacement map #
+##############################################################
+
+
+def read_heightmap(image_file):
+    """
+    Reads a displacement image as heights between 0 and 1
+    :param image_file: image filename
+    :return: float[row][column]
+    """
+    image = mpimg.imread(image_file)
+    if image.dtype.kind in 'ui':
+        image = image / float(255 if image.dtype.itemsize == 1 else 65535)
+    if image.ndim == 3:
+        image = image[..., :3].mean(axis=2)
+    return image.tolist()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Creates a template from a displacement map.')
+    parser.add_argument("image_file", help="Displacement image file")
+    parser.add_argument("template_file", help="Output template file")
+    parser.add_argument("-v", "--max_vertex", type=int, default=256, help="Vertex budget")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.0,
+                        help="Stops when every error is under this value (heights between 0 and 1)")
+    parser.add_argument("-r", "--resolution", type=int, default=64, help="Error sample resolution")
+    args = parser.parse_args()
+
+    template = generate_template(read_heightmap(args.image_file), args.max_vertex, args.tolerance, args.resolution)
+    write_template(args.template_file, template)
+    print(f"{len(template.visible_vertex())} vertex, {len(template.faces)} faces")
@@ -0,0 +1,496 @@
+from collections import Counter
+from functools import wraps
+
+from mathutils import Vector
+
+
+#################################################################################
+# Minimal stand-in of Blender's bmesh module, to run the add-on without Blender #
+#################################################################################
+# Only the API used by the add-on is implemented. Every function decorated with counted adds a call to calls.
+
+
+calls = Counter()  # function name: call count
+
+
+def counted(name):
+    """
+    Decorator that counts the calls of a function in calls
+    :param name: counter name
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class BMLayerItem:
+    """
+    Custom data layer
+    """
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind  # 'int', 'float', 'string' or 'uv'
+
+    def __repr__(self):
+        return f"<BMLayerItem {self.kind} '{self.name}'>"
+
+
+class BMLayerCollection:
+    """
+    Layers of one type of an element sequence (bm.verts.layers.int, bm.loops.layers.uv...)
+    """
+    defaults = {'int': 0, 'float': 0.0, 'string': b''}
+
+    def __init__(self, kind):
+        self.kind = kind
+        self._layers = {}  # name: BMLayerItem
+
+    @counted("layers.new")
+    def new(self, name=None):
+        name = name or ("UVMap" if self.kind == 'uv' else self.kind)
+        if name in self._layers:
+            raise ValueError(f"layers.new(): layer '{name}' already exists")
+        self._layers[name] = BMLayerItem(name, self.kind)
+        return self._layers[name]
+
+    def get(self, name, default=None):
+        return self._layers.get(name, default)
+
+    @counted("layers.verify")
+    def verify(self):
+        """
+        Gets the active layer, creating it if there is none
+        """
+        return self.active or self.new()
+
+    def remove(self, layer):
+        del self._layers[layer.name]
+
+    @property
+    def active(self):
+        return next(iter(self._layers.values()), None)
+
+    def keys(self):
+        return self._layers.keys()
+
+    def values(self):
+        return self._layers.values()
+
+    def items(self):
+        return self._layers.items()
+
+    def __getitem__(self, name):
+        return self._layers[name]
+
+    def __contains__(self, name):
+        return name in self._layers
+
+    def __iter__(self):
+        return iter(self._layers.values())
+
+    def __len__(self):
+        return len(self._layers)
+
+
+class BMLayerAccess:
+    """
+    Layer collections of an element sequence
+    """
+    def __init__(self, kinds):
+        for kind in kinds:
+            setattr(self, kind, BMLayerCollection(kind))
+
+
+class BMLoopUV:
+    """
+    Uv of a loop in a uv layer
+    """
+    def __init__(self):
+        self._uv = Vector((0.0, 0.0))
+        self.select = False
+        self.pin_uv = False
+
+    @property
+    def uv(self):
+        return self._uv
+
+    @uv.setter
+    def uv(self, value):
+        self._uv = Vector(value)
+
+
+class BMElem:
+    """
+    Mesh element with selection, visibility and custom layer data (element[layer])
+    """
+    def __init__(self):
+        self.index = -1
+        self.select = False
+        self.hide = False
+        self.tag = False
+        self._data = {}  # BMLayerItem: value
+        self._valid = True
+
+    @property
+    def is_valid(self):
+        return self._valid
+
+    def __getitem__(self, layer):
+        if layer.kind == 'uv':
+            return self._data.setdefault(layer, BMLoopUV())
+        return self._data.get(layer, BMLayerCollection.defaults[layer.kind])
+
+    def __setitem__(self, layer, value):
+        if layer.kind == 'uv':
+            raise TypeError("uv layer data can't be assigned, set its uv attribute")
+        self._data[layer] = value
+
+    def select_set(self, select):
+        self.select = select
+
+    def hide_set(self, hide):
+        self.hide = hide
+
+
+class BMVert(BMElem):
+    def __init__(self, co):
+        BMElem.__init__(self)
+        self.co = Vector(co)
+        self.link_edges = []
+        self.link_faces = []
+        self.link_loops = []
+
+    @property
+    def normal(self):
+        """
+        Average of the normals of the linked faces
+        """
+        return sum([f.normal for f in self.link_faces], Vector()).normalized()
+
+    def __repr__(self):
+        return f"<BMVert {self.index} {self.co!r}>"
+
+
+class BMEdge(BMElem):
+    def __init__(self, verts):
+        BMElem.__init__(self)
+        self.verts = tuple(verts)
+        self.link_faces = []
+        self.smooth = True
+        self.seam = False
+
+    def other_vert(self, vert):
+        return self.verts[1] if vert is self.verts[0] else self.verts[0] if vert is self.verts[1] else None
+
+
+class BMLoop(BMElem):
+    def __init__(self, vert, edge, face):
+        BMElem.__init__(self)
+        self.vert = vert
+        self.edge = edge
+        self.face = face
+        self.link_loop_next = None
+        self.link_loop_prev = None
+
+
+class BMFace(BMElem):
+    def __init__(self, verts, edges):
+        BMElem.__init__(self)
+        self.verts = tuple(verts)
+        self.edges = tuple(edges)
+        self.loops = [BMLoop(v, e, self) for v, e in zip(self.verts, self.edges)]
+        for i, loop in enumerate(self.loops):
+            loop.link_loop_next = self.loops[(i + 1) % len(self.loops)]
+            loop.link_loop_prev = self.loops[i - 1]
+        self.material_index = 0
+        self.smooth = False
+        self.normal = Vector()
+        self.normal_update()
+
+    def normal_update(self):
+        """
+        Newell normal of the face
+        """
+        self.normal = self._newell().normalized()
+
+    def _newell(self):
+        x, y, z = 0.0, 0.0, 0.0
+        coords = [tuple(v.co) for v in self.verts]
+        for (ax, ay, az), (bx, by, bz) in zip(coords, coords[1:] + coords[:1]):
+            x += (ay - by) * (az + bz)
+            y += (az - bz) * (ax + bx)
+            z += (ax - bx) * (ay + by)
+        return Vector((x, y, z))
+
+    def calc_center_median(self):
+        return sum([v.co for v in self.verts], Vector()) / len(self.verts)
+
+    def calc_area(self):
+        return self._newell().length / 2
+
+    def __repr__(self):
+        return f"<BMFace {self.index} ({len(self.verts)} verts)>"
+
+
+class BMElemSeq:
+    """
+    Sequence of the valid elements of a type
+    """
+    layer_kinds = ()
+
+    def __init__(self, bm):
+        self.bm = bm
+        self._elems = []
+        self.layers = BMLayerAccess(self.layer_kinds)
+
+    def __iter__(self):
+        return iter(self._elems)
+
+    def __len__(self):
+        return len(self._elems)
+
+    def __getitem__(self, index):
+        return self._elems[index]
+
+    def index_update(self):
+        for i, elem in enumerate(self._elems):
+            elem.index = i
+
+    def ensure_lookup_table(self):
+        pass
+
+    def _purge(self):
+        self._elems = [elem for elem in self._elems if elem.is_valid]
+
+
+class BMVertSeq(BMElemSeq):
+    layer_kinds = ('int', 'float', 'string')
+
+    @counted("bm.verts.new")
+    def new(self, co=(0.0, 0.0, 0.0), example=None):
+        vert = BMVert(co)
+        self._elems.append(vert)
+        return vert
+
+    def remove(self, vert):
+        self.bm._kill_verts([vert])
+        self._purge()
+
+
+class BMEdgeSeq(BMElemSeq):
+    layer_kinds = ('int', 'float', 'string')
+
+    def __init__(self, bm):
+        BMElemSeq.__init__(self, bm)
+        self._lookup = {}  # frozenset(vert): edge
+
+    def get(self, verts, fallback=None):
+        return self._lookup.get(frozenset(verts), fallback)
+
+    @counted("bm.edges.new")
+    def new(self, verts, example=None):
+        if self.get(verts) is not None:
+            raise ValueError("edges.new(): this edge exists")
+        return self._create(verts)
+
+    def _create(self, verts):
+        edge = BMEdge(verts)
+        for v in verts:
+            v.link_edges.append(edge)
+        self._lookup[frozenset(verts)] = edge
+        self._elems.append(edge)
+        return edge
+
+
+class BMFaceSeq(BMElemSeq):
+    layer_kinds = ('int', 'float', 'string')
+
+    def __init__(self, bm):
+        BMElemSeq.__init__(self, bm)
+        self._lookup = {}  # frozenset(vert): face
+        self.active = None
+
+    def get(self, verts, fallback=None):
+        return self._lookup.get(frozenset(verts), fallback)
+
+    @counted("bm.faces.new")
+    def new(self, verts, example=None):
+        verts = list(verts)
+        if len(verts) < 3:
+            raise ValueError("faces.new(verts): sequence too short")
+        if len(set(verts)) != len(verts):
+            raise ValueError("faces.new(verts): found the same (BMVert) used multiple times")
+        if self.get(verts) is not None:
+            raise ValueError("faces.new(verts): face already exists")
+        return self._create(verts)
+
+    def _create(self, verts):
+        edges = [self.bm.edges.get((a, b)) or self.bm.edges._create((a, b))
+                 for a, b in zip(verts, verts[1:] + verts[:1])]
+        face = BMFace(verts, edges)
+        for v in verts:
+            v.link_faces.append(face)
+        for loop in face.loops:
+            loop.vert.link_loops.append(loop)
+        for e in edges:
+            e.link_faces.append(face)
+        self._lookup[frozenset(verts)] = face
+        self._elems.append(face)
+        return face
+
+
+class BMLoopSeq:
+    """
+    Loops can't be iterated from the mesh, only their layers are accessible
+    """
+    def __init__(self):
+        self.layers = BMLayerAccess(('int', 'float', 'string', 'uv'))
+
+
+class BMesh:
+    def __init__(self):
+        self.verts = BMVertSeq(self)
+        self.edges = BMEdgeSeq(self)
+        self.faces = BMFaceSeq(self)
+        self.loops = BMLoopSeq()
+        self.select_mode = {'VERT'}
+        self.is_valid = True
+
+    @counted("bm.select_flush_mode")
+    def select_flush_mode(self):
+        """
+        Selects the vertex and edges of the selected faces
+        """
+        for face in self.faces:
+            if face.select:
+                for elem in face.verts + face.edges:
+                    elem.select = True
+
+    @counted("bm.select_flush")
+    def select_flush(self, select):
+        for face in self.faces:
+            if all([v.select for v in face.verts]) == select:
+                face.select = select
+
+    @counted("bm.normal_update")
+    def normal_update(self):
+        for face in self.faces:
+            face.normal_update()
+
+    def free(self):
+        self.is_valid = False
+
+    def _kill_faces(self, faces):
+        for face in faces:
+            if not face.is_valid:
+                continue
+            face._valid = False
+            del self.faces._lookup[frozenset(face.verts)]
+            for v in face.verts:
+                v.link_faces.remove(face)
+            for loop in face.loops:
+                loop.vert.link_loops.remove(loop)
+            for e in face.edges:
+                e.link_faces.remove(face)
+        self.faces._purge()
+
+    def _kill_edges(self, edges):
+        edges = [e for e in dict.fromkeys(edges) if e.is_valid]  # An edge can be listed by both its vertex
+        self._kill_faces([f for e in edges for f in e.link_faces])
+        for edge in edges:
+            edge._valid = False
+            del self.edges._lookup[frozenset(edge.verts)]
+            for v in edge.verts:
+                v.link_edges.remove(edge)
+        self.edges._purge()
+
+    def _kill_verts(self, verts):
+        verts = [v for v in verts if v.is_valid]
+        self._kill_edges([e for v in verts for e in v.link_edges])
+        for vert in verts:
+            vert._valid = False
+        self.verts._purge()
+
+
+class BMeshOps:
+    """
+    bmesh.ops operators used by the add-on
+    """
+    @staticmethod
+    @counted("bmesh.ops.contextual_create")
+    def contextual_create(bm, geom=(), mat_nr=0, use_smooth=False):
+        """
+        Creates a face with the vertex in geom, in the given order (or an edge for 2 vertex).
+        The existing face with the same vertex is returned instead of creating it again
+        """
+        verts = [elem for elem in geom if isinstance(elem, BMVert)]
+        if len(verts) == 2:
+            edge = bm.edges.get(verts) or bm.edges._create(verts)
+            return {'faces': [], 'edges': [edge]}
+        if len(verts) < 2 or len(set(verts)) != len(verts):
+            raise RuntimeError("contextual_create: Select at least two unique vertices")
+        face = bm.faces.get(verts) or bm.faces._create(verts)
+        face.material_index = mat_nr
+        face.smooth = use_smooth
+        return {'faces': [face], 'edges': list(face.edges)}
+
+    @staticmethod
+    @counted("bmesh.ops.delete")
+    def delete(bm, geom=(), context='VERTS'):
+        """
+        Deletes the elements of geom. Contexts: 'VERTS', 'EDGES', 'FACES_ONLY' and 'FACES'
+        ('FACES' deletes the edges and vertex left without faces too)
+        """
+        geom = list(geom)
+        if context == 'VERTS':
+            bm._kill_verts([e for e in geom if isinstance(e, BMVert)])
+        elif context == 'EDGES':
+            bm._kill_edges([e for e in geom if isinstance(e, BMEdge)])
+        elif context in ('FACES_ONLY', 'FACES'):
+            faces = [e for e in geom if isinstance(e, BMFace)]
+            bm._kill_faces(faces)
+            if context == 'FACES':
+                edges = set([e for f in faces for e in f.edges if e.is_valid and not e.link_faces])
+                bm._kill_edges(list(edges))
+                verts = set([v for e in edges for v in e.verts if v.is_valid and not v.link_edges])
+                bm._kill_verts(list(verts))
+        else:
+            raise ValueError(f"delete: context '{context}' not supported")
+        return {}
+
+    @staticmethod
+    @counted("bmesh.ops.recalc_face_normals")
+    def recalc_face_normals(bm, faces=()):
+        """
+        Updates the normals of the faces. Unlike blender, the face winding is not changed
+        """
+        for face in faces:
+            face.normal_update()
+        return {}
+
+
+ops = BMeshOps()
+
+
+@counted("bmesh.new")
+def new():
+    return BMesh()
+
+
+@counted("bmesh.from_edit_mesh")
+def from_edit_mesh(mesh):
+    """
+    Gets the edit mode mesh of a bpy.types.Mesh
+    """
+    if mesh.edit_bmesh is None:
+        mesh.edit_bmesh = BMesh()
+    return mesh.edit_bmesh
+
+
+@counted("bmesh.update_edit_mesh")
+def update_edit_mesh(mesh, loop_triangles=True, destructive=True):
+    pass
@@ -0,0 +1,407 @@
+import os
+from collections import Counter
+from types import SimpleNamespace
+
+
+###############################################################################
+# Minimal stand-in of Blender's bpy module, to run the add-on without Blender #
+###############################################################################
+# Properties, registration, operators called from bpy.ops, data blocks, draw handlers and the context used by the
+# add-on.
+# bpy.ops calls are counted in calls.
+
+
+calls = Counter()  # operator name: call count
+
+
+class _PropertyDeferred:
+    """
+    Property definition returned by the bpy.props functions. Used as annotation of a property group or operator,
+    and as a descriptor when it is assigned to a class (bpy.types.Scene.roofeus = bpy.props.PointerProperty(...))
+    """
+    def __init__(self, function, keywords):
+        self.function = function
+        self.keywords = keywords
+
+    def default_value(self):
+        if self.function == 'PointerProperty':
+            # Data blocks (ID) are not created, they must be assigned
+            return None if issubclass(self.keywords['type'], ID) else self.keywords['type']()
+        if self.function == 'CollectionProperty':
+            return _PropertyCollection(self.keywords['type'])
+        if 'default' in self.keywords:
+            return self.keywords['default']
+        if self.function == 'EnumProperty':
+            return self.keywords['items'][0][0]
+        return {'BoolProperty': False, 'IntProperty': 0, 'FloatProperty': 0.0, 'StringProperty': "",
+                'FloatVectorProperty': (0.0, 0.0, 0.0)}[self.function]
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        values = instance.__dict__.setdefault('_deferred_values', {})
+        if self not in values:
+            values[self] = self.default_value()
+        return values[self]
+
+    def __set__(self, instance, value):
+        instance.__dict__.setdefault('_deferred_values', {})[self] = value
+
+
+class _PropertyCollection(list):
+    """
+    Value of a CollectionProperty
+    """
+    def __init__(self, item_type):
+        list.__init__(self)
+        self.item_type = item_type
+
+    def add(self):
+        self.append(self.item_type())
+        return self[-1]
+
+    def remove(self, index):
+        del self[index]
+
+    def clear(self):
+        del self[:]
+
+
+def _deferred(function):
+    def create(**keywords):
+        return _PropertyDeferred(function, keywords)
+    create.__name__ = function
+    return create
+
+
+props = SimpleNamespace(**{name: _deferred(name) for name in
+                           ['BoolProperty', 'IntProperty', 'FloatProperty', 'StringProperty', 'EnumProperty',
+                            'FloatVectorProperty', 'PointerProperty', 'CollectionProperty']})
+
+
+class bpy_struct:
+    """
+    Base of the blender types: annotated properties get their default value and custom properties can be set
+    with obj["name"]
+    """
+    def __init__(self):
+        for cls in reversed(type(self).__mro__):
+            for name, prop in cls.__dict__.get('__annotations__', {}).items():
+                if isinstance(prop, _PropertyDeferred):
+                    setattr(self, name, prop.default_value())
+        self._custom_properties = {}
+
+    def __getitem__(self, key):
+        return self._custom_properties[key]
+
+    def __setitem__(self, key, value):
+        self._custom_properties[key] = value
+
+    def __delitem__(self, key):
+        del self._custom_properties[key]
+
+    def __contains__(self, key):
+        return key in self._custom_properties
+
+    def get(self, key, default=None):
+        return self._custom_properties.get(key, default)
+
+    def keys(self):
+        return self._custom_properties.keys()
+
+
+class ID(bpy_struct):
+    def __init__(self, name=""):
+        bpy_struct.__init__(self)
+        self.name = name
+
+
+class _ForeachData:
+    """
+    Flat storage of the values of a collection (vertices, polygons, attribute data...), accessed with foreach_set
+    and foreach_get
+    """
+    def __init__(self, length):
+        self.length = length
+        self.values = {}  # key: float[]
+
+    def __len__(self):
+        return self.length
+
+    def foreach_set(self, key, values):
+        self.values[key] = [v for v in values]
+
+    def foreach_get(self, key, array):
+        array[:] = self.values[key]
+
+
+class _MeshLayers(list):
+    """
+    Uv layers and attributes of a mesh: new() adds a layer whose data has an item for every element of its domain
+    """
+    def __init__(self, mesh):
+        list.__init__(self)
+        self.mesh = mesh
+
+    def new(self, name="UVMap", type='FLOAT2', domain='CORNER'):
+        layer = SimpleNamespace(name=name, data_type=type, domain=domain,
+                                data=_ForeachData(self.mesh.domain_size(domain)))
+        self.append(layer)
+        return layer
+
+    def get(self, name, default=None):
+        return next((layer for layer in self if layer.name == name), default)
+
+
+class Mesh(ID):
+    def __init__(self, name=""):
+        ID.__init__(self, name)
+        self.edit_bmesh = None  # bmesh.BMesh - edit mode mesh, created by bmesh.from_edit_mesh
+        self.vertices = _ForeachData(0)
+        self.polygons = _ForeachData(0)
+        self.loops = _ForeachData(0)
+        self.materials = []
+        self.uv_layers = _MeshLayers(self)
+        self.attributes = _MeshLayers(self)
+
+    def from_pydata(self, vertices, edges, faces):
+        self.vertices = _ForeachData(len(vertices))
+        self.vertices.foreach_set("co", [c for v in vertices for c in v])
+        self.polygons = _ForeachData(len(faces))
+        self.polygons.foreach_set("vertices", [v for f in faces for v in f])
+        self.loops = _ForeachData(sum([len(f) for f in faces]))
+
+    def domain_size(self, domain):
+        return {'POINT': len(self.vertices), 'FACE': len(self.polygons), 'CORNER': len(self.loops)}[domain]
+
+
+class Object(ID):
+    def __init__(self, name="", data=None):
+        ID.__init__(self, name)
+        self.data = data
+        self.parent = None
+        self.mode = 'EDIT'
+        self.matrix_world = [[1.0 if i == j else 0.0 for j in range(0, 4)] for i in range(0, 4)]
+        self.active_material_index = 0
+
+
+class Collection(ID):
+    def __init__(self, name=""):
+        ID.__init__(self, name)
+        self.objects = _LinkedList()
+        self.children = _LinkedList()
+        self.hide_viewport = False
+        self.hide_render = False
+
+
+class Scene(ID):
+    def __init__(self, name=""):
+        ID.__init__(self, name)
+        self.collection = Collection("Scene Collection")
+
+
+class _LinkedList(list):
+    def link(self, item):
+        self.append(item)
+
+    def unlink(self, item):
+        self.remove(item)
+
+
+class _PixelArray(list):
+    def foreach_get(self, array):
+        array[:] = self
+
+    def foreach_set(self, array):
+        self[:] = [float(v) for v in array]
+
+
+class Image(ID):
+    """
+    Image with 4 channels (pixels are RGBA floats, row by row from the bottom)
+    """
+    def __init__(self, name="", width=0, height=0):
+        ID.__init__(self, name)
+        self.size = (width, height)
+        self.channels = 4
+        self.pixels = _PixelArray([0.0] * (width * height * 4))
+
+
+class PropertyGroup(bpy_struct):
+    pass
+
+
+class Panel(bpy_struct):
+    pass
+
+
+class Operator(bpy_struct):
+    def __init__(self):
+        bpy_struct.__init__(self)
+        self.reports = []  # (type set, message)[]
+
+    def report(self, type, message):
+        self.reports.append((type, message))
+        print(f"{'/'.join(sorted(type))}: {message}")
+
+
+class WindowManager(bpy_struct):
+    """
+    Progress and timer calls are accepted and ignored. Modal operators are stored in modal_handlers, and they only
+    receive the events sent by the caller
+    """
+    def __init__(self):
+        bpy_struct.__init__(self)
+        self.modal_handlers = []  # Operator[]
+
+    def progress_begin(self, min_value, max_value):
+        pass
+
+    def progress_update(self, value):
+        pass
+
+    def progress_end(self):
+        pass
+
+    def event_timer_add(self, time_step, window=None):
+        return SimpleNamespace(time_step=time_step)
+
+    def event_timer_remove(self, timer):
+        pass
+
+    def modal_handler_add(self, operator):
+        self.modal_handlers.append(operator)
+
+
+class SpaceView3D(bpy_struct):
+    """
+    Stores the draw handlers, which are called by redraw()
+    """
+    draw_handlers = []  # (callback, args)[]
+
+    @classmethod
+    def draw_handler_add(cls, callback, args, region_type, draw_type):
+        handler = (callback, args)
+        cls.draw_handlers.append(handler)
+        return handler
+
+    @classmethod
+    def draw_handler_remove(cls, handler, region_type):
+        cls.draw_handlers.remove(handler)
+
+
+class Area(bpy_struct):
+    def __init__(self):
+        bpy_struct.__init__(self)
+        self.header_text = None
+
+    def header_text_set(self, text):
+        self.header_text = text
+
+    def tag_redraw(self):
+        pass
+
+
+types = SimpleNamespace(bpy_struct=bpy_struct, ID=ID, Mesh=Mesh, Object=Object, Scene=Scene, Image=Image,
+                        Collection=Collection, PropertyGroup=PropertyGroup, Panel=Panel, Operator=Operator,
+                        WindowManager=WindowManager, SpaceView3D=SpaceView3D, Area=Area)
+
+
+class _DataCollection(list):
+    def __init__(self, item_type):
+        list.__init__(self)
+        self.item_type = item_type
+
+    def new(self, name, *args):
+        self.append(self.item_type(name, *args))
+        return self[-1]
+
+    def get(self, name, default=None):
+        return next((item for item in self if item.name == name), default)
+
+
+data = SimpleNamespace(filepath="", meshes=_DataCollection(Mesh), objects=_DataCollection(Object),
+                       images=_DataCollection(Image), collections=_DataCollection(Collection))
+context = SimpleNamespace(scene=Scene("Scene"), object=None, window_manager=WindowManager(), window=None,
+                          area=Area())
+app = SimpleNamespace(version=(4, 2, 0))
+
+
+def redraw():
+    """
+    Calls the viewport draw handlers (stand-in only)
+    """
+    for callback, args in list(SpaceView3D.draw_handlers):
+        callback(*args)
+
+_registered = []  # registered classes
+_operators = {}  # bl_idname: operator class
+
+
+def _register_class(cls):
+    _registered.append(cls)
+    if issubclass(cls, Operator):
+        _operators[cls.bl_idname] = cls
+
+
+def _unregister_class(cls):
+    _registered.remove(cls)
+    if issubclass(cls, Operator):
+        del _operators[cls.bl_idname]
+
+
+utils = SimpleNamespace(register_class=_register_class, unregister_class=_unregister_class)
+
+
+def _abspath(path):
+    """
+    Paths starting with // are relative to the blend file (the working directory if there isn't one)
+    """
+    if path.startswith("//"):
+        return os.path.join(os.path.dirname(data.filepath) or os.getcwd(), path[2:])
+    return path
+
+
+path = SimpleNamespace(abspath=_abspath)
+
+
+class _OperatorCall:
+    """
+    bpy.ops.<module>.<name>: runs the registered operator with that bl_idname. Other operators only count the call
+    """
+    def __init__(self, idname):
+        self.idname = idname
+
+    def poll(self):
+        cls = _operators.get(self.idname)
+        return cls is None or not hasattr(cls, 'poll') or cls.poll(context)
+
+    def __call__(self, execution_context='EXEC_DEFAULT', **keywords):
+        calls[f"bpy.ops.{self.idname}"] += 1
+        cls = _operators.get(self.idname)
+        if cls is None:
+            return {'FINISHED'}
+        if not self.poll():
+            raise RuntimeError(f"Operator bpy.ops.{self.idname}.poll() failed, context is incorrect")
+        operator = cls()
+        for name, value in keywords.items():
+            setattr(operator, name, value)
+        if execution_context.startswith('INVOKE') and hasattr(operator, 'invoke'):
+            return operator.invoke(context, SimpleNamespace(type='NONE', value='NOTHING'))
+        return operator.execute(context)
+
+
+class _OperatorModule:
+    def __init__(self, module):
+        self.module = module
+
+    def __getattr__(self, name):
+        return _OperatorCall(f"{self.module}.{name}")
+
+
+class _Operators:
+    def __getattr__(self, module):
+        return _OperatorModule(module)
+
+
+ops = _Operators()
@@ -0,0 +1,57 @@
+from collections import Counter
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+
+#####################################################################################
+# Minimal stand-in of Blender's gpu module, to run the add-on without a GPU context #
+#####################################################################################
+# Nothing is drawn: shader and batch calls are counted in calls.
+
+
+calls = Counter()  # function name: call count
+
+
+class GPUShader:
+    def __init__(self, name):
+        self.name = name
+        self.uniforms = {}  # name: value
+
+    def bind(self):
+        calls["GPUShader.bind"] += 1
+
+    def uniform_float(self, name, value):
+        self.uniforms[name] = value
+
+
+class GPUBatch:
+    """
+    Batch created by gpu_extras.batch.batch_for_shader
+    """
+    def __init__(self, type, content, indices=None):
+        self.type = type
+        self.content = content  # attribute name: values
+        self.indices = indices
+
+    def draw(self, shader):
+        calls["GPUBatch.draw"] += 1
+
+
+def _from_builtin(name):
+    calls["gpu.shader.from_builtin"] += 1
+    return GPUShader(name)
+
+
+shader = SimpleNamespace(from_builtin=_from_builtin)
+
+
+@contextmanager
+def _push_pop():
+    yield
+
+
+def _multiply_matrix(matrix):
+    pass
+
+
+matrix = SimpleNamespace(push_pop=_push_pop, multiply_matrix=_multiply_matrix)
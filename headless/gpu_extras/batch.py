@@ -0,0 +1,6 @@
+import gpu
+
+
+def batch_for_shader(shader, type, content, indices=None):
+    gpu.calls["batch_for_shader"] += 1
+    return gpu.GPUBatch(type, content, indices)
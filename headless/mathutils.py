@@ -0,0 +1,98 @@
+from math import sqrt
+
+
+#########################################################################
+# Minimal stand-in of Blender's mathutils, to run the add-on without it #
+#########################################################################
+
+
+class Vector:
+    """
+    Float vector with the mathutils.Vector operations used by the add-on
+    """
+    def __init__(self, values=(0.0, 0.0, 0.0)):
+        self._values = [float(v) for v in values]
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __getitem__(self, index):
+        return self._values[index]
+
+    def __setitem__(self, index, value):
+        self._values[index] = float(value)
+
+    def __eq__(self, other):
+        return isinstance(other, Vector) and self._values == other._values
+
+    def __repr__(self):
+        return f"Vector(({', '.join(f'{v:.4f}' for v in self._values)}))"
+
+    def __add__(self, other):
+        return Vector([a + b for a, b in zip(self._values, other)])
+
+    def __sub__(self, other):
+        return Vector([a - b for a, b in zip(self._values, other)])
+
+    def __mul__(self, scalar):
+        return Vector([a * scalar for a in self._values])
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, scalar):
+        return Vector([a / scalar for a in self._values])
+
+    def __neg__(self):
+        return Vector([-a for a in self._values])
+
+    @property
+    def x(self):
+        return self._values[0]
+
+    @x.setter
+    def x(self, value):
+        self._values[0] = float(value)
+
+    @property
+    def y(self):
+        return self._values[1]
+
+    @y.setter
+    def y(self, value):
+        self._values[1] = float(value)
+
+    @property
+    def z(self):
+        return self._values[2]
+
+    @z.setter
+    def z(self, value):
+        self._values[2] = float(value)
+
+    @property
+    def length(self):
+        return sqrt(self.dot(self))
+
+    def dot(self, other):
+        return sum([a * b for a, b in zip(self._values, other)])
+
+    def cross(self, other):
+        ax, ay, az = self._values
+        bx, by, bz = other
+        return Vector((ay * bz - az * by, az * bx - ax * bz, ax * by - ay * bx))
+
+    def normalized(self):
+        length = self.length
+        return Vector(self._values) if length == 0 else self / length
+
+    def normalize(self):
+        self._values = self.normalized()._values
+
+    def copy(self):
+        return Vector(self._values)
+
+    def to_tuple(self, precision=-1):
+        return tuple(self._values if precision < 0 else [round(v, precision) for v in self._values])
@@ -17,19 +17,20 @@ def prepare_target():
     Creates a example target face
     :return: list of RFTargetVertex
     """
+    target_context = rfsm.RFTargetContext()
     # size = 2
     # target = [
-    #     rfsm.RFTargetVertex(0, 0, 0, -size, -size),
-    #     rfsm.RFTargetVertex(0, 1, 1, -size, size),
-    #     rfsm.RFTargetVertex(1, 1, 1, size, size),
-    #     rfsm.RFTargetVertex(1, 0, 0, size, -size),
+    #     target_context.create_vertex(0, 0, 0, -size, -size),
+    #     target_context.create_vertex(0, 1, 1, -size, size),
+    #     target_context.create_vertex(1, 1, 1, size, size),
+    #     target_context.create_vertex(1, 0, 0, size, -size),
     # ]
     # target_faces = [[0, 1, 2], [2, 3, 0]]
     size = 2
     target = [
-        rfsm.RFTargetVertex(0, 0, 0, -size, 1-size),
-        rfsm.RFTargetVertex(0, 1, 1, -size, size),
-        rfsm.RFTargetVertex(1, 0.5, 0.5, size, 0.45),
+        target_context.create_vertex(0, 0, 0, -size, 1-size),
+        target_context.create_vertex(0, 1, 1, -size, size),
+        target_context.create_vertex(1, 0.5, 0.5, size, 0.45),
     ]
 
     target_faces = [[0, 1, 2]]
@@ -0,0 +1,167 @@
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import time
+from math import sin, cos, pi
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "headless"))
+
+import bpy
+import bmesh
+import gpu
+import roofeus
+
+
+#################################################################################
+# Run this file to profile the add-on without Blender, with bpy/bmesh stand-ins #
+#################################################################################
+
+
+def create_grid_object(faces_per_side, size, uv_scale):
+    """
+    Creates an object in edit mode with a grid of selected quads, and makes it the context object
+    :param faces_per_side: grid faces in each direction
+    :param size: grid size
+    :param uv_scale: uv size of the grid (template cells along each side)
+    :return: bpy.types.Object
+    """
+    mesh = bpy.data.meshes.new("Grid")
+    obj = bpy.data.objects.new("Grid", mesh)
+    bm = bmesh.from_edit_mesh(mesh)
+    uv_layer = bm.loops.layers.uv.verify()
+
+    step = 1.0 / faces_per_side
+    verts = [[bm.verts.new((x * step * size, y * step * size, 0.0)) for x in range(0, faces_per_side + 1)]
+             for y in range(0, faces_per_side + 1)]
+    for y in range(0, faces_per_side):
+        for x in range(0, faces_per_side):
+            face = bm.faces.new([verts[y][x], verts[y][x + 1], verts[y + 1][x + 1], verts[y + 1][x]])
+            face.select = True
+            for loop in face.loops:
+                loop[uv_layer].uv = (loop.vert.co[0] / size * uv_scale, loop.vert.co[1] / size * uv_scale)
+
+    bpy.context.object = obj
+    return obj
+
+
+def create_wave_image(size):
+    """
+    Creates a displacement image with a wave pattern
+    :param size: image width and height
+    :return: bpy.types.Image
+    """
+    image = bpy.data.images.new("Waves", size, size)
+    pixels = []
+    for y in range(0, size):
+        for x in range(0, size):
+            height = 0.5 + 0.25 * (sin(2 * pi * x / size) + cos(2 * pi * y / size))
+            pixels.extend((height, height, height, 1.0))
+    image.pixels.foreach_set(pixels)
+    return image
+
+
+def run_preview():
+    """
+    Invokes the preview operator, sends it timer events (redrawing the viewport) until every level is drawn, and
+    applies it (Enter is committed by the next timer event)
+    :return: operator result
+    """
+    result = bpy.ops.mesh.roofeus_preview('INVOKE_DEFAULT')
+    if result != {'RUNNING_MODAL'}:
+        return result
+    operator = bpy.context.window_manager.modal_handlers.pop()
+    while operator.level < operator.level_count - 1:
+        time.sleep(0.01)
+        level = operator.level
+        operator.modal(bpy.context, SimpleNamespace(type='TIMER', value='NOTHING'))
+        if operator.level != level:
+            bpy.redraw()
+            print(f"{bpy.context.area.header_text}: {len(operator.lines[1])} edges")
+    result = operator.modal(bpy.context, SimpleNamespace(type='RET', value='PRESS'))
+    while result == {'RUNNING_MODAL'}:
+        result = operator.modal(bpy.context, SimpleNamespace(type='TIMER', value='NOTHING'))
+    return result
+
+
+def move_center_corner(obj):
+    """
+    Runs the Roofeus operator and moves up the original vertex closest to the grid center, so the outputs around it
+    must be regenerated
+    """
+    bpy.ops.mesh.roofeus()
+    bm = bmesh.from_edit_mesh(obj.data)
+    corner_layer = bm.verts.layers.int.get("roofeus_corner")
+    center = sum([v.co[0] for v in bm.verts]) / len(bm.verts)
+    vertex = min([v for v in bm.verts if v[corner_layer] > 0],
+                 key=lambda v: (v.co[0] - center) ** 2 + (v.co[1] - center) ** 2)
+    vertex.co = (vertex.co[0], vertex.co[1], vertex.co[2] + 0.1)
+
+
+def print_counters(title, counters):
+    print(title)
+    for name, count in sorted(counters.items()):
+        print(f"  {name}: {count}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs the Roofeus operator over a grid with bpy/bmesh stand-ins '
+                                                 'and profiles it.')
+    parser.add_argument("template_file", nargs="?", default="images/Template.txt", help="Template file")
+    parser.add_argument("-g", "--grid", type=int, default=4, help="Target faces along each side of the grid")
+    parser.add_argument("-u", "--uv_scale", type=float, default=32.0,
+                        help="Template cells along each side of the grid")
+    parser.add_argument("-f", "--fill", choices=['border', 'vertex', 'none'], default='border', help="Fill mode")
+    parser.add_argument("-q", "--quad_dominant", action="store_true", help="Merges triangles in quads")
+    parser.add_argument("-o", "--optimize_vertex_cache", action="store_true", help="Optimizes the vertex order")
+    parser.add_argument("--reference_faces", action="store_true",
+                        help="Builds the faces with the reference builder instead of the vectorized one")
+    parser.add_argument("-i", "--instanced", action="store_true", help="Instances the interior cells")
+    parser.add_argument("-d", "--displacement", action="store_true", help="Bakes a wave displacement image")
+    parser.add_argument("--fit", choices=['off', 'selection', 'face'], default='off',
+                        help="Scales the UVs to create --fit_vertex_count vertices")
+    parser.add_argument("--fit_vertex_count", type=int, default=10000, help="Vertices created when fitting the UVs")
+    parser.add_argument("-p", "--preview", action="store_true",
+                        help="Runs the preview operator, drawing every level before applying it")
+    parser.add_argument("--regenerate", action="store_true",
+                        help="Profiles the regeneration of the outputs around a moved corner (after a normal run)")
+    parser.add_argument("-r", "--rows", type=int, default=25, help="Profile rows to print")
+    parser.add_argument("--sort", default="cumulative", help="Profile sort key (cumulative, tottime, ncalls...)")
+    args = parser.parse_args()
+
+    roofeus.register()
+    props = bpy.context.scene.roofeus
+    props.template_file = args.template_file
+    props.fill_uncompleted = args.fill
+    props.quad_dominant = args.quad_dominant
+    props.optimize_vertex_cache = args.optimize_vertex_cache
+    props.vectorized_faces = not args.reference_faces
+    props.bake_displacement = args.displacement
+    props.instanced_output = args.instanced
+    props.fit_uv_scale = args.fit
+    props.fit_vertex_count = args.fit_vertex_count
+    props.displacement_image = create_wave_image(64)
+    obj = create_grid_object(args.grid, 2.0, args.uv_scale)
+    if args.regenerate:
+        move_center_corner(obj)
+    bmesh.calls.clear()
+
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    if args.regenerate:
+        result = bpy.ops.mesh.roofeus_regenerate()
+    else:
+        result = run_preview() if args.preview else bpy.ops.mesh.roofeus()
+    profiler.disable()
+    elapsed = time.perf_counter() - start
+
+    bm = bmesh.from_edit_mesh(obj.data)
+    print(f"{result}: {len(bm.verts)} vertices, {len(bm.faces)} faces in {elapsed:.3f}s")
+    print_counters("bpy calls", bpy.calls)
+    print_counters("bmesh calls", bmesh.calls)
+    print_counters("gpu calls", gpu.calls)
+    pstats.Stats(profiler).sort_stats(args.sort).print_stats(args.rows)
+    roofeus.unregister()
@@ -9,7 +9,8 @@ bl_info = {
     "category": "Mesh",
 }
 
-modulesNames = ['roofeus', 'models', 'utils']
+modulesNames = ['roofeus', 'models', 'utils', 'mesh_arrays', 'template_generator', 'cache_optimizer',
+               'mesh_sinks', 'fast_faces', 'displacement', 'instancing']
 bpy_module = util.find_spec("bpy")
 if bpy_module is not None:
     modulesNames.append('roofeus_addon')
@@ -0,0 +1,146 @@
+CACHE_DECAY_POWER = 1.5
+LAST_FACE_SCORE = 0.75
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+
+
+def vertex_score(cache_position, remaining_faces, cache_size):
+    """
+    Score of a vertex (Tom Forsyth, Linear-Speed Vertex Cache Optimisation)
+    :param cache_position: position in the LRU cache (-1 if it isn't in the cache)
+    :param remaining_faces: faces not added yet that use the vertex
+    :param cache_size: cache size
+    :return: score (higher is better)
+    """
+    if remaining_faces == 0:
+        return -1.0
+    score = 0.0
+    if 0 <= cache_position < 3:
+        score = LAST_FACE_SCORE
+    elif cache_position >= 3:
+        score = (1.0 - (cache_position - 3) / (cache_size - 3)) ** CACHE_DECAY_POWER
+    return score + VALENCE_BOOST_SCALE * remaining_faces ** -VALENCE_BOOST_POWER
+
+
+def calculate_acmr(faces, cache_size=32):
+    """
+    Average cache miss ratio: vertex transformed per triangle with a LRU post-transform cache.
+    Faces with n vertex are counted as n - 2 triangles
+    :param faces: int[][] - faces
+    :param cache_size: cache size
+    :return: float
+    """
+    cache = []
+    misses = 0
+    triangles = 0
+    for face in faces:
+        if len(face) < 3:
+            continue
+        triangles += len(face) - 2
+        for v in face:
+            if v in cache:
+                cache.remove(v)
+            else:
+                misses += 1
+            cache.insert(0, v)
+        del cache[cache_size:]
+    return misses / triangles if triangles > 0 else 0.0
+
+
+def optimize_face_order(faces, cache_size=32):
+    """
+    Reorders the faces to reuse the vertex in the post-transform cache (Forsyth algorithm).
+    Faces with less than 3 vertex are moved to the end
+    :param faces: int[][] - faces
+    :param cache_size: simulated cache size
+    :return: int[][] - reordered faces
+    """
+    valid = [i for i in range(0, len(faces)) if len(faces[i]) >= 3]
+    vertex_faces = {}  # vertex: face index[] not added yet
+    for fi in valid:
+        for v in faces[fi]:
+            vertex_faces.setdefault(v, []).append(fi)
+
+    cache = []
+    vertex_scores = {v: vertex_score(-1, len(f), cache_size) for v, f in vertex_faces.items()}
+    face_scores = {fi: sum([vertex_scores[v] for v in faces[fi]]) for fi in valid}
+    added = set()
+    order = []
+    next_unadded = 0
+    best = max(valid, key=lambda fi: face_scores[fi]) if valid else None
+
+    while len(order) < len(valid):
+        if best is None:
+            # No candidate in the cache, take the next face not added yet
+            while valid[next_unadded] in added:
+                next_unadded += 1
+            best = valid[next_unadded]
+
+        face = faces[best]
+        order.append(best)
+        added.add(best)
+        del face_scores[best]
+        for v in face:
+            vertex_faces[v].remove(best)
+
+        new_cache = list(face) + [v for v in cache if v not in face]
+        changed = new_cache[:cache_size + len(face)]
+        cache = new_cache[:cache_size]
+
+        candidate_faces = set()
+        for position, v in enumerate(changed):
+            vertex_scores[v] = vertex_score(position if position < cache_size else -1, len(vertex_faces[v]),
+                                            cache_size)
+            candidate_faces.update(vertex_faces[v])
+
+        best = None
+        best_score = -1.0
+        for fi in candidate_faces:
+            score = sum([vertex_scores[v] for v in faces[fi]])
+            face_scores[fi] = score
+            if score > best_score:
+                best = fi
+                best_score = score
+
+    invalid = [faces[i] for i in range(0, len(faces)) if len(faces[i]) < 3]
+    return [faces[fi] for fi in order] + invalid
+
+
+def optimize_vertex_cache(vertex_list, faces, bounding_edge_list, cache_size=32):
+    """
+    Reorders the faces for the post-transform vertex cache and renumbers the vertex in first use order
+    (first by faces, then by bounding edges, then the unused ones). Negative indices (target vertex) are kept.
+    The vertex are renumbered in place: their RFVertexData.index is changed, so indices into the input vertex_list
+    (faces, bounding edges or any other list) are not valid after the call; use the returned lists
+    :param vertex_list: RFVertexData[] - roofeus output vertex
+    :param faces: int[][] - roofeus output faces
+    :param bounding_edge_list: (int, int)[] - bounding edges
+    :param cache_size: simulated cache size
+    :return:
+        vertex_list: reordered vertex
+        faces: reordered faces with the new indices
+        bounding_edge_list: bounding edges with the new indices
+        acmr_before: average cache miss ratio of the input faces
+        acmr_after: average cache miss ratio of the output faces
+    """
+    acmr_before = calculate_acmr(faces, cache_size)
+    faces = optimize_face_order(faces, cache_size)
+
+    remap = {}
+    for v in [v for face in faces for v in face] + [v for edge in bounding_edge_list for v in edge] + \
+            list(range(0, len(vertex_list))):
+        if v >= 0 and v not in remap:
+            remap[v] = len(remap)
+
+    new_vertex_list = [None] * len(vertex_list)
+    for old_index, new_index in remap.items():
+        vertex = vertex_list[old_index]
+        vertex.index = new_index
+        new_vertex_list[new_index] = vertex
+
+    def remap_indices(indices):
+        return [remap[v] if v >= 0 else v for v in indices]
+
+    faces = [remap_indices(face) for face in faces]
+    bounding_edge_list = [tuple(remap_indices(edge)) for edge in bounding_edge_list]
+    return new_vertex_list, faces, bounding_edge_list, acmr_before, calculate_acmr(faces, cache_size)
@@ -0,0 +1,167 @@
+import numpy as np
+
+
+def sample_heights(heightmap, uvs):
+    """
+    Samples a heightmap repeated over the UV space at every point at once, with bilinear interpolation
+    (the same as template_generator.sample_height)
+    :param heightmap: float[rows, columns] - heights (row 0 is y = 0)
+    :param uvs: float[N, 2] - roofeus uv coordinates (1 is the heightmap size)
+    :return: float[N] - heights
+    """
+    heightmap = np.asarray(heightmap, dtype=np.float64)
+    uvs = np.asarray(uvs, dtype=np.float64).reshape(-1, 2)
+    rows, cols = heightmap.shape
+    px = uvs[:, 0] * cols - 0.5
+    py = uvs[:, 1] * rows - 0.5
+    x0 = np.floor(px)
+    y0 = np.floor(py)
+    fx = px - x0
+    fy = py - y0
+    x0 = x0.astype(np.int64)
+    y0 = y0.astype(np.int64)
+    x0, x1 = x0 % cols, (x0 + 1) % cols
+    y0, y1 = y0 % rows, (y0 + 1) % rows
+    top = heightmap[y0, x0] * (1 - fx) + heightmap[y0, x1] * fx
+    bottom = heightmap[y1, x0] * (1 - fx) + heightmap[y1, x1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def face_normal(points):
+    """
+    Unit normal of a polygon (Newell's method). Degenerated polygons have a zero normal
+    :param points: (x, y, z)[] - polygon vertex
+    :return: float[3]
+    """
+    points = np.asarray(points, dtype=np.float64)
+    following = np.roll(points, -1, axis=0)
+    normal = np.array([np.sum((points[:, 1] - following[:, 1]) * (points[:, 2] + following[:, 2])),
+                       np.sum((points[:, 2] - following[:, 2]) * (points[:, 0] + following[:, 0])),
+                       np.sum((points[:, 0] - following[:, 0]) * (points[:, 1] + following[:, 1]))])
+    length = np.linalg.norm(normal)
+    return normal / length if length > 0 else normal
+
+
+def displace_positions(positions, uvs, normals, heightmap, strength=1.0, midlevel=0.5):
+    """
+    Moves every point along its normal (height - midlevel) * strength, like the Displace modifier
+    :param positions: float[N, 3] - points
+    :param uvs: float[N, 2] - roofeus uv coordinates of the points
+    :param normals: float[N, 3] - displacement direction of every point
+    :param heightmap: float[rows, columns] - heights (row 0 is y = 0)
+    :param strength: displacement of a height of 1 over the midlevel
+    :param midlevel: height that is not displaced
+    :return: float[N, 3] - displaced points
+    """
+    offsets = (sample_heights(heightmap, uvs) - midlevel) * strength
+    return np.asarray(positions, dtype=np.float64).reshape(-1, 3) + \
+        np.asarray(normals, dtype=np.float64).reshape(-1, 3) * offsets[:, None]
+
+
+def corner_weights(target_uvs, uvs):
+    """
+    Barycentric weights of points over the target corners. Every point uses the fan triangle (corner 0, k, k + 1) it
+    is most inside of, so a point over a target edge only depends on the two corners of the edge
+    :param target_uvs: float[C, 2] - target uvs
+    :param uvs: float[N, 2] - points
+    :return: float[N, C] (zero for every corner if the target is degenerated)
+    """
+    target_uvs = np.asarray(target_uvs, dtype=np.float64).reshape(-1, 2)
+    uvs = np.asarray(uvs, dtype=np.float64).reshape(-1, 2)
+    weights = np.zeros((len(uvs), len(target_uvs)))
+    best = np.full(len(uvs), -np.inf)
+    for k in range(1, len(target_uvs) - 1):
+        a, b, c = target_uvs[0], target_uvs[k], target_uvs[k + 1]
+        det = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+        if det == 0:
+            continue
+        d = uvs - a
+        wb = (d[:, 0] * (c[1] - a[1]) - d[:, 1] * (c[0] - a[0])) / det
+        wc = ((b[0] - a[0]) * d[:, 1] - (b[1] - a[1]) * d[:, 0]) / det
+        wa = 1 - wb - wc
+        score = np.minimum(np.minimum(wa, wb), wc)
+        better = score > best
+        best[better] = score[better]
+        weights[better] = 0
+        weights[better, 0] = wa[better]
+        weights[better, k] = wb[better]
+        weights[better, k + 1] = wc[better]
+    return weights
+
+
+def on_edges(target_uvs, uvs, edges, tolerance=1e-6):
+    """
+    Checks which points are over some target edges
+    :param target_uvs: float[C, 2] - target uvs
+    :param uvs: float[N, 2] - points
+    :param edges: int[] - edges, the edge k goes from the corner k to the next one
+    :param tolerance: maximum distance to the edge, relative to its length
+    :return: bool[N]
+    """
+    target_uvs = np.asarray(target_uvs, dtype=np.float64).reshape(-1, 2)
+    uvs = np.asarray(uvs, dtype=np.float64).reshape(-1, 2)
+    result = np.zeros(len(uvs), dtype=bool)
+    for k in edges:
+        a, b = target_uvs[k], target_uvs[(k + 1) % len(target_uvs)]
+        edge = b - a
+        length = np.hypot(edge[0], edge[1])
+        if length == 0:
+            continue
+        d = uvs - a
+        along = (d @ edge) / (length * length)
+        distance = np.abs(d[:, 0] * edge[1] - d[:, 1] * edge[0]) / length
+        result |= (distance <= tolerance * length) & (along >= -tolerance) & (along <= 1 + tolerance)
+    return result
+
+
+def vertex_normals(target, uvs, corner_normals):
+    """
+    Displacement direction of points inside a target: the corner normals interpolated with corner_weights, so the
+    outputs of faces that share an edge are displaced the same way along it
+    :param target: RFTargetVertex[] - target face
+    :param uvs: float[N, 2] - roofeus uvs of the points
+    :param corner_normals: float[C, 3] - normal of every target corner
+    :return: float[N, 3] - unit normals (the target face normal where the interpolated one is zero)
+    """
+    normals = corner_weights([tv.uvs for tv in target], uvs) @ np.asarray(corner_normals, dtype=np.float64)
+    lengths = np.linalg.norm(normals, axis=1)
+    flat = lengths < 1e-9
+    normals[~flat] /= lengths[~flat, None]
+    normals[flat] = face_normal([tv.coords for tv in target])
+    return normals
+
+
+def bake_displacement(meshes, heightmap, strength=1.0, midlevel=0.5, corner_normals=None, fixed_edges=None):
+    """
+    Displaces the output vertex of several roofeus outputs, sampling the heightmap once for all of them.
+    coords_3d of the vertex inside the targets is updated (target vertex are not modified)
+    :param meshes: (target, vertex_list)[] - RFTargetVertex[] and RFVertexData[] of every output
+    :param heightmap: float[rows, columns] - heights (row 0 is y = 0)
+    :param strength: displacement of a height of 1 over the midlevel
+    :param midlevel: height that is not displaced
+    :param corner_normals: float[C, 3][] - normal of the corners of every target. The vertex are displaced along the
+     interpolated corner normals (see vertex_normals). None to displace them along the target normal
+    :param fixed_edges: int[][] - edges of every target whose vertex are not displaced (shared with faces that are not
+     processed). None if there isn't any
+    """
+    vertex = []
+    normals = []
+    for k, (target, vertex_list) in enumerate(meshes):
+        inside = [v for v in vertex_list if v.inside]
+        uvs = [v.coords_2d for v in inside]
+        if fixed_edges is not None and fixed_edges[k]:
+            inside = [v for v, fixed in zip(inside, on_edges([tv.uvs for tv in target], uvs, fixed_edges[k]))
+                      if not fixed]
+            uvs = [v.coords_2d for v in inside]
+        vertex.extend(inside)
+        if corner_normals is not None:
+            normals.append(vertex_normals(target, uvs, corner_normals[k]).reshape(-1, 3))
+        else:
+            normals.append(np.repeat(face_normal([tv.coords for tv in target])[None, :], len(inside), axis=0))
+    if not vertex:
+        return
+
+    positions = displace_positions([v.coords_3d for v in vertex], [v.coords_2d for v in vertex],
+                                   np.concatenate(normals), heightmap, strength, midlevel)
+    for v, position in zip(vertex, positions.tolist()):
+        v.coords_3d = tuple(position)
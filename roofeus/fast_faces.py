@@ -0,0 +1,74 @@
+import numpy as np
+
+from roofeus.utils import convex_hull
+
+
+class RFCompiledTemplate:
+    """
+    Template faces as arrays: for every face corner, the cell offset (dx, dy) and the visible vertex index.
+    Triangles are padded to the size of the biggest face repeating their last corner
+    """
+    def __init__(self, template):
+        self.face_sizes = np.array([len(f.vertex) for f in template.faces], dtype=np.int32)  # int[F]
+        corners = max(self.face_sizes) if len(template.faces) > 0 else 3
+        self.dx = np.zeros((len(template.faces), corners), dtype=np.int64)  # int[F, K]
+        self.dy = np.zeros((len(template.faces), corners), dtype=np.int64)  # int[F, K]
+        self.local = np.zeros((len(template.faces), corners), dtype=np.int64)  # int[F, K]
+        for fi in range(0, len(template.faces)):
+            vertex = template.faces[fi].vertex
+            for k in range(0, corners):
+                index, (dx, dy) = template.get_vertex_cell(vertex[min(k, len(vertex) - 1)])
+                self.dx[fi, k] = dx
+                self.dy[fi, k] = dy
+                self.local[fi, k] = index
+
+
+def gather_faces(compiled, structure, row_shifts):
+    """
+    Gets the vertex of every template face in every cell, in the same order than build_faces
+    :param compiled: RFCompiledTemplate
+    :param structure: row[]: column[]; cell[]: vertex: int - inner mesh structure
+    :param row_shifts: int[] - column shift from each row to the next one
+    :return:
+        face_vertex: int[N, K] - vertex of every face (N = cells * template faces)
+        valid: bool[N] - false for the faces with neighbor cells out of the structure
+    """
+    cells = np.array(structure, dtype=np.int64)  # [rows, columns, vertex]
+    rows, columns = cells.shape[0], cells.shape[1]
+    row = np.arange(0, rows - 1).reshape(-1, 1, 1, 1)
+    column = np.arange(0, columns - 1).reshape(1, -1, 1, 1)
+    shifts = np.array(row_shifts[:rows - 1], dtype=np.int64).reshape(-1, 1, 1, 1)
+
+    corner_row = row + compiled.dy
+    corner_column = column + compiled.dx + compiled.dy * shifts
+    valid = np.all(corner_column < columns, axis=3)
+    corner_column = np.minimum(corner_column, columns - 1)
+    face_vertex = cells[corner_row, corner_column, compiled.local]
+    return face_vertex.reshape(-1, face_vertex.shape[3]), valid.reshape(-1)
+
+
+def touch_target(vertex_list, face_vertex, target):
+    """
+    Finds the faces that can touch the target: the ones that don't have all their vertex outside of the same edge
+    of the target convex hull (the target edges if it is convex). A concave target is inside its hull, so the
+    skipped faces can't touch it either. The distance has a margin for the Polygon.contains tolerance
+    :param vertex_list: VertexData[] - created vertex
+    :param face_vertex: int[N, K] - vertex of the faces
+    :param target: RFTargetVertex[] - target face
+    :return: bool[N]
+    """
+    coords = np.array([v.coords_2d for v in vertex_list], dtype=np.float64).reshape(-1, 2)
+    corner_coords = coords[face_vertex]  # [N, K, 2]
+    margin = (corner_coords.max(axis=1) - corner_coords.min(axis=1)).max(axis=1) * 0.02 + 1e-9
+
+    hull = np.array(convex_hull([tv.uvs for tv in target]), dtype=np.float64).reshape(-1, 2)  # Counter-clockwise
+    touches = np.ones(len(face_vertex), dtype=bool)
+    if len(hull) < 3:
+        return touches
+    edges = np.roll(hull, -1, axis=0) - hull
+    for start, edge in zip(hull, edges):
+        length = np.hypot(edge[0], edge[1])
+        normal = np.array([-edge[1], edge[0]]) / length  # Inward normal
+        distance = (corner_coords - start) @ normal  # [N, K]
+        touches &= distance.max(axis=1) >= -margin
+    return touches
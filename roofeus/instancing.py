@@ -0,0 +1,214 @@
+import numpy as np
+
+from roofeus.roofeus import create_2d_mesh, transform_to_3d_mesh, fill_to_vertex, find_quad_pairs
+from roofeus.roofeus import get_first_row, get_first_column, get_row_offsets, build_faces_vectorized
+from roofeus.utils import get_polygon_subtriangle_for_index
+from roofeus.fast_faces import RFCompiledTemplate, gather_faces
+from roofeus.mesh_arrays import mesh_to_arrays
+
+MAP_TOLERANCE = 1e-9  # Relative difference under which two triangles have the same uv to 3d map
+
+
+class RFInstancedMesh:
+    """
+    Roofeus output where the cells completely inside the target are instances of a tile mesh.
+    The tile is the template cell in template coordinates (z = 0). Its uvs depend on the row offset of the cell,
+    so there is one uv set for every different offset (only one if the template has no row shift).
+    The other cells are real geometry, in the create_mesh format
+    """
+    def __init__(self, tile_positions, tile_uvs, tile_faces, instance_tiles, instance_cells, transforms, vertex_list,
+                 faces, bounding_edge_list):
+        self.tile_positions = tile_positions  # float32[V, 3]
+        self.tile_uvs = tile_uvs  # float32[T, V, 2] - roofeus uvs of the tile vertex for every tile variant
+        self.tile_faces = tile_faces  # int[][] - tile faces, pointing to tile vertex
+        self.instance_tiles = instance_tiles  # int32[I] - tile variant of every instance
+        self.instance_cells = instance_cells  # int32[I, 2] - template (column, row) of every instance
+        self.transforms = transforms  # float32[I, 4, 4] - tile to 3d space matrix of every instance
+        self.vertex_list = vertex_list  # RFVertexData[] - vertex of the real geometry
+        self.faces = faces  # int[][] - faces of the real geometry (negative indices are target vertex)
+        self.bounding_edge_list = bounding_edge_list  # (int, int)[] - bounding edges
+
+    @property
+    def instance_count(self):
+        return len(self.transforms)
+
+
+def triangle_maps(target):
+    """
+    Affine map from uv to 3d space of every triangle of the target: position = linear @ uv + offset.
+    Triangles with the same map (like both halves of a flat quad with undistorted uvs) are in the same group
+    :param target: RFTargetVertex[] - target face
+    :return:
+        linear: float[T, 3, 2]
+        offset: float[T, 3] - position of the uv (0, 0)
+        groups: int[T] - first triangle with the same map (-1 for the triangles without uv area)
+    """
+    count = len(target) - 2
+    linear = np.zeros((count, 3, 2))
+    offset = np.zeros((count, 3))
+    groups = np.full(count, -1, dtype=np.int64)
+    for k in range(0, count):
+        o, a, b = get_polygon_subtriangle_for_index(target, k)
+        uv_edges = np.array([a.uvs, b.uvs], dtype=np.float64).T - np.array(o.uvs, dtype=np.float64)[:, None]
+        if abs(np.linalg.det(uv_edges)) < 1e-12:
+            continue
+        edges = np.array([a.coords, b.coords], dtype=np.float64).T - np.array(o.coords, dtype=np.float64)[:, None]
+        linear[k] = edges @ np.linalg.inv(uv_edges)
+        offset[k] = np.array(o.coords) - linear[k] @ np.array(o.uvs)
+        groups[k] = k
+        for other in range(0, k):
+            scale = 1.0 + max(np.abs(linear[k]).max(), np.abs(offset[k]).max())
+            if groups[other] == other and np.allclose(linear[k], linear[other], rtol=0, atol=MAP_TOLERANCE * scale) \
+                    and np.allclose(offset[k], offset[other], rtol=0, atol=MAP_TOLERANCE * scale):
+                groups[k] = other
+                break
+    return linear, offset, groups
+
+
+def find_instanced_cells(structure, mesh_2d, face_vertex, valid, vertex_count, groups):
+    """
+    Finds the cells that can be replaced by a tile instance: all their faces are inside the target and all their
+    vertex are in triangles with the same uv to 3d map
+    :param structure: row[]: column[]; cell[]: vertex: int - inner mesh structure
+    :param mesh_2d: row[]: column[]; cell[]: vertex: RFProjected2dVertex - projected 2d mesh
+    :param face_vertex: int[N, K] - vertex of every face of every cell (see fast_faces.gather_faces)
+    :param valid: bool[N] - faces with all their vertex in the structure
+    :param vertex_count: number of created vertex
+    :param groups: int[T] - map group of every target triangle (see triangle_maps)
+    :return: instanced: bool[rows - 1, columns - 1], cell_groups: int[rows - 1, columns - 1] - map group of the cells
+    """
+    vertex_group = np.full(vertex_count, -1, dtype=np.int64)
+    for structure_row, row in zip(structure, mesh_2d):
+        for structure_cell, cell in zip(structure_row, row):
+            for index, v in zip(structure_cell, cell):
+                if index >= 0 and v.inside:
+                    vertex_group[index] = groups[v.container_triangle_index]
+
+    shape = (len(structure) - 1, len(structure[0]) - 1)
+    cell_vertex = face_vertex.reshape(shape + (-1,))
+    # Target vertex (negative indices) are never instanced
+    cell_groups = np.where(cell_vertex >= 0, vertex_group[np.maximum(cell_vertex, 0)], -1)
+    instanced = valid.reshape(shape + (-1,)).all(axis=2) & (cell_groups[..., 0] >= 0) & \
+        np.all(cell_groups == cell_groups[..., :1], axis=2)
+    return instanced, cell_groups[..., 0]
+
+
+def region_boundary_edges(face_vertex):
+    """
+    Returns the edges used by only one of the faces
+    :param face_vertex: int[N, K] - faces (triangles padded repeating their last corner)
+    :return: {frozenset(int, int): 1}
+    """
+    edges = np.stack((face_vertex, np.roll(face_vertex, -1, axis=1)), axis=2).reshape(-1, 2)
+    edges = np.sort(edges[edges[:, 0] != edges[:, 1]], axis=1)
+    if len(edges) == 0:
+        return {}
+    edges, counts = np.unique(edges, axis=0, return_counts=True)
+    return {frozenset(edge): 1 for edge in edges[counts == 1].tolist()}
+
+
+def build_tile(template, merge_quads=False):
+    """
+    Creates the tile mesh: the template vertex used by the faces of a cell, in template coordinates
+    :param template: RFTemplate - template
+    :param merge_quads: merges the pairs of template triangles in quads (the tile is always flat)
+    :return: positions float32[V, 3], faces int[][]
+    """
+    faces = list(template.faces)
+    if merge_quads:
+        quad_pairs = find_quad_pairs(template)
+        merged = set([fi for fi, fj, _quad in quad_pairs] + [fj for fi, fj, _quad in quad_pairs])
+        faces = [quad for _fi, _fj, quad in quad_pairs] + [f for fi, f in enumerate(faces) if fi not in merged]
+
+    idents = sorted(set([v.ident for f in faces for v in f.vertex]))
+    tile_index = {ident: i for i, ident in enumerate(idents)}
+    positions = np.array([template.vertex[ident].coords + (0.0,) for ident in idents], dtype=np.float32)
+    return positions.reshape(-1, 3), [[tile_index[v.ident] for v in f.vertex] for f in faces]
+
+
+def create_instanced_mesh(template, target, fill_uncompleted, merge_quads=False):
+    """
+    Same as roofeus.create_mesh, but the cells completely inside the target are returned as instances of one tile
+    :param template: RFTemplate - template
+    :param target: RFTargetVertex[] - target face
+    :param fill_uncompleted: Fills the space that template faces are not completely inside the target
+    :param merge_quads: Merges the pairs of template triangles in quads when they are completely inside the target
+    :return: RFInstancedMesh
+    """
+    mesh_2d = create_2d_mesh(template, target)
+    vertex_list, structure = transform_to_3d_mesh(target, mesh_2d)
+    linear, offset, groups = triangle_maps(target)
+    instanced = np.zeros((max(len(structure) - 1, 0), max(len(structure[0]) - 1, 0)), dtype=bool)
+    cell_groups = np.full(instanced.shape, -1, dtype=np.int64)
+    instanced_edges = {}
+    if len(template.faces) > 0 and len(structure) >= 2:
+        _offsets, row_shifts = get_row_offsets(template, get_first_row(target), len(structure))
+        face_vertex, valid = gather_faces(RFCompiledTemplate(template), structure, row_shifts)
+        instanced, cell_groups = find_instanced_cells(structure, mesh_2d, face_vertex, valid, len(vertex_list), groups)
+        # The vertex fill must see the instanced faces
+        instanced_faces = np.repeat(instanced.reshape(-1), len(template.faces))
+        instanced_edges = region_boundary_edges(face_vertex[instanced_faces])
+
+    faces, _faces_idx, bounding_edge_list, border_vertex = build_faces_vectorized(structure, template, vertex_list,
+                                                                                  target, fill_uncompleted,
+                                                                                  merge_quads, instanced)
+    if str(fill_uncompleted) == 'vertex':
+        faces.extend(fill_to_vertex(vertex_list, faces, target, instanced_edges, bounding_edge_list))
+    vertex_list.extend(border_vertex)
+
+    # Tile to 3d space: the tile vertex p is in the uv p + (column + row offset, row)
+    rows, columns = np.nonzero(instanced)
+    row_offsets = np.array(get_row_offsets(template, get_first_row(target), len(structure))[0])[rows]
+    cells = np.stack((columns + get_first_column(template, target), rows + get_first_row(target)), axis=1)
+    origins = cells + np.stack((row_offsets, np.zeros(len(rows))), axis=1)
+    cell_linear = linear[cell_groups[rows, columns]]  # [I, 3, 2]
+    normals = np.cross(cell_linear[:, :, 0], cell_linear[:, :, 1])
+    transforms = np.zeros((len(rows), 4, 4))
+    transforms[:, :3, :2] = cell_linear
+    transforms[:, :3, 2] = normals / np.linalg.norm(normals, axis=1, keepdims=True)
+    transforms[:, :3, 3] = np.einsum('ijk,ik->ij', cell_linear, origins) + offset[cell_groups[rows, columns]]
+    transforms[:, 3, 3] = 1.0
+
+    tile_positions, tile_faces = build_tile(template, merge_quads)
+    variants, instance_tiles = np.unique(np.round(row_offsets, 9), return_inverse=True)
+    if len(variants) == 0:
+        variants = np.zeros(1)
+    tile_uvs = tile_positions[None, :, :2] + np.stack((variants, np.zeros(len(variants))), axis=1)[:, None, :]
+    return RFInstancedMesh(tile_positions, tile_uvs.astype(np.float32), tile_faces,
+                           instance_tiles.astype(np.int32).reshape(-1), cells.astype(np.int32),
+                           transforms.astype(np.float32), vertex_list, faces, bounding_edge_list)
+
+
+def expand_instances(instanced):
+    """
+    Creates the geometry of every instance, as if they were not instanced
+    :param instanced: RFInstancedMesh
+    :return: positions float[I * V, 3], uvs float[I * V, 2] (roofeus uvs), faces int[][] - pointing to the rows
+    """
+    positions = np.einsum('ijk,vk->ivj', instanced.transforms[:, :3, :3].astype(np.float64),
+                          instanced.tile_positions.astype(np.float64)) + \
+        instanced.transforms[:, None, :3, 3].astype(np.float64)
+    uvs = instanced.tile_uvs[instanced.instance_tiles].astype(np.float64) + instanced.instance_cells[:, None, :]
+    tile_count = len(instanced.tile_positions)
+    faces = [[i * tile_count + v for v in face] for i in range(0, instanced.instance_count)
+             for face in instanced.tile_faces]
+    return positions.reshape(-1, 3), uvs.reshape(-1, 2), faces
+
+
+def save_instanced_mesh(filename, instanced, target):
+    """
+    Writes an instanced output in a .npz file: tile_positions, tile_uvs, tile_face_indices, tile_face_offsets,
+    instance_tiles, instance_cells and transforms for the instances, and positions, uvs, face_indices and face_offsets
+    for the real geometry (see mesh_arrays.RFMeshArrays)
+    :param filename: output file
+    :param instanced: RFInstancedMesh
+    :param target: RFTargetVertex[] - target face
+    """
+    arrays = mesh_to_arrays(instanced.vertex_list, instanced.faces, instanced.bounding_edge_list, target)
+    tile_face_offsets = np.zeros(len(instanced.tile_faces) + 1, dtype=np.int32)
+    np.cumsum([len(f) for f in instanced.tile_faces], out=tile_face_offsets[1:])
+    np.savez(filename, tile_positions=instanced.tile_positions, tile_uvs=instanced.tile_uvs,
+             tile_face_indices=np.array([v for f in instanced.tile_faces for v in f], dtype=np.int32),
+             tile_face_offsets=tile_face_offsets, instance_tiles=instanced.instance_tiles,
+             instance_cells=instanced.instance_cells, transforms=instanced.transforms, positions=arrays.positions,
+             uvs=arrays.uvs, face_indices=arrays.face_indices, face_offsets=arrays.face_offsets)
@@ -0,0 +1,95 @@
+from itertools import chain
+import numpy as np
+
+from roofeus.roofeus import create_mesh
+
+
+class RFMeshArrays:
+    """
+    Roofeus output packed in numpy arrays.
+    The first generated_count rows of positions, uvs and inside are the created vertex, the next rows are the
+    target vertex (target_remap gives the row of each target vertex). face_indices and bounding_edges point to rows
+    """
+    def __init__(self, positions, uvs, inside, face_indices, face_offsets, bounding_edges, target_remap,
+                 generated_count):
+        self.positions = positions  # float32[N, 3]
+        self.uvs = uvs  # float32[N, 2]
+        self.inside = inside  # bool[N]
+        self.face_indices = face_indices  # int32[] - vertex rows of every face, one face after another
+        self.face_offsets = face_offsets  # int32[F + 1] - face k is face_indices[face_offsets[k]:face_offsets[k + 1]]
+        self.bounding_edges = bounding_edges  # int32[E, 2]
+        self.target_remap = target_remap  # int32[len(target)] - row of the target vertex with ident -1 - k
+        self.generated_count = generated_count  # int
+
+    @property
+    def face_sizes(self):
+        return np.diff(self.face_offsets)
+
+
+def mesh_to_arrays(vertex_list, faces, bounding_edge_list, target, compact=True):
+    """
+    Packs a roofeus output in numpy arrays
+    :param vertex_list: RFVertexData[] - output vertex
+    :param faces: int[][] - output faces (negative indices are target vertex)
+    :param bounding_edge_list: (int, int)[] - bounding edges
+    :param target: RFTargetVertex[] - target face
+    :param compact: keeps only the vertex and faces that would be created (vertex inside and used by a face or a
+     bounding edge, faces with 3 or more vertex) and the bounding edges between them
+    :return: RFMeshArrays
+    """
+    if compact:
+        faces = [f for f in faces if len(f) >= 3]
+    face_sizes = np.fromiter((len(f) for f in faces), dtype=np.int32, count=len(faces))
+    face_offsets = np.zeros(len(faces) + 1, dtype=np.int32)
+    np.cumsum(face_sizes, out=face_offsets[1:])
+    face_indices = np.fromiter(chain.from_iterable(faces), dtype=np.int64, count=int(face_offsets[-1]))
+    bounding_edges = np.array(bounding_edge_list, dtype=np.int64).reshape(-1, 2)
+
+    vertex_inside = np.fromiter((v.inside for v in vertex_list), dtype=bool, count=len(vertex_list))
+    if compact:
+        used = np.zeros(len(vertex_list), dtype=bool)
+        used[face_indices[face_indices >= 0]] = True
+        used[bounding_edges[bounding_edges >= 0]] = True  # Their edges are kept even if no face uses them
+        used &= vertex_inside
+        bounding_edges = bounding_edges[np.all((bounding_edges < 0) | used[np.maximum(bounding_edges, 0)], axis=1)]
+    else:
+        used = np.ones(len(vertex_list), dtype=bool)
+    generated_count = int(np.count_nonzero(used))
+
+    vertex_remap = np.full(len(vertex_list), -1, dtype=np.int32)
+    vertex_remap[used] = np.arange(generated_count, dtype=np.int32)
+    target_remap = np.arange(generated_count, generated_count + len(target), dtype=np.int32)
+
+    def remap(indices):
+        remapped = np.empty(indices.shape, dtype=np.int32)
+        generated = indices >= 0
+        remapped[generated] = vertex_remap[indices[generated]]
+        remapped[~generated] = target_remap[-1 - indices[~generated]]
+        return remapped
+
+    used_vertex = [v for v, u in zip(vertex_list, used) if u]
+    positions = np.empty((generated_count + len(target), 3), dtype=np.float32)
+    uvs = np.empty((generated_count + len(target), 2), dtype=np.float32)
+    if generated_count > 0:
+        positions[:generated_count] = [v.coords_3d for v in used_vertex]
+        uvs[:generated_count] = [v.coords_2d for v in used_vertex]
+    if len(target) > 0:
+        positions[generated_count:] = [tv.coords for tv in target]
+        uvs[generated_count:] = [tv.uvs for tv in target]
+    inside = np.ones(generated_count + len(target), dtype=bool)
+    inside[:generated_count] = vertex_inside[used]
+
+    return RFMeshArrays(positions, uvs, inside, remap(face_indices), face_offsets, remap(bounding_edges),
+                        target_remap, generated_count)
+
+
+def create_mesh_arrays(template, target, fill_uncompleted):
+    """
+    Same as roofeus.create_mesh, but the output is packed in numpy arrays
+    :param template: RFTemplate - template
+    :param target: RFTargetVertex[] - target face
+    :param fill_uncompleted: Fills the space that template faces are not completely inside the target
+    :return: RFMeshArrays
+    """
+    vertex_list, faces, bounding_edge_list = create_mesh(template, target, fill_uncompleted)
+    return mesh_to_arrays(vertex_list, faces, bounding_edge_list, target)
@@ -0,0 +1,198 @@
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+import numpy as np
+
+from roofeus.mesh_arrays import mesh_to_arrays
+
+PLY_COUNT_WIDTH = 12  # Characters reserved for the element counts in the PLY header
+NPY_HEADER_SIZE = 256  # Bytes of the .npy header (magic string included), fixed so it can be rewritten at the end
+
+
+class RFMeshSink(ABC):
+    """
+    Receives a generated mesh in chunks, so the whole output never needs to be in memory.
+    Chunk face indices point to the chunk vertex; they are moved after the vertex already written.
+    Subclasses implement write_vertex, write_faces and finish
+    """
+    def __init__(self):
+        self.vertex_count = 0  # int - vertex written
+        self.face_count = 0  # int - faces written
+        self.closed = False
+
+    def write_chunk(self, positions, uvs, face_indices, face_sizes):
+        """
+        Writes a piece of mesh
+        :param positions: float[N, 3] - vertex positions
+        :param uvs: float[N, 2] - vertex uvs
+        :param face_indices: int[] - vertex of every face, one face after another (0 is the first chunk vertex)
+        :param face_sizes: int[F] - vertex count of every face
+        """
+        self.write_vertex(np.asarray(positions, dtype=np.float32).reshape(-1, 3),
+                          np.asarray(uvs, dtype=np.float32).reshape(-1, 2))
+        self.write_faces(np.asarray(face_indices, dtype=np.int32) + self.vertex_count,
+                         np.asarray(face_sizes, dtype=np.int32))
+        self.vertex_count += len(positions)
+        self.face_count += len(face_sizes)
+
+    def write_arrays(self, arrays):
+        """
+        Writes a roofeus output packed in arrays
+        :param arrays: RFMeshArrays
+        """
+        self.write_chunk(arrays.positions, arrays.uvs, arrays.face_indices, arrays.face_sizes)
+
+    def write_mesh(self, vertex_list, faces, bounding_edge_list, target):
+        """
+        Writes a create_mesh output (only the vertex and faces that would be created)
+        :param vertex_list: RFVertexData[] - output vertex
+        :param faces: int[][] - output faces (negative indices are target vertex)
+        :param bounding_edge_list: (int, int)[] - bounding edges
+        :param target: RFTargetVertex[] - target face
+        """
+        self.write_arrays(mesh_to_arrays(vertex_list, faces, bounding_edge_list, target))
+
+    @abstractmethod
+    def write_vertex(self, positions, uvs):
+        """
+        Writes the vertex of a chunk
+        :param positions: float32[N, 3] - vertex positions
+        :param uvs: float32[N, 2] - vertex uvs
+        """
+
+    @abstractmethod
+    def write_faces(self, face_indices, face_sizes):
+        """
+        Writes the faces of a chunk
+        :param face_indices: int32[] - vertex of every face, one face after another (0 is the first vertex written)
+        :param face_sizes: int32[F] - vertex count of every face
+        """
+
+    @abstractmethod
+    def finish(self):
+        """
+        Completes the output once every chunk is written (called once, by close)
+        """
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.finish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PlySink(RFMeshSink):
+    """
+    Writes a binary little endian PLY file (x, y, z, s, t per vertex and a vertex_indices list per face).
+    Faces are kept in a temporary file until the end, because PLY stores all the vertex before the faces.
+    The header reserves room for the counts, which are written when the sink is closed
+    """
+    def __init__(self, filename):
+        RFMeshSink.__init__(self)
+        self.filename = filename
+        self.file = open(filename, 'wb')
+        self.file.write(self.header(0, 0))
+        self.faces_file = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(filename)))
+
+    @staticmethod
+    def header(vertex_count, face_count):
+        return (f"ply\nformat binary_little_endian 1.0\ncomment Created by Roofeus\n"
+                f"element vertex {vertex_count:<{PLY_COUNT_WIDTH}d}\n"
+                f"property float x\nproperty float y\nproperty float z\nproperty float s\nproperty float t\n"
+                f"element face {face_count:<{PLY_COUNT_WIDTH}d}\n"
+                f"property list uchar int vertex_indices\nend_header\n").encode('ascii')
+
+    def write_vertex(self, positions, uvs):
+        self.file.write(np.hstack((positions, uvs)).astype('<f4').tobytes())
+
+    def write_faces(self, face_indices, face_sizes):
+        if len(face_sizes) == 0:
+            return
+        if face_sizes.max() > 255:
+            raise ValueError("PLY faces can't have more than 255 vertex")
+        face_offsets = np.zeros(len(face_sizes), dtype=np.int64)
+        np.cumsum(face_sizes[:-1], out=face_offsets[1:])
+
+        # Every face is its size byte followed by its 4 byte indices
+        record_offsets = face_offsets * 4 + np.arange(len(face_sizes))
+        data = np.empty(len(face_sizes) + len(face_indices) * 4, dtype=np.uint8)
+        data[record_offsets] = face_sizes
+        index_face = np.repeat(np.arange(len(face_sizes)), face_sizes)
+        index_starts = record_offsets[index_face] + 1 + (np.arange(len(face_indices)) - face_offsets[index_face]) * 4
+        data[index_starts[:, None] + np.arange(4)] = face_indices.astype('<i4').view(np.uint8).reshape(-1, 4)
+        self.faces_file.write(data.tobytes())
+
+    def finish(self):
+        self.faces_file.seek(0)
+        shutil.copyfileobj(self.faces_file, self.file)
+        self.faces_file.close()
+        self.file.seek(0)
+        self.file.write(self.header(self.vertex_count, self.face_count))
+        self.file.close()
+
+
+class NpyArrayWriter:
+    """
+    Writes a .npy file whose first dimension grows while writing. The header has a fixed size and is rewritten
+    with the final shape when it is closed, so the file can be opened with numpy.load(filename, mmap_mode='r')
+    """
+    def __init__(self, filename, dtype, row_shape=()):
+        self.file = open(filename, 'wb')
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.rows = 0
+        self.file.write(self.header())
+
+    def header(self):
+        description = repr({'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False,
+                            'shape': (self.rows,) + self.row_shape})
+        header_length = NPY_HEADER_SIZE - 10
+        if len(description) + 1 > header_length:
+            raise ValueError("Array shape too big for the .npy header")
+        return b'\x93NUMPY\x01\x00' + np.uint16(header_length).astype('<u2').tobytes() + \
+            (description.ljust(header_length - 1) + '\n').encode('latin1')
+
+    def write(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype).reshape((-1,) + self.row_shape)
+        self.file.write(values.tobytes())
+        self.rows += len(values)
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(self.header())
+        self.file.close()
+
+
+class NpySink(RFMeshSink):
+    """
+    Writes the mesh in .npy files that can be memory-mapped:
+     - <prefix>_positions.npy: float32[N, 3]
+     - <prefix>_uvs.npy: float32[N, 2]
+     - <prefix>_indices.npy: int32[] - vertex of every face, one face after another
+     - <prefix>_offsets.npy: int64[F + 1] - face k is indices[offsets[k]:offsets[k + 1]]
+    """
+    def __init__(self, prefix):
+        RFMeshSink.__init__(self)
+        self.positions = NpyArrayWriter(f"{prefix}_positions.npy", np.float32, (3,))
+        self.uvs = NpyArrayWriter(f"{prefix}_uvs.npy", np.float32, (2,))
+        self.indices = NpyArrayWriter(f"{prefix}_indices.npy", np.int32)
+        self.offsets = NpyArrayWriter(f"{prefix}_offsets.npy", np.int64)
+        self.offsets.write([0])
+
+    def write_vertex(self, positions, uvs):
+        self.positions.write(positions)
+        self.uvs.write(uvs)
+
+    def write_faces(self, face_indices, face_sizes):
+        self.offsets.write(self.indices.rows + np.cumsum(face_sizes, dtype=np.int64))
+        self.indices.write(face_indices)
+
+    def finish(self):
+        for writer in (self.positions, self.uvs, self.indices, self.offsets):
+            writer.close()
@@ -1,12 +1,16 @@
 class RFTargetVertex:
     """
-    Existing vertex of the face that will be filled with the new mesh
+    Existing vertex of the face that will be filled with the new mesh.
+    Without ident, the id is taken from a class counter (call reset_index before each face), as in previous versions.
+    That counter is shared by all the threads: use RFTargetContext to generate meshes at the same time
     """
     id_neg = -1
 
-    def __init__(self, x, y, z, u, v):
-        self.ident = RFTargetVertex.id_neg  # int
-        RFTargetVertex.id_neg -= 1
+    def __init__(self, x, y, z, u, v, ident=None):
+        if ident is None:
+            ident = RFTargetVertex.id_neg
+            RFTargetVertex.id_neg -= 1
+        self.ident = ident  # int (negative, see RFTargetContext)
         self.coords = (x, y, z)  # (float, float, float)
         self.uvs = (u, v)  # (float, float)
 
@@ -15,6 +19,20 @@ class RFTargetVertex:
         cls.id_neg = -1
 
 
+class RFTargetContext:
+    """
+    Gives the negative ids of the vertices of one target face.
+    Every target face must use its own context, so several meshes can be generated at the same time
+    """
+    def __init__(self):
+        self.next_ident = -1  # int
+
+    def create_vertex(self, x, y, z, u, v):
+        vertex = RFTargetVertex(x, y, z, u, v, self.next_ident)
+        self.next_ident -= 1
+        return vertex
+
+
 class RFTemplate:
     """
     Template data that will be used as base to generate the new mesh
@@ -25,6 +43,7 @@ class RFTemplate:
         self.vertex = []  # RFTemplateVertex[]
         self.faces = []  # RFTemplateFace[]
         self.face_colors = []  # (r,g,b)[]
+        self.row_shift = 0.0  # float - horizontal displacement of each row of cells from the previous one
 
     def calculate_ids(self):
         self.total_vertex_count = 0
@@ -34,8 +53,8 @@ class RFTemplate:
         for v in self.vertex:
             v.ident = self.total_vertex_count
             vr = RFTemplateVertex(v.coords[0] + 1.0, v.coords[1])
-            vb = RFTemplateVertex(v.coords[0], v.coords[1] + 1.0)
-            vd = RFTemplateVertex(v.coords[0] + 1.0, v.coords[1] + 1.0)
+            vb = RFTemplateVertex(v.coords[0] + self.row_shift, v.coords[1] + 1.0)
+            vd = RFTemplateVertex(v.coords[0] + 1.0 + self.row_shift, v.coords[1] + 1.0)
             right_vertex.append(vr)
             bottom_vertex.append(vb)
             diag_vertex.append(vd)
@@ -69,13 +88,22 @@ class RFTemplate:
     def visible_vertex(self):
         return self.vertex[:self.vertex_count] if self.vertex_count > 0 else self.vertex
 
+    def get_vertex_cell(self, v):
+        """
+        Returns the visible vertex index and the cell offset (dx, dy) of a template vertex. In an empty template (no
+        visible vertex) every vertex is in the cell (0, 0)
+        """
+        if self.vertex_count == 0:
+            return v.ident, (0, 0)
+        return v.ident % self.vertex_count, ((0, 0), (1, 0), (0, 1), (1, 1))[v.ident // self.vertex_count]
+
 
 class RFTemplateFace:
     """
-    Face of the template
+    Face of the template (triangle or quad)
     """
-    def __init__(self, a, b, c):
-        self.vertex = (a, b, c)  # (int, int, int)
+    def __init__(self, a, b, c, d=None):
+        self.vertex = (a, b, c) if d is None else (a, b, c, d)  # RFTemplateVertex[3 or 4]
 
 
 class RFTemplateVertex:
@@ -106,3 +134,17 @@ class RFVertexData:
         self.coords_2d = coords_2d  # (float, float)
         self.coords_3d = coords_3d  # (float, float, float)
         self.inside = inside  # boolean
+
+
+class RFMeshEstimate:
+    """
+    Estimated size of a roofeus output
+    """
+    def __init__(self, vertex_count=0, face_count=0, seconds=0.0):
+        self.vertex_count = vertex_count  # int
+        self.face_count = face_count  # int
+        self.seconds = seconds  # float
+
+    def __add__(self, other):
+        return RFMeshEstimate(self.vertex_count + other.vertex_count, self.face_count + other.face_count,
+                              self.seconds + other.seconds)
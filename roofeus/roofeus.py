@@ -1,8 +1,48 @@
-from math import floor
+import numpy as np
+from copy import copy
+from math import floor, pi, sqrt
 from roofeus.utils import sub_vectors, add_vectors, mul_vector_by_scalar, has_intersection, calc_intersection, Polygon
 from roofeus.utils import calc_vector_lineal_combination_params, calculate_vertex_groups
-from roofeus.utils import size_vector, get_polygon_subtriangle_for_index
-from roofeus.models import RFVertexData, RFProjected2dVertex
+from roofeus.utils import size_vector, get_polygon_subtriangle_for_index, is_convex, is_planar
+from roofeus.utils import polygon_area, point_in_polygon, triangulate_polygon_with_holes, corner_angle_deviation
+from roofeus.utils import insert_triangulation_point, recover_triangulation_edge
+from roofeus.fast_faces import RFCompiledTemplate, gather_faces, touch_target
+from roofeus.models import RFVertexData, RFProjected2dVertex, RFMeshEstimate, RFTemplateFace
+
+# Rough generation cost, used by estimate_mesh_size
+SECONDS_PER_PROJECTED_VERTEX = 3e-5
+SECONDS_PER_BORDER_FACE = 1e-3
+MIN_UV_SCALE = 1e-3  # Scale used when the vertex budget is under the target vertex count
+
+
+def get_first_row(target):
+    """
+    Returns the template row of the first projected row for a target
+    """
+    return floor(min([v.uvs[1] for v in target])) - 1
+
+
+def get_first_column(template, target):
+    """
+    Returns the template column of the first projected column for a target
+    """
+    min_x = floor(min([v.uvs[0] for v in target]))
+    return min_x - 1 if template.row_shift == 0 else min_x - 2  # Row offsets move the cells to the right
+
+
+def get_row_offsets(template, first_row, row_count):
+    """
+    Returns the horizontal offset of the projected rows, and the column shift from each row to the next one.
+    Each template row is displaced row_shift from the previous one; the offsets are kept in [0, 1) by moving
+    the columns, so the bottom neighbor of the cell i in the row k is the cell i + shifts[k] in the row k + 1
+    :param template: RFTemplate - template
+    :param first_row: template row of the first projected row
+    :param row_count: number of projected rows
+    :return: offsets: float[row_count], shifts: int[row_count]
+    """
+    offsets = [(j * template.row_shift) % 1.0 for j in range(first_row, first_row + row_count + 1)]
+    shifts = [round(offsets[k] + template.row_shift - offsets[k + 1]) for k in range(0, row_count)]
+    return offsets[:row_count], shifts
 
 
 def create_2d_mesh(template, target):
@@ -17,27 +57,29 @@ def create_2d_mesh(template, target):
     max_x = floor(max([v.uvs[0] for v in target]))
     min_y = floor(min([v.uvs[1] for v in target]))
     max_y = floor(max([v.uvs[1] for v in target]))
+    first_column = get_first_column(template, target)
+    offsets, _shifts = get_row_offsets(template, min_y - 1, max_y - min_y + 3)
 
     # Project vertices
     projected_mesh = []
     for j in range(min_y - 1, max_y + 2):
         row = []
-        for i in range(min_x - 1, max_x + 2):
+        offset = offsets[j - min_y + 1]
+        for i in range(first_column, max_x + 2):
             projected_cell_vertex = []
             for tv in template.visible_vertex():
-                projected_cell_vertex.append(RFProjected2dVertex(tv.coords[0] + i, tv.coords[1] + j))
+                projected_cell_vertex.append(RFProjected2dVertex(tv.coords[0] + i + offset, tv.coords[1] + j))
             row.append(projected_cell_vertex)
         projected_mesh.append(row)
 
     # Check which projected vertices are inside the target
     polygon = calculate_vertex_groups(target)
-    for row in projected_mesh:
-        for col in row:
-            for v in range(0, len(col)):
-                inside, inside_triangle = polygon.contains(col[v].coords)
-                if inside:
-                    col[v].inside = True
-                    col[v].container_triangle_index = inside_triangle
+    projected_vertex = [v for row in projected_mesh for col in row for v in col]
+    inside_list, triangle_list = polygon.contains_many([v.coords for v in projected_vertex])
+    for v, inside, inside_triangle in zip(projected_vertex, inside_list, triangle_list):
+        if inside:
+            v.inside = True
+            v.container_triangle_index = inside_triangle
     return projected_mesh
 
 
@@ -102,8 +144,9 @@ def get_nearest_target_vertex(target, intersection, threshold=0.005):
     return vertex
 
 
-def get_face_vertex(template, structure, row_index, cell_index, face):
+def get_face_vertex(template, structure, row_index, cell_index, face, row_shifts=None):
     row = structure[row_index]
+    bottom_index = cell_index + (row_shifts[row_index] if row_shifts else 0)
     face_vertex = []
     vertex_idx_list = [i.ident for i in face.vertex]
     for vertex_idx in vertex_idx_list:
@@ -118,13 +161,13 @@ def get_face_vertex(template, structure, row_index, cell_index, face):
                 face_vertex.append(right_cell[vertex_idx % template.vertex_count])
         elif vertex_idx < template.vertex_count * 3:
             # Bottom cell
-            if row_index + 1 < len(structure):
-                bottom_cell = structure[row_index + 1][cell_index]
+            if row_index + 1 < len(structure) and bottom_index < len(row):
+                bottom_cell = structure[row_index + 1][bottom_index]
                 face_vertex.append(bottom_cell[vertex_idx % template.vertex_count])
         else:
             # Diag cell
-            if cell_index + 1 < len(row) and row_index + 1 < len(structure):
-                diag_cell = structure[row_index + 1][cell_index + 1]
+            if bottom_index + 1 < len(row) and row_index + 1 < len(structure):
+                diag_cell = structure[row_index + 1][bottom_index + 1]
                 face_vertex.append(diag_cell[vertex_idx % template.vertex_count])
     return face_vertex
 
@@ -133,7 +176,10 @@ def build_border_vertices(target, vertex_list, face_vertex, border_vertex, borde
     face_border_vertex = []
     for fi in range(0, len(face_vertex)):
         v1 = face_vertex[fi]
-        for v2 in face_vertex[fi+1:]:
+        for fj in range(fi + 1, len(face_vertex)):
+            if fj != fi + 1 and not (fi == 0 and fj == len(face_vertex) - 1):
+                continue  # Diagonal of a quad
+            v2 = face_vertex[fj]
             for i in range(0, len(target)):
                 r1 = (vertex_list[v1].coords_2d, vertex_list[v2].coords_2d)
                 r2 = (target[i].uvs, target[(i + 1) % len(target)].uvs)
@@ -184,7 +230,55 @@ def build_borders(target, vertex_list, faces, faces_index, face_idx, face_vertex
     return border_vertex, border_vertex_index
 
 
-def build_faces(structure, template, vertex_list, target, fill_uncompleted='border'):
+def find_quad_pairs(template):
+    """
+    Finds pairs of template triangles that share an edge and make a convex quad. The pairs making the quads closest to
+    a rectangle are taken first, so a triangle isn't paired early with a neighbor that another triangle needs
+    :param template: RFTemplate - template
+    :return: (face index, paired face index, RFTemplateFace quad)[]
+    """
+    candidates = []
+    for fi in range(0, len(template.faces)):
+        face = template.faces[fi].vertex
+        if len(face) != 3:
+            continue
+        for fj in range(fi + 1, len(template.faces)):
+            other = template.faces[fj].vertex
+            if len(other) != 3:
+                continue
+            shared = [v for v in face if v in other]
+            if len(shared) != 2:
+                continue
+            # Insert the opposite vertex of the other triangle in the shared edge
+            i = 0
+            while face[i] not in shared or face[(i + 1) % 3] not in shared:
+                i += 1
+            opposite = [v for v in other if v not in shared][0]
+            quad = [face[i], opposite, face[(i + 1) % 3], face[(i + 2) % 3]]
+            coords = [v.coords for v in quad]
+            if is_convex(coords):
+                candidates.append((corner_angle_deviation(coords), fi, fj, quad))
+
+    pairs = []
+    paired = set()
+    for _deviation, fi, fj, quad in sorted(candidates, key=lambda candidate: candidate[:3]):
+        if fi not in paired and fj not in paired:
+            pairs.append((fi, fj, RFTemplateFace(*quad)))
+            paired.update((fi, fj))
+    return sorted(pairs, key=lambda pair: pair[0])
+
+
+def is_cancelled(cancelled):
+    """
+    Checks a cancel event
+    :param cancelled: threading.Event or None
+    :return: true if the event is set
+    """
+    return cancelled is not None and cancelled.is_set()
+
+
+def build_faces(structure, template, vertex_list, target, fill_uncompleted='border', merge_quads=False,
+                skip_cells=None, cancelled=None):
     """
     Creates the faces
     :param structure: row[]: column[]; cell[]: vertex: int - inner mesh structure
@@ -192,6 +286,11 @@ def build_faces(structure, template, vertex_list, target, fill_uncompleted='bord
     :param vertex_list: VertexData[] - created vertex
     :param target: RFTargetVertex[] - target face
     :param fill_uncompleted: Fills the space that template faces are not completely inside the target
+    :param merge_quads: Creates a quad from every pair of template triangles of the same cell that are inside the
+     target and coplanar
+    :param skip_cells: bool[rows - 1][columns - 1] - cells whose faces are not created (None to create all)
+    :param cancelled: threading.Event - checked once per row, that stops (returning the faces created until then)
+     when it is set
     :return: created faces
     """
     faces = []
@@ -199,14 +298,31 @@ def build_faces(structure, template, vertex_list, target, fill_uncompleted='bord
     bounding_edge_list = []
     border_vertex = []
     border_vertex_index = len(vertex_list)
+    quad_pairs = find_quad_pairs(template) if merge_quads else []
+    _offsets, row_shifts = get_row_offsets(template, get_first_row(target), len(structure))
     for row_index in range(0, len(structure) - 1):
+        if is_cancelled(cancelled):
+            break
         row = structure[row_index]
         for cell_index in range(0, len(row) - 1):
+            if skip_cells is not None and skip_cells[row_index][cell_index]:
+                continue
+            merged_faces = set()
+            for face_idx, paired_face_idx, quad in quad_pairs:
+                face_vertex = get_face_vertex(template, structure, row_index, cell_index, quad, row_shifts)
+                if len(face_vertex) == 4 and all([vertex_list[i].inside for i in face_vertex]) and \
+                        is_planar([vertex_list[i].coords_3d for i in face_vertex]):
+                    faces.append(face_vertex)
+                    faces_index.append(face_idx)
+                    merged_faces.update((face_idx, paired_face_idx))
+
             for face_idx in range(0, len(template.faces)):
+                if face_idx in merged_faces:
+                    continue
                 face = template.faces[face_idx]
-                face_vertex = get_face_vertex(template, structure, row_index, cell_index, face)
+                face_vertex = get_face_vertex(template, structure, row_index, cell_index, face, row_shifts)
 
-                if len(face_vertex) != 3:  # Shouldn't happen, the projected vertex covers all the target
+                if len(face_vertex) != len(face.vertex):  # Shouldn't happen, the projected vertex covers all the target
                     continue
 
                 if all([vertex_list[i].inside for i in face_vertex]):
@@ -218,28 +334,445 @@ def build_faces(structure, template, vertex_list, target, fill_uncompleted='bord
                                                                        faces_index, face_idx, face_vertex,
                                                                        border_vertex, border_vertex_index)
                 elif str(fill_uncompleted) == 'vertex':
-                    if not all([not vertex_list[i].inside for i in face_vertex]):
-                        inside = list(filter(lambda fvertex: vertex_list[fvertex].inside, face_vertex))
-                        if len(inside) == 2:
-                            bounding_edge_list.append(tuple(inside))
+                    add_bounding_edges(vertex_list, face_vertex, bounding_edge_list)
+    return faces, faces_index, bounding_edge_list, border_vertex
+
+
+def add_bounding_edges(vertex_list, face_vertex, bounding_edge_list):
+    """
+    Adds the edges between the inside vertex of a face partially inside the target
+    :param vertex_list: VertexData[] - created vertex
+    :param face_vertex: int[] - face vertex
+    :param bounding_edge_list: (int, int)[] - bounding edges, updated
+    """
+    if not all([not vertex_list[i].inside for i in face_vertex]):
+        inside = list(filter(lambda fvertex: vertex_list[fvertex].inside, face_vertex))
+        if len(inside) == 2:
+            bounding_edge_list.append(tuple(inside))
+        elif len(inside) == 3 and len(face_vertex) == 4:
+            # Quad with one vertex outside: the edges between its inside vertex
+            outside = [i for i in range(0, 4) if not vertex_list[face_vertex[i]].inside][0]
+            bounding_edge_list.append((face_vertex[(outside + 1) % 4], face_vertex[(outside + 2) % 4]))
+            bounding_edge_list.append((face_vertex[(outside + 2) % 4], face_vertex[(outside + 3) % 4]))
+
+
+def build_faces_vectorized(structure, template, vertex_list, target, fill_uncompleted='border', merge_quads=False,
+                           skip_cells=None, cancelled=None):
+    """
+    Same as build_faces, but the faces completely inside the target are found in bulk and only the faces
+    over the target edges are processed one by one. Faces that can't touch the target are skipped, so the
+    empty faces of the 'border' mode are not created.
+    Quad merging is not vectorized: build_faces is used
+    :param skip_cells: bool[rows - 1][columns - 1] - cells whose faces are not created (see roofeus.build_faces)
+    :param cancelled: threading.Event - checked once per row of the faces over the target edges (see
+     roofeus.build_faces)
+    :return: created faces (see roofeus.build_faces)
+    """
+    if merge_quads or len(template.faces) == 0 or len(structure) < 2:
+        return build_faces(structure, template, vertex_list, target, fill_uncompleted, merge_quads, skip_cells,
+                           cancelled)
+
+    compiled = RFCompiledTemplate(template)
+    _offsets, row_shifts = get_row_offsets(template, get_first_row(target), len(structure))
+    face_vertex, valid = gather_faces(compiled, structure, row_shifts)
+    face_count = len(template.faces)
+    if skip_cells is not None:
+        valid &= ~np.repeat(np.asarray(skip_cells, dtype=bool).reshape(-1), face_count)
+
+    inside = np.fromiter((v.inside for v in vertex_list), dtype=bool, count=len(vertex_list))
+    corner_inside = inside[face_vertex]
+    all_inside = valid & np.all(corner_inside, axis=1)
+
+    if str(fill_uncompleted) == 'border':
+        boundary = valid & ~all_inside & touch_target(vertex_list, face_vertex, target)
+    elif str(fill_uncompleted) == 'vertex':
+        boundary = valid & ~all_inside & np.any(corner_inside, axis=1)
+    else:
+        boundary = np.zeros(len(face_vertex), dtype=bool)
+
+    face_lists = face_vertex.tolist()
+    sizes = compiled.face_sizes.tolist()
+    if min(sizes) != max(sizes):
+        face_lists = [f[:sizes[i % face_count]] for i, f in enumerate(face_lists)]
+
+    faces = []
+    faces_index = []
+    bounding_edge_list = []
+    border_vertex = []
+    border_vertex_index = len(vertex_list)
+    inside_positions = np.flatnonzero(all_inside)
+    inside_start = 0
+    row_size = (len(structure[0]) - 1) * face_count  # Faces of every row of cells
+    checked_row = -1
+    for position in np.flatnonzero(boundary).tolist():
+        if position // row_size != checked_row:
+            checked_row = position // row_size
+            if is_cancelled(cancelled):
+                return faces, faces_index, bounding_edge_list, border_vertex
+        # Faces inside the target before this one
+        inside_end = np.searchsorted(inside_positions, position)
+        run = inside_positions[inside_start:inside_end].tolist()
+        faces.extend([face_lists[i] for i in run])
+        faces_index.extend([i % face_count for i in run])
+        inside_start = inside_end
+
+        face_vertex_list = face_lists[position]
+        if str(fill_uncompleted) == 'border':
+            border_vertex, border_vertex_index = build_borders(target, vertex_list, faces, faces_index,
+                                                               position % face_count, face_vertex_list,
+                                                               border_vertex, border_vertex_index)
+        else:
+            add_bounding_edges(vertex_list, face_vertex_list, bounding_edge_list)
+    run = inside_positions[inside_start:].tolist()
+    faces.extend([face_lists[i] for i in run])
+    faces_index.extend([i % face_count for i in run])
     return faces, faces_index, bounding_edge_list, border_vertex
 
 
-def create_mesh(template, target, fill_uncompleted):
+def boundary_loops(faces, edge_count=None):
+    """
+    Returns the closed loops made by the edges used by only one face
+    :param faces: int[][] - faces
+    :param edge_count: {frozenset(int, int): int} - uses of the edges of faces not in the list (None if there isn't any)
+    :return: int[][] - vertex loops
     """
-    Fills the target with the pattern defined in template
+    edge_count = dict(edge_count or {})
+    for face in faces:
+        for i in range(0, len(face)):
+            edge = frozenset((face[i], face[(i + 1) % len(face)]))
+            edge_count[edge] = edge_count.get(edge, 0) + 1
+
+    neighbors = {}  # vertex: vertex[] linked by a boundary edge
+    for edge, count in edge_count.items():
+        if count == 1 and len(edge) == 2:
+            v1, v2 = tuple(edge)
+            neighbors.setdefault(v1, []).append(v2)
+            neighbors.setdefault(v2, []).append(v1)
+
+    loops = []
+    while neighbors:
+        start = next(iter(neighbors))
+        loop = [start]
+        current = start
+        while current in neighbors:
+            next_vertex = neighbors[current].pop()
+            neighbors[next_vertex].remove(current)
+            for v in (current, next_vertex):
+                if not neighbors[v]:
+                    del neighbors[v]
+            if next_vertex == start:
+                break
+            loop.append(next_vertex)
+            current = next_vertex
+
+        # Faces touching by a vertex make loops that pass twice by it: split them in simple loops
+        path = []
+        for v in loop:
+            if v in path:
+                position = path.index(v)
+                loops.append(path[position:])
+                path = path[:position]
+            path.append(v)
+        loops.append(path)
+    return [loop for loop in loops if len(loop) >= 3]
+
+
+def fill_to_vertex(vertex_list, faces, target, edge_count=None, bounding_edge_list=(), cancelled=None):
+    """
+    Triangulates the space between the target edges and the created faces. The bounding edges are constraints of the
+    triangulation: their vertex are added to it and the triangles are flipped to contain their edges (if possible)
+    :param vertex_list: VertexData[] - created vertex
+    :param faces: int[][] - faces completely inside the target
+    :param target: RFTargetVertex[] - target face
+    :param edge_count: {frozenset(int, int): int} - uses of the edges of other faces inside the target (see
+     boundary_loops)
+    :param bounding_edge_list: (int, int)[] - edges between the inside vertex of the faces partially inside the
+     target (see add_bounding_edges)
+    :param cancelled: threading.Event - checked before every bounding edge is added, that stops (returning no
+     triangles) when it is set
+    :return: int[][] - new triangles, with the same orientation than the target
+    """
+    loops = [[(i, vertex_list[i].coords_2d) for i in loop] for loop in boundary_loops(faces, edge_count)]
+
+    # Only the outer loops of the created faces are holes. The inner ones are empty space in the template
+    holes = []
+    for loop in loops:
+        (_i1, p1), (_i2, p2) = loop[0], loop[1]
+        midpoint = ((p1[0] + p2[0]) / 2, (p1[1] + p2[1]) / 2)
+        if not any([point_in_polygon(midpoint, [p[1] for p in other]) for other in loops if other is not loop]):
+            holes.append(loop)
+
+    outer = [(-1 - i, target[i].uvs) for i in range(0, len(target))]
+    triangles = triangulate_polygon_with_holes(outer, holes)
+
+    points = dict(outer + [p for loop in loops for p in loop])
+    fixed_edges = set([frozenset((loop[k - 1][0], loop[k][0])) for loop in [outer] + loops
+                       for k in range(0, len(loop))])
+    for k, i in enumerate([i for edge in bounding_edge_list for i in edge]):
+        if k % 2 == 0 and is_cancelled(cancelled):
+            return []
+        if i not in points:
+            points[i] = vertex_list[i].coords_2d
+            if not insert_triangulation_point(triangles, points, i):
+                del points[i]  # In an empty space of the template
+    for i, j in bounding_edge_list:
+        if is_cancelled(cancelled):
+            return []
+        if i != j and i in points and j in points and frozenset((i, j)) not in fixed_edges:
+            if recover_triangulation_edge(triangles, points, (i, j), fixed_edges):
+                fixed_edges.add(frozenset((i, j)))
+
+    if polygon_area([tv.uvs for tv in target]) < 0:
+        triangles = [(t[0], t[2], t[1]) for t in triangles]
+    return [list(t) for t in triangles]
+
+
+def create_mesh(template, target, fill_uncompleted, merge_quads=False, sink=None, cancelled=None, vectorized=False):
+    """
+    Fills the target with the pattern defined in template.
+    Neither the template nor the target are modified, so it can be called from several threads at the same time
     :param template: RFTemplate - template
     :param target: RFTargetVertex[] - target face
     :param fill_uncompleted: Fills the space that template faces are not completely inside the target
-    :return:
-        vertex_list:  - Vertex list to create
-        faces:  - Face list to create
-        structure: - Inner structure data
-        faces_idx: - Face indexes (only for print)
+    :param merge_quads: Merges the pairs of template triangles in quads when they are completely inside the target
+    :param sink: RFMeshSink - if set, the output is written to it and nothing is returned
+    :param cancelled: threading.Event - checked between the generation steps and once per row while the faces are
+     built, that stops (returning None) when it is set
+    :param vectorized: builds the faces with build_faces_vectorized (the faces inside the target are found in bulk)
+    :return: None if sink is set or the generation was cancelled, else:
+        vertex_list: RFVertexData[] - created vertex (the inside ones, border vertex included, are created)
+        faces: int[][] - faces (negative indices are target vertex, faces with less than 3 vertex are not created)
+        bounding_edge_list: (int, int)[] - edges between the inside vertex of the faces partially inside the target
     """
     mesh_2d = create_2d_mesh(template, target)
+    if is_cancelled(cancelled):
+        return None
     vertex_list, structure = transform_to_3d_mesh(target, mesh_2d)
-    faces, _faces_idx, bounding_edge_list, border_vertex = build_faces(structure, template, vertex_list, target,
-                                                                       fill_uncompleted)
+    if is_cancelled(cancelled):
+        return None
+    faces, _faces_idx, bounding_edge_list, border_vertex = (build_faces_vectorized if vectorized else build_faces)(
+        structure, template, vertex_list, target, fill_uncompleted, merge_quads, cancelled=cancelled)
+    if is_cancelled(cancelled):
+        return None
+    if str(fill_uncompleted) == 'vertex':
+        faces.extend(fill_to_vertex(vertex_list, faces, target, bounding_edge_list=bounding_edge_list,
+                                    cancelled=cancelled))
+        if is_cancelled(cancelled):
+            return None
     vertex_list.extend(border_vertex)
+    if sink is not None:
+        sink.write_mesh(vertex_list, faces, bounding_edge_list, target)
+        return None
     return vertex_list, faces, bounding_edge_list
+
+
+def create_meshes(template, target_list, fill_uncompleted, merge_quads=False, sink=None, vectorized=False):
+    """
+    Fills several targets with the same template
+    :param template: RFTemplate - template
+    :param target_list: RFTargetVertex[][] - target faces
+    :param fill_uncompleted: Fills the space that template faces are not completely inside the target
+    :param merge_quads: Merges the pairs of template triangles in quads when they are completely inside the target
+    :param sink: RFMeshSink - if set, every output is written to it as soon as it is created and nothing is returned
+    :param vectorized: builds the faces with build_faces_vectorized
+    :return: (vertex_list, faces, bounding_edge_list)[] - create_mesh output of every target
+    """
+    results = []
+    for target in target_list:
+        result = create_mesh(template, target, fill_uncompleted, merge_quads, sink, vectorized=vectorized)
+        if sink is None:
+            results.append(result)
+    return None if sink is not None else results
+
+
+def template_edge_length(template):
+    """
+    Returns the length of the template edges inside one cell (edges repeated in other cells are counted once)
+    :param template: RFTemplate - template
+    :return: float
+    """
+    edges = {}
+    for face in template.faces:
+        for i in range(0, len(face.vertex)):
+            v1 = face.vertex[i]
+            v2 = face.vertex[(i + 1) % len(face.vertex)]
+            (i1, c1), (i2, c2) = template.get_vertex_cell(v1), template.get_vertex_cell(v2)
+            min_dx, min_dy = min(c1[0], c2[0]), min(c1[1], c2[1])
+            key = frozenset([(i1, c1[0] - min_dx, c1[1] - min_dy), (i2, c2[0] - min_dx, c2[1] - min_dy)])
+            edges[key] = size_vector(sub_vectors(v1.coords, v2.coords))
+    return sum(edges.values())
+
+
+def target_uv_size(target):
+    """
+    Returns the uv area and perimeter of a target (in template cells)
+    :param target: RFTargetVertex[] - target face
+    :return: area, perimeter
+    """
+    uvs = [v.uvs for v in target]
+    area = 0
+    perimeter = 0
+    for i in range(0, len(uvs)):
+        uv1, uv2 = uvs[i], uvs[(i + 1) % len(uvs)]
+        area += uv1[0] * uv2[1] - uv2[0] * uv1[1]
+        perimeter += size_vector(sub_vectors(uv2, uv1))
+    return abs(area) / 2, perimeter
+
+
+def estimate_border_crossings(template, perimeter):
+    """
+    Mean number of template edges crossed by the target edges (Cauchy-Crofton formula)
+    """
+    return perimeter * 2 * template_edge_length(template) / pi
+
+
+def estimate_vertex_terms(template, target, fill_uncompleted='border'):
+    """
+    Returns the estimated create_mesh vertex count as a polynomial of the uv scale s (see scale_target):
+    quadratic * s^2 + linear * s + constant. The uv area grows with s^2 and the perimeter with s
+    :param template: RFTemplate - template
+    :param target: RFTargetVertex[] - target face
+    :param fill_uncompleted: Fills the space that template faces are not completely inside the target
+    :return: (quadratic, linear, constant)
+    """
+    area, perimeter = target_uv_size(target)
+    linear = estimate_border_crossings(template, perimeter) if str(fill_uncompleted) == 'border' else 0.0
+    return template.vertex_count * area, linear, len(target)
+
+
+def estimate_mesh_size(template, target, fill_uncompleted='border'):
+    """
+    Estimates the create_mesh output size without building it, from the target UV area and perimeter (in template
+    cells) and the template vertex, faces and edges
+    :param template: RFTemplate - template
+    :param target: RFTargetVertex[] - target face
+    :param fill_uncompleted: Fills the space that template faces are not completely inside the target
+    :return: RFMeshEstimate - vertex and faces that will be created (nothing for an empty template)
+    """
+    if template.vertex_count == 0:
+        return RFMeshEstimate()
+    uvs = [v.uvs for v in target]
+    area, perimeter = target_uv_size(target)
+    border_crossings = estimate_border_crossings(template, perimeter)
+    quadratic, linear, constant = estimate_vertex_terms(template, target, fill_uncompleted)
+
+    vertex_count = quadratic + linear
+    face_count = len(template.faces) * area
+    if str(fill_uncompleted) == 'border':
+        face_count += border_crossings / 2
+    elif str(fill_uncompleted) == 'none':
+        face_count -= border_crossings / 2
+
+    cells = (floor(max([uv[0] for uv in uvs])) - floor(min([uv[0] for uv in uvs])) + 3) * \
+            (floor(max([uv[1] for uv in uvs])) - floor(min([uv[1] for uv in uvs])) + 3)
+    seconds = cells * template.vertex_count * SECONDS_PER_PROJECTED_VERTEX
+    if str(fill_uncompleted) == 'border':
+        seconds += border_crossings * SECONDS_PER_BORDER_FACE
+
+    return RFMeshEstimate(int(round(vertex_count)) + constant, max(int(round(face_count)), 0), seconds)
+
+
+def scale_target(target, scale):
+    """
+    Copies a target with its uvs multiplied by scale, so the template lattice is 1 / scale times bigger over it.
+    The other attributes of the vertex (ident, coords...) are kept
+    :param target: RFTargetVertex[] - target face
+    :param scale: uv scale
+    :return: RFTargetVertex[]
+    """
+    scaled = []
+    for tv in target:
+        scaled_vertex = copy(tv)
+        scaled_vertex.uvs = (tv.uvs[0] * scale, tv.uvs[1] * scale)
+        scaled.append(scaled_vertex)
+    return scaled
+
+
+def mesh_vertex_count(vertex_list, faces, bounding_edge_list, target):
+    """
+    Counts the vertex of a create_mesh output that will be created (the ones used by faces) and the target vertex.
+    The vertex of the bounding edges are only created if they are in a face (see fill_to_vertex)
+    """
+    used = set([i for face in faces if len(face) >= 3 for i in face if i >= 0])
+    return len([i for i in used if vertex_list[i].inside]) + len(target)
+
+
+def initial_uv_scale(vertex_terms, vertex_budget):
+    """
+    Solves the uv scale whose estimated vertex count is the budget
+    :param vertex_terms: (quadratic, linear, constant) - estimated vertex count polynomial (see estimate_vertex_terms)
+    :param vertex_budget: wanted vertex count
+    :return: uv scale (MIN_UV_SCALE if the budget is not reachable)
+    """
+    quadratic, linear, constant = vertex_terms
+    remaining = vertex_budget - constant
+    if remaining <= 0:
+        return MIN_UV_SCALE
+    if quadratic > 0:
+        scale = (-linear + sqrt(linear * linear + 4 * quadratic * remaining)) / (2 * quadratic)
+    elif linear > 0:
+        scale = remaining / linear
+    else:
+        scale = 1.0
+    return max(scale, MIN_UV_SCALE)
+
+
+def solve_uv_scale(vertex_terms, vertex_budget, generate, tolerance=0.05, max_iterations=8):
+    """
+    Finds the uv scale whose output has the budget vertex count. Begins with the estimated scale and refines it
+    with the real outputs (secant method, kept inside the scales known to be under and over the budget)
+    :param vertex_terms: (quadratic, linear, constant) - estimated vertex count polynomial (see estimate_vertex_terms)
+    :param vertex_budget: wanted vertex count
+    :param generate: function(scale) -> (vertex count, output) - generates the output at a scale
+    :param tolerance: allowed difference with the budget, relative to it
+    :param max_iterations: maximum number of outputs generated
+    :return: scale, vertex count and output of the generated output nearest to the budget
+    """
+    scale = initial_uv_scale(vertex_terms, vertex_budget)
+    best = None
+    under = None  # (scale, error) - biggest scale under the budget
+    over = None  # (scale, error) - smallest scale over the budget
+    previous = None
+    for _ in range(0, max_iterations):
+        count, output = generate(scale)
+        error = count - vertex_budget
+        if best is None or abs(error) < abs(best[1] - vertex_budget):
+            best = (scale, count, output)
+        if abs(error) <= tolerance * vertex_budget:
+            break
+        if error < 0 and (under is None or scale > under[0]):
+            under = (scale, error)
+        elif error > 0 and (over is None or scale < over[0]):
+            over = (scale, error)
+
+        if previous is not None and error != previous[1]:
+            next_scale = scale - error * (scale - previous[0]) / (error - previous[1])
+        else:
+            # The vertex count grows with the uv area
+            next_scale = scale * sqrt(vertex_budget / max(count, 1))
+        if under is not None and over is not None and not under[0] < next_scale < over[0]:
+            next_scale = (under[0] + over[0]) / 2
+        previous = (scale, error)
+        scale = max(next_scale, MIN_UV_SCALE)
+    return best
+
+
+def create_mesh_for_budget(template, target, vertex_budget, fill_uncompleted, merge_quads=False, tolerance=0.05):
+    """
+    Fills the target scaling its uvs, so the output has about vertex_budget vertex
+    :param template: RFTemplate - template
+    :param target: RFTargetVertex[] - target face (not modified)
+    :param vertex_budget: wanted vertex count (see mesh_vertex_count)
+    :param fill_uncompleted: Fills the space that template faces are not completely inside the target
+    :param merge_quads: Merges the pairs of template triangles in quads when they are completely inside the target
+    :param tolerance: allowed difference with the budget, relative to it
+    :return: uv scale, scaled target and create_mesh output (vertex_list, faces, bounding_edge_list)
+    """
+    def generate(scale):
+        scaled = scale_target(target, scale)
+        output = create_mesh(template, scaled, fill_uncompleted, merge_quads)
+        return mesh_vertex_count(*output, scaled), (scaled, output)
+
+    scale, _count, (scaled, output) = solve_uv_scale(estimate_vertex_terms(template, target, fill_uncompleted),
+                                                     vertex_budget, generate, tolerance)
+    return scale, scaled, output
@@ -1,30 +1,55 @@
+import json
+import time
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from math import floor
+from types import SimpleNamespace
+import numpy as np
 import bpy, bmesh
+import gpu
+from gpu_extras.batch import batch_for_shader
 import roofeus.models as rfsm
 import roofeus.roofeus as rfs
 import roofeus.utils as rfsu
+import roofeus.cache_optimizer as rfsc
+import roofeus.displacement as rfsd
+import roofeus.instancing as rfsi
+import roofeus.template_generator as rfstg
 
+PREVIEW_COLOR = (1.0, 0.5, 0.0, 1.0)
+SOURCES_PROPERTY = "roofeus_sources"  # Object property with the provenance records of the outputs (json)
+TILES_COLLECTION = "Roofeus tiles"  # Hidden collection with the tile objects of the instanced outputs
 
-def build_target_list(bm):
+
+def build_target_list(bm, scope='selection', read_only=False):
     """
     Builds roofeus target data from selected blender face
     :param bm: selected object
+    :param scope: 'selection' for the selected faces, 'object' for every visible face
+    :param read_only: doesn't create or write any layer (the target ids are not stored in the roofeus_id layer, and
+     the active uv layer must exist)
     :return: roofeus target data and selected blender faces
     """
-    rfsm.RFTargetVertex.id_neg = -1
     target_list = []
-    roofeus_id_layer = bm.verts.layers.int.get("roofeus_id") or bm.verts.layers.int.new("roofeus_id")
-    uv_layer = bm.loops.layers.uv.verify()
+    if read_only:
+        roofeus_id_layer = None
+        uv_layer = bm.loops.layers.uv.active
+    else:
+        roofeus_id_layer = bm.verts.layers.int.get("roofeus_id") or bm.verts.layers.int.new("roofeus_id")
+        uv_layer = bm.loops.layers.uv.verify()
     affected_faces = []
     for face in bm.faces:
-        if face.select:
+        if face.select or (scope == 'object' and not face.hide):
             target = []
-            rfsm.RFTargetVertex.reset_index()
+            target_context = rfsm.RFTargetContext()
             for loop in face.loops:
                 coords = loop.vert.co
                 uv = loop[uv_layer].uv
-                target_vertex = rfsm.RFTargetVertex(coords[0], coords[1], coords[2], uv[0], 1 - uv[1])
+                target_vertex = target_context.create_vertex(coords[0], coords[1], coords[2], uv[0], 1 - uv[1])
                 target_vertex.bl_vertex = loop.vert
-                target_vertex.bl_vertex[roofeus_id_layer] = target_vertex.ident
+                if roofeus_id_layer is not None:
+                    target_vertex.bl_vertex[roofeus_id_layer] = target_vertex.ident
                 target.append(target_vertex)
 
             target_list.append(target)
@@ -32,31 +57,54 @@ def build_target_list(bm):
     return target_list, affected_faces
 
 
-def create_result_mesh(bm, vertex_list, faces, target, bounding_edge_list, context):
+def mark_fixed_targets(target_list, faces):
+    """
+    Sets the displacement data of the target vertex: their vertex normal, and whether they (fixed) or their edge to
+    the next vertex (fixed_edge) are shared with faces that are not processed. Displacing those would move geometry
+    that is not processed or open cracks with it
+    :param target_list: RFTargetVertex[][] - targets, with their blender vertex
+    :param faces: processed blender faces
+    """
+    processed = set(faces)
+    for target in target_list:
+        for k, tv in enumerate(target):
+            next_vertex = target[(k + 1) % len(target)].bl_vertex
+            edge = next((e for e in tv.bl_vertex.link_edges if next_vertex in e.verts), None)
+            tv.normal = tuple(tv.bl_vertex.normal)
+            tv.offset = (0.0, 0.0, 0.0)  # Displacement of the blender vertex (see bake_results)
+            tv.fixed = any([f not in processed for f in tv.bl_vertex.link_faces])
+            tv.fixed_edge = edge is None or any([f not in processed for f in edge.link_faces])
+
+
+def create_result_mesh(bm, vertex_list, faces, target, material_index):
     """
-    Creates blender data from roofeus output
+    Creates blender data from roofeus output. Only the vertex used by the faces are created (the vertex of the
+    bounding edges are in the faces that fill the target, see roofeus.fill_to_vertex)
     :param bm: blender object
     :param vertex_list: roofeus output vertex
     :param faces: roofeus output faces
     :param target: target face
-    :param bounding_edge_list: bounding edges
-    :param context: context for properties
+    :param material_index: material of the new faces
+    :return: new blender faces
     """
 
-    props = context.scene.roofeus
     roofeus_id_layer = bm.verts.layers.int.get("roofeus_id") or bm.verts.layers.int.new("roofeus_id")
+    uv_layer = bm.loops.layers.uv.verify()
 
     # Create vertex
     bvertex_list = []
-    face_vertex_list = [item for sublist in faces for item in sublist]
-    bounding_edge_vertex_list = [item for sublist in bounding_edge_list for item in sublist]
+    vertex_uvs = {}  # blender vertex: uv
+    face_vertex_list = set([item for sublist in faces if len(sublist) >= 3 for item in sublist])
     for v in vertex_list:
-        if v.inside and (v.index in face_vertex_list or v.index in bounding_edge_vertex_list):
+        if v.inside and v.index in face_vertex_list:
             new_vertex = bm.verts.new(v.coords_3d)
             new_vertex[roofeus_id_layer] = v.index
             bvertex_list.append(new_vertex)
+            vertex_uvs[new_vertex] = (v.coords_2d[0], 1 - v.coords_2d[1])
         else:
             bvertex_list.append(None)  # Append to preserve index relation
+    for tv in target:
+        vertex_uvs[tv.bl_vertex] = (tv.uvs[0], 1 - tv.uvs[1])
 
     # Create faces
     new_faces = []
@@ -79,51 +127,686 @@ def create_result_mesh(bm, vertex_list, faces, target, bounding_edge_list, conte
             # print("WARN: Incomplete face. len:", len(face))
             pass
 
-    def select_bounding_edges():
-        bpy.ops.mesh.select_mode(type='EDGE', action='ENABLE')
-        bpy.ops.mesh.select_all(action='DESELECT')
-        target_vertex = [t.bl_vertex for t in target]
-        for v in target_vertex:
-            for edge in v.link_edges:
-                if all([edge_v in target_vertex for edge_v in edge.verts]):
-                    edge.select = True
-
-        for bounding_edge in bounding_edge_list:
-            edge_verts = [bvertex_list[vert] for vert in bounding_edge]
-            edge = bm.edges.get(edge_verts) or bm.edges.new(edge_verts)
-            edge.select = True
-
-    # fill uncompleted faces
-    if str(props.fill_uncompleted) == 'vertex':
-        select_bounding_edges()
-        bpy.ops.mesh.fill()
+    # Setup UVs
+    for face in new_faces:
+        face.material_index = material_index
+        for loop in face.loops:
+            loop[uv_layer].uv = vertex_uvs[loop.vert]
+    return new_faces
+
+
+def generate_result(template, target, props):
+    """
+    Runs roofeus over a target with the panel options
+    :param template: template
+    :param target: target face
+    :param props: roofeus properties
+    :return: (target, vertex_list, faces, bounding_edge_list, instanced, acmr) - instanced is the RFInstancedMesh with
+     the instances if the instanced output is enabled (vertex_list, faces and bounding_edge_list are the real
+     geometry), and acmr the average cache miss ratio (before, after) if the vertex order is optimized
+    """
+    instanced = None
+    acmr = None
+    if props.instanced_output and not props.bake_displacement:
+        instanced = rfsi.create_instanced_mesh(template, target, props.fill_uncompleted, props.quad_dominant)
+        vertex_list, faces, bounding_edge_list = instanced.vertex_list, instanced.faces, instanced.bounding_edge_list
+    else:
+        vertex_list, faces, bounding_edge_list = rfs.create_mesh(template, target, props.fill_uncompleted,
+                                                                 props.quad_dominant,
+                                                                 vectorized=props.vectorized_faces)
+    if props.optimize_vertex_cache:
+        vertex_list, faces, bounding_edge_list, acmr_before, acmr_after = \
+            rfsc.optimize_vertex_cache(vertex_list, faces, bounding_edge_list)
+        acmr = (acmr_before, acmr_after)
+    return target, vertex_list, faces, bounding_edge_list, instanced, acmr
+
+
+def results_vertex_count(results):
+    """
+    Counts the vertex of generate_result outputs (with their instances). Target vertex shared by several faces are
+    counted once
+    :param results: (target, vertex_list, faces, bounding_edge_list, instanced, acmr)[]
+    """
+    count = 0
+    target_vertex = set()
+    for target, vertex_list, faces, bounding_edge_list, instanced, _acmr in results:
+        count += rfs.mesh_vertex_count(vertex_list, faces, bounding_edge_list, []) + \
+            (instanced.instance_count * len(instanced.tile_positions) if instanced is not None else 0)
+        target_vertex.update([tv.bl_vertex for tv in target])
+    return count + len(target_vertex)
+
+
+def results_text(results, instances=(0, 0)):
+    """
+    Describes the generate_result outputs for the operator reports: face count, average cache miss ratio of the
+    optimized outputs (weighted by their faces) and instances
+    :param results: (target, vertex_list, faces, bounding_edge_list, instanced, acmr)[]
+    :param instances: (instance count, tile count) - see create_instance_objects
+    :return: str
+    """
+    text = f"{len(results)} faces"
+    optimized = [(len(faces), acmr) for _target, _vertex_list, faces, _edges, _instanced, acmr in results
+                 if acmr is not None]
+    weight = sum([count for count, _acmr in optimized])
+    if weight > 0:
+        acmr_before = sum([count * acmr[0] for count, acmr in optimized]) / weight
+        acmr_after = sum([count * acmr[1] for count, acmr in optimized]) / weight
+        text += f", ACMR {acmr_before:.3f} -> {acmr_after:.3f}"
+    if instances[0] > 0:
+        text += f", {instances[0]} instances of {instances[1]} tiles"
+    return text
+
+
+def fit_uv_scale(props, jobs, refine=True):
+    """
+    Scales the target uvs so the output has props.fit_vertex_count vertex, for the whole selection or for each face
+    (props.fit_uv_scale). The scale is estimated and, if refine is set, corrected with the real outputs
+    :param props: roofeus properties
+    :param jobs: (template, target)[]
+    :param refine: generates the outputs to correct the estimated scale
+    :return: scaled jobs ((template, target)[]), their generate_result outputs (None if not refined) and the scale
+     of every job
+    """
+    if props.fit_uv_scale == 'off':
+        return jobs, None, [1.0] * len(jobs)
+
+    groups = [jobs] if props.fit_uv_scale == 'selection' else [[job] for job in jobs]
+    scaled_jobs = []
+    results = []
+    scales = []
+    for group in groups:
+        terms = [rfs.estimate_vertex_terms(template, target, props.fill_uncompleted) for template, target in group]
+        terms = tuple([sum([t[i] for t in terms]) for i in range(0, 3)])
+        if refine:
+            def generate(scale):
+                group_results = [generate_result(template, rfs.scale_target(target, scale), props)
+                                 for template, target in group]
+                return results_vertex_count(group_results), group_results
+
+            scale, _count, group_results = rfs.solve_uv_scale(terms, props.fit_vertex_count, generate,
+                                                              props.fit_tolerance)
+            results.extend(group_results)
+        else:
+            scale = rfs.initial_uv_scale(terms, props.fit_vertex_count)
+        scaled_jobs.extend([(template, rfs.scale_target(target, scale)) for template, target in group])
+        scales.extend([scale] * len(group))
+    return scaled_jobs, results if refine else None, scales
+
+
+def scale_text(scales):
+    low, high = min(scales), max(scales)
+    return f"UV scale {low:.3f}" if high - low < 1e-6 else f"UV scale {low:.3f} - {high:.3f}"
+
+
+def generation_options(props, final=True):
+    """
+    Copies the options used by generate_result, so it can run in a worker thread while the panel is edited
+    :param props: roofeus properties
+    :param final: False for a sparse preview level (no instances, no vertex cache optimization)
+    :return: object with the generate_result options
+    """
+    return SimpleNamespace(fill_uncompleted=props.fill_uncompleted, quad_dominant=props.quad_dominant,
+                           instanced_output=props.instanced_output and final,
+                           bake_displacement=props.bake_displacement,
+                           optimize_vertex_cache=props.optimize_vertex_cache and final,
+                           vectorized_faces=props.vectorized_faces)
+
+
+def preview_template(template, level, level_count, ratio=4):
+    """
+    Returns the template of a preview level: the last level uses the template, and every previous one has ratio
+    times less vertex
+    :param template: RFTemplate
+    :param level: preview level (0 is the sparsest one)
+    :param level_count: preview levels
+    :param ratio: vertex reduction between levels
+    :return: RFTemplate
+    """
+    if level == level_count - 1:
+        return template
+    return rfstg.decimate_template(template, template.vertex_count // ratio ** (level_count - 1 - level))
+
+
+def generate_preview(jobs, level, level_count, options, cancelled):
+    """
+    Runs roofeus over every target with the template of a preview level. Runs in a worker thread, so it doesn't
+    touch blender data (the targets are copies of the face data)
+    :param jobs: (template, target)[]
+    :param level: preview level
+    :param level_count: preview levels
+    :param options: generate_result options (see generation_options)
+    :param cancelled: threading.Event set when the level is not needed anymore
+    :return: (target, vertex_list, faces, bounding_edge_list, instanced, acmr)[] for each job (None if cancelled)
+    """
+    templates = {}  # id(template): template of the level
+    results = []
+    for template, target in jobs:
+        if cancelled.is_set():
+            return None
+        if id(template) not in templates:
+            templates[id(template)] = preview_template(template, level, level_count)
+        results.append(generate_result(templates[id(template)], target, options))
+    return results
+
+
+def preview_lines(results):
+    """
+    Builds the edges of the roofeus outputs (with their instances) to draw them as lines
+    :param results: (target, vertex_list, faces, bounding_edge_list, instanced, acmr)[]
+    :return: positions (x, y, z)[] (object space) and edges (int, int)[]
+    """
+    positions = []
+    edges = set()
+
+    def add_faces(faces, offset, target_offset):
+        for face in faces:
+            if len(face) >= 3:
+                face = [offset + i if i >= 0 else target_offset - 1 - i for i in face]
+                for a, b in zip(face, face[1:] + face[:1]):
+                    edges.add((min(a, b), max(a, b)))
+
+    for target, vertex_list, faces, _bounding_edge_list, instanced, _acmr in results:
+        offset = len(positions)
+        positions.extend([tuple(v.coords_3d) for v in vertex_list])
+        positions.extend([tv.coords for tv in target])
+        add_faces(faces, offset, offset + len(vertex_list))
+        if instanced is not None and instanced.instance_count > 0:
+            instance_positions, _uvs, instance_faces = rfsi.expand_instances(instanced)
+            offset = len(positions)
+            positions.extend([tuple(p) for p in instance_positions.tolist()])
+            add_faces(instance_faces, offset, offset)
+    return positions, sorted(edges)
+
+
+def draw_preview(operator):
+    """
+    Draw handler of the preview operator: draws the lines of the last finished level over the object
+    """
+    if operator.lines is None:
+        return
+    if operator.batch is None:
+        positions, edges = operator.lines
+        operator.batch = batch_for_shader(operator.shader, 'LINES', {"pos": positions}, indices=edges)
+    operator.shader.bind()
+    operator.shader.uniform_float("color", PREVIEW_COLOR)
+    with gpu.matrix.push_pop():
+        gpu.matrix.multiply_matrix(operator.obj.matrix_world)
+        operator.batch.draw(operator.shader)
+
+
+def image_heightmap(image):
+    """
+    Reads a blender image as heights between 0 and 1 (average of the color channels)
+    :param image: bpy.types.Image
+    :return: float[row, column] (row 0 is the top of the image, like roofeus uv y = 0)
+    """
+    width, height = image.size
+    pixels = np.empty(width * height * image.channels, dtype=np.float32)
+    image.pixels.foreach_get(pixels)
+    pixels = pixels.reshape(height, width, image.channels)
+    heights = pixels[..., :3].mean(axis=2) if image.channels >= 3 else pixels[..., 0]
+    return heights[::-1]
+
+
+def bake_results(results, props, displace_targets=True):
+    """
+    Displaces the roofeus outputs with the displacement image, if enabled. Every vertex is moved along the
+    interpolated vertex normals of its target (see mark_fixed_targets), so the outputs that share an edge match.
+    The vertex over target edges shared with faces that are not processed are kept, and so are the target vertex
+    shared with them or over a uv seam
+    :param results: (target, vertex_list, faces, bounding_edge_list, instanced, acmr)[] - roofeus output for each
+     original face
+    :param props: roofeus properties
+    :param displace_targets: False if the target vertex are already displaced (regenerated outputs)
+    """
+    if not props.bake_displacement or props.displacement_image is None:
+        return
+    heightmap = image_heightmap(props.displacement_image)
+    meshes = [(target, vertex_list) for target, vertex_list, _faces, _edges, _instanced, _acmr in results]
+    corner_normals = [[tv.normal for tv in target] for target, _vertex_list in meshes]
+    fixed_edges = [[k for k, tv in enumerate(target) if tv.fixed_edge] for target, _vertex_list in meshes]
+    rfsd.bake_displacement(meshes, heightmap, props.displacement_strength, props.displacement_midlevel,
+                           corner_normals, fixed_edges)
+    if not displace_targets:
+        return
+
+    target_vertex = {}  # blender vertex: RFTargetVertex[] (a vertex shared by several targets is displaced once)
+    for target, _vertex_list in meshes:
+        for tv in target:
+            target_vertex.setdefault(tv.bl_vertex, []).append(tv)
+    moved = [(v, uses) for v, uses in target_vertex.items() if not uses[0].fixed and
+             all([abs(tv.uvs[0] - uses[0].uvs[0]) < 1e-6 and abs(tv.uvs[1] - uses[0].uvs[1]) < 1e-6 for tv in uses])]
+    positions = rfsd.displace_positions([v.co for v, _uses in moved], [uses[0].uvs for _v, uses in moved],
+                                        [uses[0].normal for _v, uses in moved], heightmap,
+                                        props.displacement_strength, props.displacement_midlevel)
+    for (v, uses), position in zip(moved, positions.tolist()):
+        offset = tuple([p - c for p, c in zip(position, v.co)])
+        v.co = position
+        for tv in uses:
+            tv.offset = offset
+
+
+def create_tile_object(instanced, tile, material_index, obj, collection):
+    """
+    Creates an object with the tile mesh of an instanced output
+    :param instanced: RFInstancedMesh
+    :param tile: tile variant
+    :param material_index: material of the tile faces (the object has the materials of obj)
+    :param obj: edited object
+    :param collection: collection of the tiles
+    :return: new object
+    """
+    mesh = bpy.data.meshes.new(f"Roofeus tile {len(collection.objects):03d}")
+    mesh.from_pydata(instanced.tile_positions.tolist(), [], instanced.tile_faces)
+    uvs = [(uv[0], 1 - uv[1]) for face in instanced.tile_faces for uv in instanced.tile_uvs[tile][face].tolist()]
+    mesh.uv_layers.new().data.foreach_set("uv", [c for uv in uvs for c in uv])
+    mesh.polygons.foreach_set("material_index", [material_index] * len(instanced.tile_faces))
+    for material in obj.data.materials:
+        mesh.materials.append(material)
+    tile_obj = bpy.data.objects.new(mesh.name, mesh)
+    collection.objects.link(tile_obj)
+    return tile_obj
+
+
+def create_instance_objects(context, obj, results, original_faces):
+    """
+    Creates the objects of the instanced outputs: an object for every different tile, added to the "Roofeus tiles"
+    collection (hidden, created by the first run), and a point cloud object, child of obj, with a point for every
+    instance and the attributes:
+     - tile: index of the tile object in the collection
+     - instance_x, instance_y, instance_z: columns of the instance matrix (the point position is its translation)
+    :param context: blender context
+    :param obj: edited object
+    :param results: (target, vertex_list, faces, bounding_edge_list, instanced, acmr)[] - roofeus output for each face
+    :param original_faces: target blender faces
+    :return: number of instances and of tile objects
+    """
+    instanced_results = [(r[4], face.material_index) for r, face in zip(results, original_faces)
+                         if r[4] is not None and r[4].instance_count > 0]
+    if not instanced_results:
+        return 0, 0
+    # Every run adds its tiles to the same collection, so the tile indices begin after the existing tiles
+    collection = bpy.data.collections.get(TILES_COLLECTION)
+    if collection is None:
+        collection = bpy.data.collections.new(TILES_COLLECTION)
+        context.scene.collection.children.link(collection)
+        collection.hide_viewport = True
+        collection.hide_render = True
+    first_tile = len(collection.objects)
+
+    tile_index = {}  # (tile mesh, material): index in the collection
+    tiles = []
+    transforms = []
+    for instanced, material_index in instanced_results:
+        variant_tiles = []
+        for tile in range(0, len(instanced.tile_uvs)):
+            key = (instanced.tile_positions.tobytes(), str(instanced.tile_faces), instanced.tile_uvs[tile].tobytes(),
+                   material_index)
+            if key not in tile_index:
+                tile_index[key] = first_tile + len(tile_index)
+                create_tile_object(instanced, tile, material_index, obj, collection)
+            variant_tiles.append(tile_index[key])
+        tiles.append(np.array(variant_tiles, dtype=np.int32)[instanced.instance_tiles])
+        transforms.append(instanced.transforms)
+    tiles = np.concatenate(tiles)
+    transforms = np.concatenate(transforms)
+
+    mesh = bpy.data.meshes.new("Roofeus instances")
+    mesh.from_pydata(transforms[:, :3, 3].tolist(), [], [])
+    mesh.attributes.new("tile", 'INT', 'POINT').data.foreach_set("value", tiles)
+    for column, name in enumerate(("instance_x", "instance_y", "instance_z")):
+        attribute = mesh.attributes.new(name, 'FLOAT_VECTOR', 'POINT')
+        attribute.data.foreach_set("vector", transforms[:, :3, column].reshape(-1))
+    points = bpy.data.objects.new("Roofeus instances", mesh)
+    points.parent = obj
+    context.scene.collection.objects.link(points)
+    return len(tiles), len(tile_index)
 
+
+def commit_results(bm, obj, results, original_faces, sources):
+    """
+    Creates the blender data of every roofeus output, records its provenance and deletes the original faces.
+    The edit mesh is updated once, at the end
+    :param bm: blender object
+    :param obj: edited object
+    :param results: (target, vertex_list, faces, bounding_edge_list, instanced, acmr)[] - roofeus output for each
+     original face (the instances are created by create_instance_objects)
+    :param original_faces: target blender faces
+    :param sources: provenance record of every output (see job_sources)
+    """
+    new_faces = []
+    for (target, vertex_list, faces, _edges, _instanced, _acmr), orig_face in zip(results, original_faces):
+        new_faces.append(create_result_mesh(bm, vertex_list, faces, target, orig_face.material_index))
+    # Outputs used as targets again are replaced, so they can't be regenerated
+    source_layer = bm.faces.layers.int.get("roofeus_source")
+    replaced = set([face[source_layer] for face in original_faces]) if source_layer is not None else set()
+    bmesh.ops.delete(bm, geom=original_faces, context='FACES_ONLY')
+    new_faces = [[face for face in faces if face.is_valid] for faces in new_faces]
+    record_sources(bm, obj, sources, results, new_faces, replaced)
+    finish_commit(bm, obj, [face for faces in new_faces for face in faces])
+
+
+def finish_commit(bm, obj, new_faces):
+    """
+    Selects the new faces, recalculates their normals and updates the edit mesh
+    :param bm: blender object
+    :param obj: edited object
+    :param new_faces: created blender faces
+    """
     # Select every new face
-    bpy.ops.mesh.select_mode(type='FACE', action='ENABLE')
-    bpy.ops.mesh.select_all(action='DESELECT')
+    bm.select_mode = {'FACE'}
+    for face in bm.faces:
+        face.select_set(False)
     for face in new_faces:
-        if face.is_valid:
-            face.select = True
+        face.select_set(True)
+    bm.select_flush_mode()
 
     # Recalculate normals
-    bpy.ops.mesh.normals_make_consistent(inside=False)
+    bmesh.ops.recalc_face_normals(bm, faces=new_faces)
+    bmesh.update_edit_mesh(obj.data)
 
 
-def setup_uvs(bm, material_index, vertex_list, target):
-    roofeus_id_layer = bm.verts.layers.int.get("roofeus_id") or bm.verts.layers.int.new("roofeus_id")
+def generation_key(template, props):
+    """
+    Hash of a template and the options that change the generated geometry, so regeneration detects their changes
+    :param template: template
+    :param props: roofeus properties
+    :return: int (31 bits)
+    """
+    options = f"{props.fill_uncompleted},{props.quad_dominant},{props.bake_displacement}"
+    if props.bake_displacement:
+        image = props.displacement_image.name if props.displacement_image is not None else ""
+        options += f",{image},{props.displacement_strength},{props.displacement_midlevel}"
+    return zlib.crc32(options.encode(), rfsu.template_hash(template)) & 0x7fffffff
+
+
+def source_fingerprint(corners, uvs):
+    """
+    Hash of the positions and uvs of the corners of a source face, to detect when it is edited
+    :param corners: blender vertex[]
+    :param uvs: (u, v)[] - roofeus uvs of the corners
+    :return: int (31 bits)
+    """
+    text = ";".join([f"{v.co[0]:.5f},{v.co[1]:.5f},{v.co[2]:.5f}" for v in corners] +
+                    [f"{uv[0]:.5f},{uv[1]:.5f}" for uv in uvs])
+    return zlib.crc32(text.encode()) & 0x7fffffff
+
+
+def new_source(template, target, material_index, props):
+    """
+    Creates the provenance record of an output. record_sources completes it with its id, corners, fingerprint and
+    face count
+    :param template: template
+    :param target: target face (its uvs are the ones of the output, after fitting the uv scale)
+    :param material_index: material of the output faces
+    :param props: roofeus properties
+    :return: dict
+    """
+    return {"uvs": [list(tv.uvs) for tv in target], "template": generation_key(template, props),
+            "row_shift": template.row_shift, "material_index": material_index,
+            "normals": [list(tv.normal) for tv in target], "offsets": [list(tv.offset) for tv in target],
+            "fixed_edges": [tv.fixed_edge for tv in target]}
+
+
+def job_sources(jobs, results, original_faces, props):
+    """
+    Creates the provenance records of the outputs of some jobs. Instanced outputs are not recorded (their instances
+    are not in the mesh, so they can't be regenerated)
+    :return: dict[] (None for the outputs not recorded)
+    """
+    return [new_source(template, result[0], face.material_index, props) if result[4] is None else None
+            for (template, _target), result, face in zip(jobs, results, original_faces)]
+
+
+def provenance_layers(bm):
+    """
+    Returns the provenance layers, creating them if needed:
+     - corner (vertex): id of the target vertex of the outputs (0 for other vertex)
+     - vertex_source (vertex): id of the output that created the vertex (0 for target and other vertex)
+     - source (face): id of the output that created the face (0 for other faces)
+     - fingerprint (face): source_fingerprint of the target face when it was created
+     - template (face): generation_key of the template and options used
+     - cell_x, cell_y (face): template cell of the face center
+    """
+    def int_layer(layers, name):
+        return layers.int.get(name) or layers.int.new(name)
+
+    return SimpleNamespace(corner=int_layer(bm.verts.layers, "roofeus_corner"),
+                           vertex_source=int_layer(bm.verts.layers, "roofeus_vertex_source"),
+                           source=int_layer(bm.faces.layers, "roofeus_source"),
+                           fingerprint=int_layer(bm.faces.layers, "roofeus_fingerprint"),
+                           template=int_layer(bm.faces.layers, "roofeus_template"),
+                           cell_x=int_layer(bm.faces.layers, "roofeus_cell_x"),
+                           cell_y=int_layer(bm.faces.layers, "roofeus_cell_y"))
+
+
+def read_sources(obj):
+    """
+    Reads the provenance records of an object
+    :return: {source id: record}
+    """
+    return {int(key): record for key, record in json.loads(obj.get(SOURCES_PROPERTY, "{}")).items()}
+
+
+def write_sources(obj, sources):
+    obj[SOURCES_PROPERTY] = json.dumps({str(key): record for key, record in sources.items()})
+
+
+def record_sources(bm, obj, sources, results, new_faces, replaced=()):
+    """
+    Records the provenance of the outputs: their target vertex are marked in the corner layer, their faces get the
+    provenance face layers, and the records (corner ids, uvs, fingerprint, template key, face count...) are stored in
+    the object
+    :param bm: blender object
+    :param obj: edited object
+    :param sources: provenance record of every output (None if it is not recorded). Records without id get a new one
+    :param results: (target, vertex_list, faces, bounding_edge_list, instanced, acmr)[] - roofeus outputs
+    :param new_faces: blender faces of every output
+    :param replaced: ids of the sources whose faces were used as targets (their records are removed)
+    """
+    layers = provenance_layers(bm)
     uv_layer = bm.loops.layers.uv.verify()
-    # Setup UVs
+    records = read_sources(obj)
+    for source_id in replaced:
+        records.pop(source_id, None)
+    # Faces of replaced outputs can keep their id, so it is not reused
+    next_source = max(list(records.keys()) + [face[layers.source] for face in bm.faces], default=0) + 1
+    next_corner = max([v[layers.corner] for v in bm.verts], default=0) + 1
+
+    for source, result, faces in zip(sources, results, new_faces):
+        if source is None:
+            continue
+        corners = [tv.bl_vertex for tv in result[0]]
+        for v in corners:
+            if v[layers.corner] == 0:
+                v[layers.corner] = next_corner
+                next_corner += 1
+        if "id" not in source:
+            source["id"] = next_source
+            next_source += 1
+        source["corners"] = [v[layers.corner] for v in corners]
+        source["fingerprint"] = source_fingerprint(corners, source["uvs"])
+
+        for face in faces:
+            face[layers.source] = source["id"]
+            for v in face.verts:
+                if v[layers.corner] == 0:
+                    v[layers.vertex_source] = source["id"]
+            face[layers.fingerprint] = source["fingerprint"]
+            face[layers.template] = source["template"]
+            uvs = [loop[uv_layer].uv for loop in face.loops]
+            u = sum([uv[0] for uv in uvs]) / len(uvs)
+            v = 1 - sum([uv[1] for uv in uvs]) / len(uvs)
+            face[layers.cell_y] = floor(v)
+            face[layers.cell_x] = floor(u - source["row_shift"] * floor(v))
+
+    # Faces created twice (same vertex) are only counted once, by the last output that created them
+    for source, faces in zip(sources, new_faces):
+        if source is not None:
+            source["faces"] = len(set([face for face in faces if face[layers.source] == source["id"]]))
+            records[source["id"]] = {key: value for key, value in source.items() if key != "id"}
+    write_sources(obj, records)
+
+
+def find_changed_sources(bm, obj, props):
+    """
+    Finds the recorded outputs that must be regenerated: their target vertex were moved, their template or options
+    changed (see generation_key) or some of their faces were deleted
+    :param bm: blender object
+    :param obj: edited object
+    :param props: roofeus properties
+    :return: (template, target)[] and new provenance records of the changed outputs, and the number of outputs that
+     can't be regenerated (without template or with deleted target vertex)
+    """
+    default_template, material_templates = load_templates(props)
+    layers = provenance_layers(bm)
+    roofeus_id_layer = bm.verts.layers.int.get("roofeus_id") or bm.verts.layers.int.new("roofeus_id")
+    corners = {v[layers.corner]: v for v in bm.verts if v[layers.corner] > 0}
+    source_faces = {}  # source id: blender face[]
     for face in bm.faces:
-        if face.select:
-            for loop in face.loops:
-                v_index = loop.vert[roofeus_id_layer]
-                face.material_index = material_index
-                if v_index >= 0:
-                    loop[uv_layer].uv = (vertex_list[v_index].coords_2d[0],
-                                         1 - vertex_list[v_index].coords_2d[1])
-                else:
-                    loop[uv_layer].uv = (target[-1 - v_index].uvs[0],
-                                         1 - target[-1 - v_index].uvs[1])
+        if face[layers.source] > 0:
+            source_faces.setdefault(face[layers.source], []).append(face)
+
+    jobs = []
+    sources = []
+    missing = 0
+    for source_id, record in read_sources(obj).items():
+        template = material_templates.get(record["material_index"], default_template)
+        corner_vertex = [corners.get(c) for c in record["corners"]]
+        if template is None or None in corner_vertex:
+            missing += 1
+            continue
+        if source_fingerprint(corner_vertex, record["uvs"]) == record["fingerprint"] and \
+                generation_key(template, props) == record["template"] and \
+                len(source_faces.get(source_id, [])) == record["faces"]:
+            continue
+
+        # The target is rebuilt as it was before the displacement (the corners keep their displacement)
+        target_context = rfsm.RFTargetContext()
+        target = []
+        offsets = record.get("offsets", [(0.0, 0.0, 0.0)] * len(corner_vertex))
+        normals = record.get("normals", [tuple(v.normal) for v in corner_vertex])
+        fixed_edges = record.get("fixed_edges", [False] * len(corner_vertex))
+        for v, uv, offset, normal, fixed_edge in zip(corner_vertex, record["uvs"], offsets, normals, fixed_edges):
+            target_vertex = target_context.create_vertex(*[c - o for c, o in zip(v.co, offset)], uv[0], uv[1])
+            target_vertex.bl_vertex = v
+            target_vertex.normal = tuple(normal)
+            target_vertex.offset = tuple(offset)
+            target_vertex.fixed = True
+            target_vertex.fixed_edge = fixed_edge
+            v[roofeus_id_layer] = target_vertex.ident
+            target.append(target_vertex)
+        source = new_source(template, target, record["material_index"], props)
+        source["id"] = source_id
+        jobs.append((template, target))
+        sources.append(source)
+    return jobs, sources, missing
+
+
+def delete_source_geometry(bm, source_ids):
+    """
+    Deletes the faces of some outputs and their vertex left without faces (the target vertex are kept)
+    :param bm: blender object
+    :param source_ids: ids of the outputs
+    """
+    layers = provenance_layers(bm)
+    source_ids = set(source_ids)
+    faces = [face for face in bm.faces if face[layers.source] in source_ids]
+    verts = [v for v in bm.verts if v[layers.vertex_source] in source_ids]
+    bmesh.ops.delete(bm, geom=faces, context='FACES_ONLY')
+    bmesh.ops.delete(bm, geom=[v for v in verts if not v.link_faces], context='VERTS')
+
+
+def has_templates(props):
+    """
+    Checks if there is any template to apply
+    """
+    return bool(props.template_file) or (props.use_material_templates and len(props.material_templates) > 0)
+
+
+def load_templates(props):
+    """
+    Reads the default template and the templates assigned to materials
+    :param props: roofeus properties
+    :return: default template (None if not set) and {material index: template}
+    """
+    loaded = {}  # file: template, so every file is read once
+
+    def load(file):
+        file = str(bpy.path.abspath(file)) if file else ""
+        if file and file not in loaded:
+            loaded[file] = rfsu.read_template(file) or None
+            if loaded[file] is None:
+                print("Template not valid", file)
+        return loaded.get(file)
+
+    default_template = load(props.template_file)
+    material_templates = {}
+    if props.use_material_templates:
+        for item in props.material_templates:
+            template = load(item.template_file)
+            if template is not None:
+                material_templates[item.material_index] = template
+    return default_template, material_templates
+
+
+def build_jobs(bm, props, read_only=False):
+    """
+    Builds the targets of the process scope and assigns them the template of their material.
+    Faces without template are not processed
+    :param bm: blender object
+    :param props: roofeus properties
+    :param read_only: doesn't modify the mesh (see build_target_list)
+    :return: (template, target)[] grouped by template, and their blender faces
+    """
+    default_template, material_templates = load_templates(props)
+    target_list, faces = build_target_list(bm, props.target_scope, read_only)
+    groups = {}  # id(template): (template, target)[]
+    group_faces = {}  # id(template): blender face[]
+    for target, face in zip(target_list, faces):
+        template = material_templates.get(face.material_index, default_template)
+        if template is not None:
+            groups.setdefault(id(template), []).append((template, target))
+            group_faces.setdefault(id(template), []).append(face)
+
+    jobs = [job for group in groups.values() for job in group]
+    original_faces = [face for group in group_faces.values() for face in group]
+    mark_fixed_targets([target for _template, target in jobs], original_faces)
+    return jobs, original_faces
+
+
+def check_vertex_budget(operator, props, jobs):
+    """
+    Estimates the output and applies the over budget action
+    :return: False if the process must be cancelled
+    """
+    if props.max_vertex_count > 0:
+        estimate = estimate_jobs(jobs, props.fill_uncompleted)
+        props.last_estimate = estimate_text(estimate)
+        if estimate.vertex_count > props.max_vertex_count:
+            message = f"Estimated output over the vertex budget: {props.last_estimate}"
+            if props.over_budget_action == 'refuse':
+                operator.report({'ERROR'}, message)
+                return False
+            operator.report({'WARNING'}, message)
+    return True
+
+
+def estimate_jobs(jobs, fill_uncompleted):
+    """
+    Estimates the roofeus output of all the targets
+    :param jobs: (template, target)[]
+    :param fill_uncompleted: fill mode
+    :return: RFMeshEstimate
+    """
+    estimate = rfsm.RFMeshEstimate()
+    for template, target in jobs:
+        estimate = estimate + rfs.estimate_mesh_size(template, target, fill_uncompleted)
+    return estimate
+
+
+def estimate_text(estimate):
+    return f"~{estimate.vertex_count} vertices, ~{estimate.face_count} faces, ~{estimate.seconds:.1f}s"
 
 
 def on_template_file_updated(self, context):
@@ -132,6 +815,17 @@ def on_template_file_updated(self, context):
     print("Updated Template", str(bpy.path.abspath(props.template_file)))
 
 
+class RoofeusMaterialTemplate(bpy.types.PropertyGroup):
+    """Template applied to the faces of a material"""
+    material_index: bpy.props.IntProperty(name="Material index",
+                                          description="Material slot of the faces",
+                                          min=0,
+                                          default=0)
+    template_file: bpy.props.StringProperty(name="Template file",
+                                            description="Template file to populate inside the faces of the material",
+                                            subtype="FILE_PATH")
+
+
 class RoofeusProperties(bpy.types.PropertyGroup):
     """Roofeus properties"""
     template_file: bpy.props.StringProperty(name="Template file",
@@ -148,6 +842,89 @@ class RoofeusProperties(bpy.types.PropertyGroup):
                                                          " the target",
                                              items=fill_uncompleted_items,
                                              default='border')
+    target_scope_items = [
+        ('selection', 'Selected faces', 'Processes the selected faces'),
+        ('object', 'Whole object', 'Processes every visible face of the object'),
+    ]
+    target_scope: bpy.props.EnumProperty(name="Scope",
+                                         description="Faces to process",
+                                         items=target_scope_items,
+                                         default='selection')
+    use_material_templates: bpy.props.BoolProperty(name="Templates by material",
+                                                   description="Applies a different template to the faces of each "
+                                                               "material. The template file is used for the other "
+                                                               "materials",
+                                                   default=False)
+    material_templates: bpy.props.CollectionProperty(type=RoofeusMaterialTemplate)
+    max_vertex_count: bpy.props.IntProperty(name="Vertex budget",
+                                            description="Estimated vertex count that triggers the budget action "
+                                                        "(0 for no limit)",
+                                            min=0,
+                                            default=0)
+    over_budget_action_items = [
+        ('warn', 'Warn', 'Reports a warning and continues'),
+        ('refuse', 'Refuse', 'Cancels the process'),
+    ]
+    over_budget_action: bpy.props.EnumProperty(name="Over budget",
+                                               description="Action when the estimated vertex count is over the budget",
+                                               items=over_budget_action_items,
+                                               default='warn')
+    fit_uv_scale_items = [
+        ('off', 'Keep UVs', 'Uses the face UVs as they are'),
+        ('selection', 'Whole selection', 'Scales the UVs of all the faces to create the target vertex count'),
+        ('face', 'Each face', 'Scales the UVs of every face to create the target vertex count in each one'),
+    ]
+    fit_uv_scale: bpy.props.EnumProperty(name="Fit UV scale",
+                                         description="Scales the face UVs (the template size) to create a vertex "
+                                                     "count. The background and preview operators only use the "
+                                                     "estimated scale",
+                                         items=fit_uv_scale_items,
+                                         default='off')
+    fit_vertex_count: bpy.props.IntProperty(name="Target vertices",
+                                            description="Vertex count to create (for the whole selection or for "
+                                                        "each face)",
+                                            min=1,
+                                            default=10000)
+    fit_tolerance: bpy.props.FloatProperty(name="Tolerance",
+                                           description="Allowed difference with the target vertices, relative to "
+                                                       "them",
+                                           min=0.001,
+                                           max=1.0,
+                                           default=0.05)
+    last_estimate: bpy.props.StringProperty(name="Estimate",
+                                            description="Last estimated output size")
+    quad_dominant: bpy.props.BoolProperty(name="Quad dominant",
+                                          description="Merges the pairs of template triangles in quads when they "
+                                                      "are inside the target and flat",
+                                          default=False)
+    bake_displacement: bpy.props.BoolProperty(name="Bake displacement",
+                                              description="Displaces the new vertices with an image, so no Displace "
+                                                          "modifier is needed",
+                                              default=False)
+    displacement_image: bpy.props.PointerProperty(name="Displacement image",
+                                                  description="Image sampled with the face UVs (repeated)",
+                                                  type=bpy.types.Image)
+    displacement_strength: bpy.props.FloatProperty(name="Strength",
+                                                   description="Displacement of the white color",
+                                                   default=1.0)
+    displacement_midlevel: bpy.props.FloatProperty(name="Midlevel",
+                                                   description="Image value that is not displaced",
+                                                   min=0.0,
+                                                   max=1.0,
+                                                   default=0.5)
+    instanced_output: bpy.props.BoolProperty(name="Instanced interior",
+                                             description="Creates the cells completely inside the faces as "
+                                                         "instances of a tile, in a point cloud object (not used "
+                                                         "when baking displacement)",
+                                             default=False)
+    optimize_vertex_cache: bpy.props.BoolProperty(name="Optimize vertex order",
+                                                  description="Reorders the new faces and vertices to reuse the GPU "
+                                                              "vertex cache (slower generation)",
+                                                  default=False)
+    vectorized_faces: bpy.props.BoolProperty(name="Vectorized faces",
+                                             description="Finds the template faces inside the target in bulk (faster). "
+                                                         "Disable it to use the reference face builder",
+                                             default=True)
 
 
 class Roofeus(bpy.types.Operator):
@@ -158,8 +935,7 @@ class Roofeus(bpy.types.Operator):
 
     @classmethod
     def poll(cls, context):
-        props = context.scene.roofeus
-        return str(bpy.path.abspath(props.template_file))
+        return has_templates(context.scene.roofeus)
 
     def execute(self, context):
         print("Begin")
@@ -168,37 +944,325 @@ class Roofeus(bpy.types.Operator):
         bm = bmesh.from_edit_mesh(me)
 
         props = context.scene.roofeus
-        template_file = str(bpy.path.abspath(props.template_file))
-        if template_file:
-            target_list, original_faces = build_target_list(bm)
-            template = rfsu.read_template(template_file)
-            if template:
-                for target, orig_face in zip(target_list, original_faces):
-                    vertex_list, faces, bounding_edge_list = rfs.create_mesh(template, target, props.fill_uncompleted)
-                    create_result_mesh(bm, vertex_list, faces, target, bounding_edge_list, context)
-                    bmesh.update_edit_mesh(obj.data)
-                    setup_uvs(bm, orig_face.material_index, vertex_list, target)
-
-                bmesh.update_edit_mesh(obj.data)
-                bmesh.ops.delete(bm, geom=original_faces, context='FACES_ONLY')
-                print("Done")
-            else:
-                print("Template not valid")
+        jobs, original_faces = build_jobs(bm, props)
+        if not jobs:
+            self.report({'WARNING'}, "No faces with a valid template")
+            return {'CANCELLED'}
+        if not check_vertex_budget(self, props, fit_uv_scale(props, jobs, refine=False)[0]):
+            return {'CANCELLED'}
+        jobs, results, scales = fit_uv_scale(props, jobs)
+        if results is None:
+            results = [generate_result(template, target, props) for template, target in jobs]
         else:
-            print("No template file selected")
+            self.report({'INFO'}, f"{scale_text(scales)}: {results_vertex_count(results)} vertices")
+        bake_results(results, props)
+        instances = create_instance_objects(context, obj, results, original_faces)
+        commit_results(bm, obj, results, original_faces, job_sources(jobs, results, original_faces, props))
+        self.report({'INFO'}, f"Roofeus done: {results_text(results, instances)}")
+        print("Done")
+
+        return {'FINISHED'}
+
+
+class RoofeusModal(bpy.types.Operator):
+    """Mesh generator based on template, with progress report. Press Esc to cancel"""
+    bl_idname = "mesh.roofeus_modal"
+    bl_label = "Roofeus (background)"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    time_slice = 0.05  # Seconds of work for each timer event
+    navigation_events = {'MIDDLEMOUSE', 'WHEELUPMOUSE', 'WHEELDOWNMOUSE', 'TRACKPADPAN', 'TRACKPADZOOM'}
+
+    @classmethod
+    def poll(cls, context):
+        return has_templates(context.scene.roofeus)
+
+    def invoke(self, context, event):
+        props = context.scene.roofeus
+        self.obj = context.object
+        bm = bmesh.from_edit_mesh(self.obj.data)
+        self.jobs, self.original_faces = build_jobs(bm, props)
+        if not self.jobs:
+            self.report({'ERROR'}, "No faces with a valid template")
+            return {'CANCELLED'}
+        # Only the estimated scale is used, so nothing is generated before the first event
+        self.jobs = fit_uv_scale(props, self.jobs, refine=False)[0]
+        if not check_vertex_budget(self, props, self.jobs):
+            return {'CANCELLED'}
+        self.props = props
+        self.results = []
+
+        wm = context.window_manager
+        wm.progress_begin(0, len(self.jobs))
+        self.timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            # Nothing has been written in the mesh yet
+            self.finish(context)
+            self.report({'INFO'}, "Roofeus cancelled")
+            return {'CANCELLED'}
+
+        if event.type == 'TIMER':
+            start = time.perf_counter()
+            while len(self.results) < len(self.jobs) and time.perf_counter() - start < self.time_slice:
+                template, target = self.jobs[len(self.results)]
+                self.results.append(generate_result(template, target, self.props))
+            context.window_manager.progress_update(len(self.results))
+
+            if len(self.results) == len(self.jobs):
+                self.finish(context)
+                bm = bmesh.from_edit_mesh(self.obj.data)
+                bake_results(self.results, self.props)
+                instances = create_instance_objects(context, self.obj, self.results, self.original_faces)
+                commit_results(bm, self.obj, self.results, self.original_faces,
+                               job_sources(self.jobs, self.results, self.original_faces, self.props))
+                self.report({'INFO'}, f"Roofeus done: {results_text(self.results, instances)}")
+                return {'FINISHED'}
+            return {'RUNNING_MODAL'}
+
+        if event.type in self.navigation_events:
+            return {'PASS_THROUGH'}
+        # Other events are blocked, so the mesh can't be edited while processing
+        return {'RUNNING_MODAL'}
+
+    def finish(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+
+
+class RoofeusPreview(bpy.types.Operator):
+    """Draws the output over the viewport without changing the mesh, refining it in the background.
+    Press Enter to apply it (when the final level finishes) or Esc to cancel"""
+    bl_idname = "mesh.roofeus_preview"
+    bl_label = "Roofeus (preview)"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    level_count = 3  # Preview levels, each one with 4 times more template vertex than the previous one
+    confirm_events = {'RET', 'NUMPAD_ENTER'}
+    cancel_events = {'ESC', 'RIGHTMOUSE'}
+    navigation_events = RoofeusModal.navigation_events
+
+    @classmethod
+    def poll(cls, context):
+        return has_templates(context.scene.roofeus)
+
+    def invoke(self, context, event):
+        props = context.scene.roofeus
+        self.obj = context.object
+        bm = bmesh.from_edit_mesh(self.obj.data)
+        self.jobs, self.original_faces = build_jobs(bm, props)
+        if not self.jobs:
+            self.report({'ERROR'}, "No faces with a valid template")
+            return {'CANCELLED'}
+        # Only the estimated scale is used, so nothing is generated before the first event
+        self.jobs = fit_uv_scale(props, self.jobs, refine=False)[0]
+        if not check_vertex_budget(self, props, self.jobs):
+            return {'CANCELLED'}
+        self.props = props
+
+        # The levels run in order in a worker thread. The last one is the final result
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.cancelled = [threading.Event() for _ in range(0, self.level_count)]
+        self.futures = [self.executor.submit(generate_preview, self.jobs, level, self.level_count,
+                                             generation_options(props, level == self.level_count - 1),
+                                             self.cancelled[level])
+                        for level in range(0, self.level_count)]
+        self.level = -1  # Last drawn level
+        self.lines = None  # Positions and edges of the drawn level
+        self.batch = None  # Created by the draw handler
+        self.applying = False  # Enter was pressed: the final level is committed when it finishes
+        self.shader = gpu.shader.from_builtin('UNIFORM_COLOR' if bpy.app.version >= (3, 4, 0)
+                                              else '3D_UNIFORM_COLOR')
+        self.draw_handler = bpy.types.SpaceView3D.draw_handler_add(draw_preview, (self,), 'WINDOW', 'POST_VIEW')
+
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(0.05, window=context.window)
+        wm.modal_handler_add(self)
+        self.update_header(context)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type in self.cancel_events:
+            # Nothing has been written in the mesh
+            self.finish(context)
+            self.report({'INFO'}, "Roofeus preview cancelled")
+            return {'CANCELLED'}
+
+        if event.type in self.confirm_events and event.value == 'PRESS' and not self.applying:
+            # The pending sparse levels are skipped, and the final level is committed when it finishes
+            for cancelled in self.cancelled[:-1]:
+                cancelled.set()
+            self.applying = True
+            self.update_header(context)
+            return {'RUNNING_MODAL'}
+
+        if event.type == 'TIMER':
+            while self.level + 1 < self.level_count and self.futures[self.level + 1].done():
+                self.level += 1
+                error = self.futures[self.level].exception()
+                if error is not None:
+                    self.finish(context)
+                    self.report({'ERROR'}, f"Roofeus preview failed: {error}")
+                    return {'CANCELLED'}
+                if self.futures[self.level].result() is not None:  # None for the cancelled levels
+                    self.lines = preview_lines(self.futures[self.level].result())
+                    self.batch = None
+                self.update_header(context)
+            if self.applying and self.futures[-1].done():
+                return self.apply(context)
+            return {'RUNNING_MODAL'}
+
+        if event.type in self.navigation_events:
+            return {'PASS_THROUGH'}
+        # Other events are blocked, so the mesh can't be edited while previewing
+        return {'RUNNING_MODAL'}
+
+    def apply(self, context):
+        """
+        Commits the final level (it must have finished)
+        """
+        results = self.futures[-1].result()
+        self.finish(context)
+        bm = bmesh.from_edit_mesh(self.obj.data)
+        bake_results(results, self.props)
+        instances = create_instance_objects(context, self.obj, results, self.original_faces)
+        commit_results(bm, self.obj, results, self.original_faces,
+                       job_sources(self.jobs, results, self.original_faces, self.props))
+        self.report({'INFO'}, f"Roofeus done: {results_text(results, instances)}")
+        return {'FINISHED'}
+
+    def update_header(self, context):
+        if context.area is not None:
+            if self.applying:
+                context.area.header_text_set(f"Roofeus preview {self.level + 1}/{self.level_count}. "
+                                             f"Applying... Esc: cancel")
+            else:
+                context.area.header_text_set(f"Roofeus preview {self.level + 1}/{self.level_count}. "
+                                             f"Enter: apply, Esc: cancel")
+            context.area.tag_redraw()
+
+    def finish(self, context):
+        for cancelled in self.cancelled:
+            cancelled.set()
+        self.executor.shutdown(wait=False)
+        context.window_manager.event_timer_remove(self.timer)
+        bpy.types.SpaceView3D.draw_handler_remove(self.draw_handler, 'WINDOW')
+        if context.area is not None:
+            context.area.header_text_set(None)
+            context.area.tag_redraw()
+
 
+class RoofeusRegenerate(bpy.types.Operator):
+    """Regenerates the Roofeus outputs whose faces were edited (moved corners or deleted faces) or whose template or
+    options changed, keeping the other ones"""
+    bl_idname = "mesh.roofeus_regenerate"
+    bl_label = "Regenerate changed"
+    bl_options = {'REGISTER', 'UNDO'}
+
+    @classmethod
+    def poll(cls, context):
+        return has_templates(context.scene.roofeus) and context.object is not None and \
+            SOURCES_PROPERTY in context.object
+
+    def execute(self, context):
+        obj = context.object
+        bm = bmesh.from_edit_mesh(obj.data)
+        props = context.scene.roofeus
+        jobs, sources, missing = find_changed_sources(bm, obj, props)
+        if missing > 0:
+            self.report({'WARNING'}, f"{missing} outputs can't be regenerated (no template or deleted corners)")
+        if not jobs:
+            self.report({'INFO'}, "No changed outputs")
+            return {'FINISHED'}
+
+        # Instances are not regenerated (they are not in the mesh)
+        options = generation_options(props)
+        options.instanced_output = False
+        results = [generate_result(template, target, options) for template, target in jobs]
+        delete_source_geometry(bm, [source["id"] for source in sources])
+        bake_results(results, props, displace_targets=False)
+        new_faces = [create_result_mesh(bm, vertex_list, faces, target, source["material_index"])
+                     for (target, vertex_list, faces, _bounding_edge_list, _instanced, _acmr), source
+                     in zip(results, sources)]
+        record_sources(bm, obj, sources, results, new_faces)
+        finish_commit(bm, obj, [face for faces in new_faces for face in faces])
+        self.report({'INFO'}, f"Regenerated {results_text(results)}")
+        return {'FINISHED'}
+
+
+class RoofeusEstimate(bpy.types.Operator):
+    """Estimates the output size for the selected faces without creating it"""
+    bl_idname = "mesh.roofeus_estimate"
+    bl_label = "Estimate"
+
+    @classmethod
+    def poll(cls, context):
+        return has_templates(context.scene.roofeus)
+
+    def execute(self, context):
+        bm = bmesh.from_edit_mesh(context.object.data)
+        props = context.scene.roofeus
+        if bm.loops.layers.uv.active is None:
+            self.report({'ERROR'}, "The mesh has no UV map")
+            return {'CANCELLED'}
+        # The operator has no UNDO, so the mesh must not be modified
+        jobs, _original_faces = build_jobs(bm, props, read_only=True)
+        jobs = fit_uv_scale(props, jobs, refine=False)[0]
+        props.last_estimate = estimate_text(estimate_jobs(jobs, props.fill_uncompleted))
+        self.report({'INFO'}, props.last_estimate)
+        return {'FINISHED'}
+
+
+class RoofeusMaterialTemplateAdd(bpy.types.Operator):
+    """Assigns a template to the active material"""
+    bl_idname = "mesh.roofeus_material_template_add"
+    bl_label = "Add material template"
+
+    def execute(self, context):
+        item = context.scene.roofeus.material_templates.add()
+        item.material_index = context.object.active_material_index if context.object else 0
+        return {'FINISHED'}
+
+
+class RoofeusMaterialTemplateRemove(bpy.types.Operator):
+    """Removes a material template"""
+    bl_idname = "mesh.roofeus_material_template_remove"
+    bl_label = "Remove material template"
+
+    index: bpy.props.IntProperty()
+
+    def execute(self, context):
+        context.scene.roofeus.material_templates.remove(self.index)
         return {'FINISHED'}
 
 
 def register():
+    bpy.utils.register_class(RoofeusMaterialTemplate)
     bpy.utils.register_class(RoofeusProperties)
     bpy.utils.register_class(Roofeus)
+    bpy.utils.register_class(RoofeusModal)
+    bpy.utils.register_class(RoofeusPreview)
+    bpy.utils.register_class(RoofeusRegenerate)
+    bpy.utils.register_class(RoofeusEstimate)
+    bpy.utils.register_class(RoofeusMaterialTemplateAdd)
+    bpy.utils.register_class(RoofeusMaterialTemplateRemove)
     bpy.types.Scene.roofeus = bpy.props.PointerProperty(type=RoofeusProperties)
 
 
 def unregister():
+    bpy.utils.unregister_class(RoofeusMaterialTemplateRemove)
+    bpy.utils.unregister_class(RoofeusMaterialTemplateAdd)
+    bpy.utils.unregister_class(RoofeusEstimate)
+    bpy.utils.unregister_class(RoofeusRegenerate)
+    bpy.utils.unregister_class(RoofeusPreview)
+    bpy.utils.unregister_class(RoofeusModal)
     bpy.utils.unregister_class(Roofeus)
     bpy.utils.unregister_class(RoofeusProperties)
+    bpy.utils.unregister_class(RoofeusMaterialTemplate)
     del bpy.types.Scene.roofeus
 
 
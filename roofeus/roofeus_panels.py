@@ -19,11 +19,69 @@ class RoofeusPanel(bpy.types.Panel):
         row = layout.row()
         row.prop(roofeus, "template_file")
 
+        row = layout.row()
+        row.prop(roofeus, "use_material_templates")
+        if roofeus.use_material_templates:
+            box = layout.box()
+            for index, item in enumerate(roofeus.material_templates):
+                row = box.row()
+                row.prop(item, "material_index", text="")
+                row.prop(item, "template_file", text="")
+                row.operator("mesh.roofeus_material_template_remove", text="", icon='X').index = index
+            box.operator("mesh.roofeus_material_template_add", icon='ADD')
+
+        row = layout.row()
+        row.prop(roofeus, "target_scope")
+
         row = layout.row()
         row.prop(roofeus, "fill_uncompleted")
 
+        row = layout.row()
+        row.prop(roofeus, "quad_dominant")
+
+        row = layout.row()
+        row.prop(roofeus, "bake_displacement")
+        if roofeus.bake_displacement:
+            box = layout.box()
+            box.prop(roofeus, "displacement_image")
+            row = box.row()
+            row.prop(roofeus, "displacement_strength")
+            row.prop(roofeus, "displacement_midlevel")
+
+        row = layout.row()
+        row.prop(roofeus, "instanced_output")
+
+        row = layout.row()
+        row.prop(roofeus, "optimize_vertex_cache")
+
+        row = layout.row()
+        row.prop(roofeus, "vectorized_faces")
+
+        row = layout.row()
+        row.prop(roofeus, "fit_uv_scale")
+        if roofeus.fit_uv_scale != 'off':
+            box = layout.box()
+            row = box.row()
+            row.prop(roofeus, "fit_vertex_count")
+            row.prop(roofeus, "fit_tolerance")
+
+        row = layout.row()
+        row.prop(roofeus, "max_vertex_count")
+        row.prop(roofeus, "over_budget_action", text="")
+
+        row = layout.row()
+        row.operator("mesh.roofeus_estimate")
+        if roofeus.last_estimate:
+            row = layout.row()
+            row.label(text=roofeus.last_estimate)
+
         row = layout.row()
         row.operator("mesh.roofeus")
+        row.operator("mesh.roofeus_modal")
+
+        row = layout.row()
+        row.operator("mesh.roofeus_preview")
+        row.operator("mesh.roofeus_regenerate")
 
 
 def register():
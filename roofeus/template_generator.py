@@ -0,0 +1,327 @@
+import heapq
+import random
+from math import floor
+
+import roofeus.models as rfsm
+
+CELL_OFFSETS = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)]
+SUPER_SIZE = 100.0
+
+
+def sample_height(heightmap, x, y):
+    """
+    Samples a heightmap repeated over the UV space, with bilinear interpolation
+    :param heightmap: float[row][column] - heights (row 0 is y = 0)
+    :param x: x coordinate (1 is the heightmap width)
+    :param y: y coordinate (1 is the heightmap height)
+    :return: height
+    """
+    rows = len(heightmap)
+    cols = len(heightmap[0])
+    px = x * cols - 0.5
+    py = y * rows - 0.5
+    x0 = floor(px)
+    y0 = floor(py)
+    fx = px - x0
+    fy = py - y0
+    x0, x1 = x0 % cols, (x0 + 1) % cols
+    y0, y1 = y0 % rows, (y0 + 1) % rows
+    top = heightmap[y0][x0] * (1 - fx) + heightmap[y0][x1] * fx
+    bottom = heightmap[y1][x0] * (1 - fx) + heightmap[y1][x1] * fx
+    return top * (1 - fy) + bottom * fy
+
+
+def orientation(a, b, c):
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+
+def in_circumcircle(a, b, c, p):
+    """
+    Checks if p is inside the circumcircle of the counter-clockwise triangle a, b, c
+    """
+    ax, ay = a[0] - p[0], a[1] - p[1]
+    bx, by = b[0] - p[0], b[1] - p[1]
+    cx, cy = c[0] - p[0], c[1] - p[1]
+    return (ax * ax + ay * ay) * (bx * cy - cx * by) - (bx * bx + by * by) * (ax * cy - cx * ay) + \
+        (cx * cx + cy * cy) * (ax * by - bx * ay) > 0
+
+
+class PeriodicTriangulation:
+    """
+    Delaunay triangulation (Bowyer-Watson) of points repeated in the 3x3 cells around the unit square.
+    Triangles are counter-clockwise point index tuples
+    """
+
+    def __init__(self):
+        self.points = [(-SUPER_SIZE, -SUPER_SIZE), (SUPER_SIZE, -SUPER_SIZE), (0.0, SUPER_SIZE)]  # (x, y)[]
+        self.point_cell = [None, None, None]  # (vertex index, dx, dy)[] - None for the super triangle
+        self.triangles = {}  # id: (int, int, int)
+        self.edge_triangle = {}  # (int, int): id - triangle at the left of the directed edge
+        self.next_id = 0
+        self.last_triangle = self.add_triangle(0, 1, 2)
+
+    def add_triangle(self, a, b, c):
+        tid = self.next_id
+        self.next_id += 1
+        self.triangles[tid] = (a, b, c)
+        for edge in ((a, b), (b, c), (c, a)):
+            self.edge_triangle[edge] = tid
+        return tid
+
+    def remove_triangle(self, tid):
+        a, b, c = self.triangles.pop(tid)
+        for edge in ((a, b), (b, c), (c, a)):
+            if self.edge_triangle.get(edge) == tid:
+                del self.edge_triangle[edge]
+
+    def contains(self, tid, p):
+        a, b, c = [self.points[i] for i in self.triangles[tid]]
+        return orientation(a, b, p) >= 0 and orientation(b, c, p) >= 0 and orientation(c, a, p) >= 0
+
+    def locate(self, p):
+        """
+        Finds the triangle that contains p walking from the last created one
+        """
+        tid = self.last_triangle if self.last_triangle in self.triangles else next(iter(self.triangles))
+        for _ in range(len(self.triangles) + 1):
+            triangle = self.triangles[tid]
+            for i in range(0, 3):
+                u, v = triangle[i], triangle[(i + 1) % 3]
+                if orientation(self.points[u], self.points[v], p) < 0:
+                    tid = self.edge_triangle.get((v, u), tid)
+                    break
+            else:
+                return tid
+        # The walk didn't finish (degenerate case), check every triangle
+        for tid in self.triangles:
+            if self.contains(tid, p):
+                return tid
+        return tid
+
+    def insert(self, p, cell):
+        """
+        Inserts a point
+        :param p: (x, y)
+        :param cell: (vertex index, dx, dy)
+        :return: removed triangles (id: (int, int, int)), new triangle ids
+        """
+        index = len(self.points)
+        self.points.append(p)
+        self.point_cell.append(cell)
+
+        first = self.locate(p)
+        bad = {first}
+        pending = [first]
+        while pending:
+            triangle = self.triangles[pending.pop()]
+            for i in range(0, 3):
+                neighbor = self.edge_triangle.get((triangle[(i + 1) % 3], triangle[i]))
+                if neighbor is not None and neighbor not in bad and \
+                        in_circumcircle(*[self.points[j] for j in self.triangles[neighbor]], p):
+                    bad.add(neighbor)
+                    pending.append(neighbor)
+
+        boundary = []
+        for tid in bad:
+            triangle = self.triangles[tid]
+            for i in range(0, 3):
+                u, v = triangle[i], triangle[(i + 1) % 3]
+                if self.edge_triangle.get((v, u)) not in bad:
+                    boundary.append((u, v))
+
+        removed = {}
+        for tid in bad:
+            removed[tid] = self.triangles[tid]
+            self.remove_triangle(tid)
+        new_triangles = [self.add_triangle(u, v, index) for u, v in boundary]
+        self.last_triangle = new_triangles[0]
+        return removed, new_triangles
+
+
+def interpolate(triangulation, heights, tid, p):
+    """
+    Interpolates the vertex heights of a triangle at p
+    """
+    ia, ib, ic = triangulation.triangles[tid]
+    a, b, c = triangulation.points[ia], triangulation.points[ib], triangulation.points[ic]
+    area = orientation(a, b, c)
+    if area == 0:
+        return heights[triangulation.point_cell[ia][0]]
+    wa = orientation(b, c, p) / area
+    wb = orientation(c, a, p) / area
+    wc = 1 - wa - wb
+    return wa * heights[triangulation.point_cell[ia][0]] + wb * heights[triangulation.point_cell[ib][0]] + \
+        wc * heights[triangulation.point_cell[ic][0]]
+
+
+def generate_template(heightmap, max_vertex=256, tolerance=0.0, sample_resolution=64, seed_grid=2):
+    """
+    Creates a template placing the vertex where the displacement map is worst approximated by the template faces.
+    Begins with a seed_grid x seed_grid grid of vertex, and adds the sample with the highest error until there are
+    max_vertex vertex or every error is under tolerance.
+    The faces are the Delaunay triangulation of the vertex repeated in the neighbor cells
+    :param heightmap: float[row][column] - displacement map (row 0 is y = 0)
+    :param max_vertex: vertex budget
+    :param tolerance: maximum allowed error (same units than the heightmap)
+    :param sample_resolution: the error is measured in sample_resolution x sample_resolution points
+    :param seed_grid: size of the initial vertex grid (at least 2, so faces don't span more than 2 cells)
+    :return: RFTemplate
+    """
+    seed_grid = max(seed_grid, 2)
+    rng = random.Random(0)
+    triangulation = PeriodicTriangulation()
+    vertex = []  # (x, y)[]
+    heights = []  # float[]
+
+    samples = [((i + 0.5) / sample_resolution, (j + 0.5) / sample_resolution)
+               for j in range(0, sample_resolution) for i in range(0, sample_resolution)]
+    sample_heights = [sample_height(heightmap, s[0], s[1]) for s in samples]
+    sample_triangle = [None] * len(samples)
+    sample_stamp = [0] * len(samples)
+    triangle_samples = {}  # triangle id: sample index[]
+    worst = []  # heap of (-error, sample index, stamp)
+
+    def assign_sample(si, candidate_triangles):
+        for tid in candidate_triangles:
+            if triangulation.contains(tid, samples[si]):
+                break
+        else:
+            tid = triangulation.locate(samples[si])
+        sample_triangle[si] = tid
+        sample_stamp[si] += 1
+        triangle_samples.setdefault(tid, []).append(si)
+        error = abs(sample_heights[si] - interpolate(triangulation, heights, tid, samples[si]))
+        heapq.heappush(worst, (-error, si, sample_stamp[si]))
+
+    def add_vertex(x, y):
+        # Jitter avoids cocircular points in the regular grids
+        x = (x + rng.uniform(-1e-6, 1e-6)) % 1.0
+        y = (y + rng.uniform(-1e-6, 1e-6)) % 1.0
+        vertex_index = len(vertex)
+        vertex.append((x, y))
+        heights.append(sample_height(heightmap, x, y))
+        moved_samples = []
+        new_triangles = []
+        for dx, dy in CELL_OFFSETS:
+            removed, created = triangulation.insert((x + dx, y + dy), (vertex_index, dx, dy))
+            new_triangles = [tid for tid in new_triangles if tid not in removed] + created
+            for tid in removed:
+                moved_samples.extend(triangle_samples.pop(tid, []))
+        return moved_samples, new_triangles
+
+    for j in range(0, seed_grid):
+        for i in range(0, seed_grid):
+            add_vertex((i + 0.5) / seed_grid, (j + 0.5) / seed_grid)
+    for si in range(0, len(samples)):
+        assign_sample(si, [])
+
+    while len(vertex) < max_vertex and worst:
+        error, si, stamp = heapq.heappop(worst)
+        if stamp != sample_stamp[si]:
+            continue  # The sample was moved to other triangle after this entry
+        if -error <= tolerance:
+            break
+        moved_samples, new_triangles = add_vertex(samples[si][0], samples[si][1])
+        for moved in moved_samples:
+            assign_sample(moved, new_triangles)
+
+    return build_periodic_template(triangulation, vertex)
+
+
+def build_periodic_template(triangulation, vertex, row_shift=0.0):
+    """
+    Builds the template from the triangles whose lowest cell is the central one, so every repeated triangle is
+    added once, referencing the right, bottom and diagonal cells
+    :param triangulation: PeriodicTriangulation
+    :param vertex: (x, y)[] - template vertex
+    :param row_shift: horizontal displacement of each row of cells (the triangulation must use it too)
+    :return: RFTemplate
+    """
+    template = rfsm.RFTemplate()
+    template.row_shift = row_shift
+    for x, y in vertex:
+        template.vertex.append(rfsm.RFTemplateVertex(x, y))
+    template.calculate_ids()
+    cell_vertex = {
+        (0, 0): lambda v: v,
+        (1, 0): template.get_vertex_right,
+        (0, 1): template.get_vertex_bottom,
+        (1, 1): template.get_vertex_diag_cell,
+    }
+
+    for triangle in triangulation.triangles.values():
+        cells = [triangulation.point_cell[i] for i in triangle]
+        if None in cells:
+            continue  # Linked to the super triangle
+        min_dx = min([c[1] for c in cells])
+        min_dy = min([c[2] for c in cells])
+        if min_dx != 0 or min_dy != 0:
+            continue
+        if any([(c[1], c[2]) not in cell_vertex for c in cells]):
+            continue  # Spans more than 2 cells
+        face_vertex = [cell_vertex[(c[1], c[2])](template.vertex[c[0]]) for c in cells]
+        template.faces.append(rfsm.RFTemplateFace(*face_vertex))
+    return template
+
+
+def periodic_distance(a, b, row_shift=0.0):
+    """
+    Distance between two template points, taking the nearest repetition of b
+    """
+    dy = b[1] - a[1]
+    rows = round(dy)
+    dy -= rows
+    dx = b[0] - a[0] - rows * row_shift
+    dx -= round(dx)
+    return (dx * dx + dy * dy) ** 0.5
+
+
+def triangulate_template_vertex(vertex, row_shift=0.0):
+    """
+    Creates a template with the periodic Delaunay triangulation of some vertex
+    :param vertex: (x, y)[] - template vertex
+    :param row_shift: horizontal displacement of each row of cells
+    :return: RFTemplate
+    """
+    # Few vertex make big circumcircles, so the cells around the referenced ones (0 and 1) must be added too.
+    # Shifted rows move the cells sideways, so more columns are needed
+    columns = range(-1, 3) if row_shift == 0 else range(-2, 4)
+    offsets = [(dx, dy) for dy in range(-1, 3) for dx in columns]
+    rng = random.Random(0)
+    triangulation = PeriodicTriangulation()
+    for vertex_index, (x, y) in enumerate(vertex):
+        # Jitter avoids cocircular points in the regular grids (only in the triangulation)
+        x += rng.uniform(-1e-6, 1e-6)
+        y += rng.uniform(-1e-6, 1e-6)
+        for dx, dy in offsets:
+            triangulation.insert((x + dx + dy * row_shift, y + dy), (vertex_index, dx, dy))
+    return build_periodic_template(triangulation, vertex, row_shift)
+
+
+def decimate_template(template, max_vertex):
+    """
+    Creates a sparse version of a template: keeps max_vertex well spread vertex (farthest point sampling) and
+    triangulates them again. With shifted rows, few vertex can make faces spanning more than 2 cells, which are not
+    valid: vertex are added until the faces cover the whole cell
+    :param template: RFTemplate
+    :param max_vertex: vertex to keep (at least 4, so faces don't span more than 2 cells)
+    :return: RFTemplate (the same template if it doesn't have more vertex)
+    """
+    source = [v.coords for v in template.visible_vertex()]
+    max_vertex = max(max_vertex, 4)
+    chosen = [0]
+    distance = [periodic_distance(source[0], p, template.row_shift) for p in source]
+    while len(chosen) < len(source):
+        while len(chosen) < min(max_vertex, len(source)):
+            farthest = max(range(0, len(source)), key=distance.__getitem__)
+            chosen.append(farthest)
+            for i, p in enumerate(source):
+                distance[i] = min(distance[i], periodic_distance(source[farthest], p, template.row_shift))
+        if len(chosen) == len(source):
+            break
+        sparse = triangulate_template_vertex([source[i] for i in chosen], template.row_shift)
+        area = sum([orientation(*[v.coords for v in face.vertex]) for face in sparse.faces]) / 2
+        if area > 0.999:
+            return sparse
+        max_vertex *= 2
+    return template
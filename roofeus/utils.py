@@ -1,3 +1,5 @@
+import zlib
+import numpy as np
 import roofeus.models as rfsm
 import math
 
@@ -138,6 +140,57 @@ def check_positive_normal(v1, v2, v3):
     return cross_product_positive(v13, v12)
 
 
+def is_convex(points):
+    """
+    Checks if a 2d polygon is strictly convex
+    :param points: (x, y)[] - polygon vertex in cycle order
+    """
+    signs = set()
+    for i in range(0, len(points)):
+        a = sub_vectors(points[(i + 1) % len(points)], points[i])
+        b = sub_vectors(points[(i + 2) % len(points)], points[(i + 1) % len(points)])
+        cross = a[0] * b[1] - a[1] * b[0]
+        if cross == 0:
+            return False
+        signs.add(cross > 0)
+    return len(signs) == 1
+
+
+def corner_angle_deviation(points):
+    """
+    Largest difference between the corner angles of a 2d polygon and a right angle (0 for a rectangle)
+    :param points: (x, y)[] - polygon vertex in cycle order
+    :return: angle in radians
+    """
+    deviation = 0
+    for i in range(0, len(points)):
+        a = sub_vectors(points[i - 1], points[i])
+        b = sub_vectors(points[(i + 1) % len(points)], points[i])
+        angle = math.atan2(abs(a[0] * b[1] - a[1] * b[0]), a[0] * b[0] + a[1] * b[1])
+        deviation = max(deviation, abs(angle - math.pi / 2))
+    return deviation
+
+
+def is_planar(points, threshold=0.0001):
+    """
+    Checks if 3d points are in the same plane
+    :param points: (x, y, z)[] - at least 3 points, the first 3 not aligned
+    :param threshold: maximum distance to the plane, relative to the size of the first edges
+    """
+    a = sub_vectors(points[1], points[0])
+    b = sub_vectors(points[2], points[0])
+    normal = (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+    normal_size = size_vector(normal)
+    if normal_size == 0:
+        return False
+    scale = max(size_vector(a), size_vector(b))
+    for p in points[3:]:
+        distance = sum([n * d for n, d in zip(normal, sub_vectors(p, points[0]))]) / normal_size
+        if abs(distance) > threshold * scale:
+            return False
+    return True
+
+
 def get_polygon_subtriangle_for_index(vlist, index):
     return [vlist[0], vlist[index + 1], vlist[index + 2]]
 
@@ -155,6 +208,19 @@ class Polygon:
             for i in range(0, len(self.vertex_list) - 2):
                 self.sub_polygons.append(Polygon(get_polygon_subtriangle_for_index(self.vertex_list, i)))
 
+        # Each triangle corner as (x, y, next - corner, previous - corner, divider), computed once
+        self.corners = []
+        if len(self.vertex_list) == 3:
+            for i in range(0, len(self.vertex_list)):
+                v = self.vertex_list[i]
+                a_v = sub_vectors(self.vertex_list[(i + 1) % 3], v)  # Next
+                b_v = sub_vectors(self.vertex_list[(i + 2) % 3], v)  # Previous
+                divider = a_v[1] * b_v[0] - a_v[0] * b_v[1]
+                self.corners.append((v[0], v[1], a_v[0], a_v[1], b_v[0], b_v[1], divider))
+            self.triangles = [self.corners]
+        else:
+            self.triangles = [pol.corners for pol in self.sub_polygons]
+
     def contains(self, vertex):
         """
         Checks if the vertex is inside the polygon
@@ -163,31 +229,328 @@ class Polygon:
          - true if the vertex is inside
          - triangle vertex that contains the vertex. None if outside
         """
-        found = True
-        container_triangle_index = 0
-        if len(self.vertex_list) == 3:
-            for i in range(0, len(self.vertex_list)):
-                v = self.vertex_list[i]
-                va = self.vertex_list[(i + 1) % len(self.vertex_list)]  # Next
-                vb = self.vertex_list[(i + len(self.vertex_list) - 1) % len(self.vertex_list)]  # Previous
-                a_v = sub_vectors(va, v)
-                b_v = sub_vectors(vb, v)
-                v_v = sub_vectors(vertex, v)
-                a, b = calc_vector_lineal_combination_params(a_v, b_v, v_v)
-                if not (0 <= a <= 1 and b >= -0.01):
-                    found = False
-                    break
+        for index in range(0, len(self.triangles)):
+            if triangle_contains(self.triangles[index], vertex[0], vertex[1]):
+                return True, index
+        return False, len(self.triangles) if len(self.vertex_list) > 3 else 0
+
+    def contains_many(self, points):
+        """
+        Checks several vertex at once, with the operations of triangle_contains over all the vertex of each triangle
+        :param points: (x, y)[] - vertex to check
+        :return:
+         - bool[] - true for the vertex inside
+         - int[] - triangle that contains each vertex (same value than contains for the vertex outside)
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        outside_index = len(self.triangles) if len(self.vertex_list) > 3 else 0
+        inside = np.zeros(len(points), dtype=bool)
+        index_list = np.full(len(points), outside_index)
+        for index, corners in enumerate(self.triangles):
+            pending = np.flatnonzero(~inside)  # A vertex is in the first triangle that contains it
+            if len(pending) == 0:
+                break
+            if any(corner[6] == 0 for corner in corners):
+                found = [k for k in pending.tolist() if triangle_contains(corners, *points[k].tolist())]
+            else:
+                x, y = points[pending, 0], points[pending, 1]
+                contained = np.ones(len(pending), dtype=bool)
+                for vx, vy, ax, ay, bx, by, divider in corners:
+                    tx = x - vx
+                    ty = y - vy
+                    a = (bx * ty - by * tx) / divider
+                    b = (tx - a * ax) / bx if not bx == 0 else (ty - a * ay) / by
+                    contained &= (0 <= a) & (a <= 1) & (b >= -0.01)
+                found = pending[contained]
+            inside[found] = True
+            index_list[found] = index
+        return inside.tolist(), index_list.tolist()
+
+
+def triangle_contains(corners, x, y):
+    """
+    Checks if a point is inside a triangle, with the same operations than calc_vector_lineal_combination_params
+    :param corners: Polygon.corners of the triangle
+    :param x: point x
+    :param y: point y
+    """
+    for vx, vy, ax, ay, bx, by, divider in corners:
+        tx = x - vx
+        ty = y - vy
+        if divider == 0:
+            a, b = calc_vector_lineal_combination_params((ax, ay), (bx, by), (tx, ty))
         else:
-            found = False
-            for pol in self.sub_polygons:
-                inside, _inside_triangle = pol.contains(vertex)
-                if inside:
-                    found = True
+            a = (bx * ty - by * tx) / divider
+            if not bx == 0:
+                b = (tx - a * ax) / bx
+            else:
+                b = (ty - a * ay) / by
+        if not (0 <= a <= 1 and b >= -0.01):
+            return False
+    return True
+
+
+def polygon_area(points):
+    """
+    Returns the signed area of a 2d polygon (positive if counter-clockwise)
+    :param points: (x, y)[] - polygon vertex in cycle order
+    """
+    area = 0
+    for i in range(0, len(points)):
+        p1, p2 = points[i], points[(i + 1) % len(points)]
+        area += p1[0] * p2[1] - p2[0] * p1[1]
+    return area / 2
+
+
+def convex_hull(points):
+    """
+    Returns the convex hull of 2d points (monotone chain), counter-clockwise and without collinear vertex
+    :param points: (x, y)[]
+    :return: (x, y)[] - hull vertex in cycle order
+    """
+    points = sorted(set([tuple(p) for p in points]))
+    if len(points) < 3:
+        return points
+
+    def half_hull(sorted_points):
+        hull = []
+        for p in sorted_points:
+            while len(hull) >= 2 and (hull[-1][0] - hull[-2][0]) * (p[1] - hull[-2][1]) - \
+                    (hull[-1][1] - hull[-2][1]) * (p[0] - hull[-2][0]) <= 0:
+                hull.pop()
+            hull.append(p)
+        return hull[:-1]
+
+    return half_hull(points) + half_hull(points[::-1])
+
+
+def point_in_polygon(point, points):
+    """
+    Checks if a point is inside a 2d polygon (even-odd rule, the polygon can be concave)
+    :param point: (x, y)
+    :param points: (x, y)[] - polygon vertex in cycle order
+    """
+    inside = False
+    for i in range(0, len(points)):
+        p1, p2 = points[i], points[(i + 1) % len(points)]
+        if (p1[1] > point[1]) != (p2[1] > point[1]) and \
+                point[0] < p1[0] + (point[1] - p1[1]) * (p2[0] - p1[0]) / (p2[1] - p1[1]):
+            inside = not inside
+    return inside
+
+
+def orientation_2d(a, b, c):
+    """
+    Positive if a, b, c are counter-clockwise, negative if clockwise and 0 if they are aligned
+    """
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+
+def bridge_hole(polygon, hole):
+    """
+    Joins a hole to a polygon with a pair of edges between the rightmost hole vertex and a visible polygon vertex
+    (D. Eberly, Triangulation by Ear Clipping)
+    :param polygon: (key, (x, y))[] - counter-clockwise polygon
+    :param hole: (key, (x, y))[] - clockwise hole inside the polygon
+    :return: (key, (x, y))[] - polygon without holes, the bridge vertex are repeated
+    """
+    m = max(range(0, len(hole)), key=lambda i: hole[i][1])
+    mx, my = hole[m][1]
+
+    # Nearest polygon edge hit by the ray from the hole vertex to +x
+    visible = None
+    hit_x = None
+    for i in range(0, len(polygon)):
+        a, b = polygon[i][1], polygon[(i + 1) % len(polygon)][1]
+        if not a[1] <= my <= b[1] or a[1] == b[1]:
+            continue
+        x = a[0] + (my - a[1]) * (b[0] - a[0]) / (b[1] - a[1])
+        if x >= mx and (hit_x is None or x < hit_x):
+            hit_x = x
+            visible = i if a[0] > b[0] else (i + 1) % len(polygon)
+    if visible is None:
+        return polygon  # The hole isn't inside the polygon
+
+    # A reflex vertex inside the triangle hole vertex - hit point - edge vertex can hide the edge vertex
+    p = polygon[visible][1]
+    if p != (hit_x, my):
+        triangle = [(mx, my), (hit_x, my), p] if p[1] > my else [(mx, my), p, (hit_x, my)]
+        best_angle = None
+        for i in range(0, len(polygon)):
+            v = polygon[i][1]
+            if v == p or orientation_2d(polygon[i - 1][1], v, polygon[(i + 1) % len(polygon)][1]) > 0:
+                continue
+            if all([orientation_2d(triangle[j], triangle[(j + 1) % 3], v) >= 0 for j in range(0, 3)]):
+                angle = (abs(v[1] - my) / max(v[0] - mx, 1e-12), v[0] - mx)
+                if best_angle is None or angle < best_angle:
+                    best_angle = angle
+                    visible = i
+
+    return polygon[:visible + 1] + hole[m:] + hole[:m + 1] + polygon[visible:]
+
+
+def ear_clipping(polygon):
+    """
+    Triangulates a simple polygon (repeated vertex of bridged holes are allowed)
+    :param polygon: (key, (x, y))[] - counter-clockwise polygon
+    :return: (key, key, key)[] - counter-clockwise triangles
+    """
+    points = list(polygon)
+    triangles = []
+
+    def is_ear(i):
+        a, b, c = points[i - 1][1], points[i][1], points[(i + 1) % len(points)][1]
+        if orientation_2d(a, b, c) <= 0:
+            return False
+        for j in range(0, len(points)):
+            v = points[j][1]
+            if v == a or v == b or v == c:
+                continue
+            if orientation_2d(a, b, v) >= 0 and orientation_2d(b, c, v) >= 0 and orientation_2d(c, a, v) >= 0:
+                return False
+        return True
+
+    i = 0
+    while len(points) > 3:
+        for attempt in range(0, len(points)):
+            if is_ear((i + attempt) % len(points)):
+                i = (i + attempt) % len(points)
+                break
+        else:
+            # Degenerate polygon without ears: clip the most convex vertex
+            i = max(range(0, len(points)), key=lambda k: orientation_2d(points[k - 1][1], points[k][1],
+                                                                        points[(k + 1) % len(points)][1]))
+        triangles.append((points[i - 1][0], points[i][0], points[(i + 1) % len(points)][0]))
+        del points[i]
+        i = i % len(points)
+    triangles.append(tuple([p[0] for p in points]))
+    return triangles
+
+
+def triangulate_polygon_with_holes(outer, holes):
+    """
+    Triangulates a polygon with holes: the holes are joined to the outer polygon and the result is ear clipped
+    :param outer: (key, (x, y))[] - polygon vertex in cycle order
+    :param holes: (key, (x, y))[][] - holes vertex in cycle order. They must be inside the polygon and not overlap
+    :return: (key, key, key)[] - counter-clockwise triangles
+    """
+    polygon = list(outer) if polygon_area([p[1] for p in outer]) > 0 else list(reversed(outer))
+    holes = [list(h) if polygon_area([p[1] for p in h]) < 0 else list(reversed(h)) for h in holes if len(h) >= 3]
+
+    # Holes that touch at a vertex are joined by it
+    joined = True
+    while joined:
+        joined = False
+        for i in range(0, len(holes)):
+            for j in range(i + 1, len(holes)):
+                shared = [k for k in range(0, len(holes[i])) if holes[i][k][0] in [p[0] for p in holes[j]]]
+                if shared:
+                    ki = shared[0]
+                    kj = [p[0] for p in holes[j]].index(holes[i][ki][0])
+                    holes[i] = holes[i][:ki + 1] + holes[j][kj + 1:] + holes[j][:kj + 1] + holes[i][ki + 1:]
+                    del holes[j]
+                    joined = True
                     break
-                else:
-                    container_triangle_index += 1
+            if joined:
+                break
+
+    for hole in sorted(holes, key=lambda h: -max([p[1][0] for p in h])):
+        polygon = bridge_hole(polygon, hole)
+    return ear_clipping(polygon)
 
-        return found, container_triangle_index
+
+def triangulation_edges(triangles):
+    """
+    Returns the triangle that has each directed edge of a triangulation
+    :param triangles: (key, key, key)[] - counter-clockwise triangles
+    :return: {(key, key): triangle index}
+    """
+    edges = {}
+    for t in range(0, len(triangles)):
+        for k in range(0, 3):
+            edges[(triangles[t][k], triangles[t][(k + 1) % 3])] = t
+    return edges
+
+
+def insert_triangulation_point(triangles, points, key, threshold=1e-9):
+    """
+    Adds a vertex to a triangulation, splitting the triangle that contains it in 3 (or the 2 triangles of the edge it
+    is over in 2)
+    :param triangles: (key, key, key)[] - counter-clockwise triangles, updated
+    :param points: {key: (x, y)} - position of the triangles vertex and the new vertex
+    :param key: new vertex
+    :param threshold: distance to an edge under which the vertex is over it
+    :return: True if it was added (False if it is outside the triangles)
+    """
+    p = points[key]
+    for t in range(0, len(triangles)):
+        corners = [points[k] for k in triangles[t]]
+        if orientation_2d(*corners) <= threshold:
+            continue  # Degenerate triangle
+        distances = [orientation_2d(corners[k], corners[(k + 1) % 3], p) /
+                     max(size_vector(sub_vectors(corners[(k + 1) % 3], corners[k])), threshold) for k in range(0, 3)]
+        if min(distances) < -threshold:
+            continue
+        a, b, c = triangles[t]
+        over_edges = [k for k in range(0, 3) if distances[k] <= threshold]
+        if len(over_edges) > 1:
+            return False  # Over a vertex
+        if not over_edges:
+            triangles[t:t + 1] = [(a, b, key), (b, c, key), (c, a, key)]
+            return True
+
+        # Over an edge: split it in the two triangles that use it
+        k = over_edges[0]
+        a, b, c = triangles[t][k], triangles[t][(k + 1) % 3], triangles[t][(k + 2) % 3]
+        neighbor = triangulation_edges(triangles).get((b, a))
+        triangles[t] = (a, key, c)
+        triangles.append((key, b, c))
+        if neighbor is not None:
+            d = [v for v in triangles[neighbor] if v != a and v != b][0]
+            triangles[neighbor] = (b, key, d)
+            triangles.append((key, a, d))
+        return True
+    return False
+
+
+def recover_triangulation_edge(triangles, points, edge, fixed_edges=()):
+    """
+    Flips the triangulation edges that cross a segment until it is an edge of the triangulation (Sloan's constrained
+    triangulation)
+    :param triangles: (key, key, key)[] - counter-clockwise triangles, updated
+    :param points: {key: (x, y)} - position of the triangles vertex
+    :param edge: (key, key) - segment between two vertex of the triangulation
+    :param fixed_edges: frozenset(key, key)[] - edges that can't be flipped (polygon borders and other constraints)
+    :return: True if the segment is an edge of the triangulation
+    """
+    u, w = edge
+    pu, pw = points[u], points[w]
+    for _ in range(0, 4 * len(triangles)):
+        edges = triangulation_edges(triangles)
+        if (u, w) in edges or (w, u) in edges:
+            return True
+        flipped = False
+        for (a, b), t in edges.items():
+            if u in (a, b) or w in (a, b) or frozenset((a, b)) in fixed_edges or (b, a) not in edges:
+                continue
+            pa, pb = points[a], points[b]
+            # Crosses the segment
+            if orientation_2d(pu, pw, pa) * orientation_2d(pu, pw, pb) >= 0 or \
+                    orientation_2d(pa, pb, pu) * orientation_2d(pa, pb, pw) >= 0:
+                continue
+            c = [v for v in triangles[t] if v != a and v != b][0]
+            d = [v for v in triangles[edges[(b, a)]] if v != a and v != b][0]
+            # The quad a, d, b, c must be convex
+            if orientation_2d(points[a], points[d], points[c]) <= 0 or \
+                    orientation_2d(points[d], points[b], points[c]) <= 0:
+                continue
+            triangles[t] = (a, d, c)
+            triangles[edges[(b, a)]] = (d, b, c)
+            flipped = True
+            break
+        if not flipped:
+            return False
+    return False
 
 
 def read_template(filename):
@@ -206,6 +569,8 @@ def read_template(filename):
             if line == 'f':
                 all_vertex_read = True
                 template.calculate_ids()
+            elif line.startswith('shift'):
+                template.row_shift = float(line.split(',')[1]) % 1.0
             elif not all_vertex_read:
                 v_pos = line.split(',')
                 v = rfsm.RFTemplateVertex(float(v_pos[0]), float(v_pos[1]))
@@ -222,11 +587,46 @@ def read_template(filename):
                         v_idx.append(template.get_vertex_diag_cell(template.vertex[int(f_el.strip('d'))]))
                     else:
                         v_idx.append(template.vertex[int(f_el)])
-                f = rfsm.RFTemplateFace(v_idx[0], v_idx[1], v_idx[2])
+                f = rfsm.RFTemplateFace(*v_idx)
                 template.faces.append(f)
     return template
 
 
+def template_lines(template):
+    """
+    Returns the lines of a template file
+    :param template: template to save
+    :return: str[] (without line breaks)
+    """
+    lines = []
+    if template.row_shift != 0:
+        lines.append(f"shift,{template.row_shift}")
+    for v in template.visible_vertex():
+        lines.append(f"{v.coords[0]},{v.coords[1]}")
+    lines.append("f")
+
+    def get_vertex_ref_text(vertex):
+        text = ""
+        if vertex.ident < template.vertex_count:
+            text = str(vertex.ident)
+        elif vertex.ident < template.vertex_count * 2:
+            text = f"{vertex.ident % template.vertex_count}r"
+        elif vertex.ident < template.vertex_count * 3:
+            text = f"{vertex.ident % template.vertex_count}b"
+        elif vertex.ident < template.vertex_count * 4:
+            text = f"{vertex.ident % template.vertex_count}d"
+        return text
+
+    for face in template.faces:
+        v_txt = [get_vertex_ref_text(v) for v in face.vertex]
+        if check_positive_normal(face.vertex[0].coords, face.vertex[1].coords, face.vertex[2].coords):
+            lines.append(",".join(v_txt))
+        else:
+            # Change order to flip normal
+            lines.append(",".join([v_txt[0]] + v_txt[:0:-1]))
+    return lines
+
+
 def write_template(filename, template):
     """
     Writes a template to a file
@@ -234,29 +634,30 @@ def write_template(filename, template):
     :param template: template to save
     """
     with open(filename, 'w') as f:
-        for v in template.visible_vertex():
-            f.write(f"{v.coords[0]},{v.coords[1]}\n")
-        f.write("f\n")
-
-        def get_vertex_ref_text(vertex):
-            text = ""
-            if vertex.ident < template.vertex_count:
-                text = str(vertex.ident)
-            elif vertex.ident < template.vertex_count * 2:
-                text = f"{vertex.ident % template.vertex_count}r"
-            elif vertex.ident < template.vertex_count * 3:
-                text = f"{vertex.ident % template.vertex_count}b"
-            elif vertex.ident < template.vertex_count * 4:
-                text = f"{vertex.ident % template.vertex_count}d"
-            return text
-
-        for face in template.faces:
-            v1_txt = get_vertex_ref_text(face.vertex[0])
-            v2_txt = get_vertex_ref_text(face.vertex[1])
-            v3_txt = get_vertex_ref_text(face.vertex[2])
-            if check_positive_normal(face.vertex[0].coords, face.vertex[1].coords, face.vertex[2].coords):
-                f.write(f"{v1_txt},{v2_txt},{v3_txt}\n")
-            else:
-                # Change order to flip normal
-                f.write(f"{v1_txt},{v3_txt},{v2_txt}\n")
-        f.close()
+        for line in template_lines(template):
+            f.write(line + "\n")
+
+
+def template_hash(template):
+    """
+    Returns a 31 bits hash of the template content (the same for equal templates read from different files)
+    :param template: template
+    :return: int
+    """
+    return zlib.crc32("\n".join(template_lines(template)).encode()) & 0x7fffffff
+
+
+def copy_template(template):
+    """
+    Copies a template, so it can be used while the original one is being edited
+    :param template: template to copy
+    :return: template data
+    """
+    copy = rfsm.RFTemplate()
+    copy.row_shift = template.row_shift
+    for v in template.visible_vertex():
+        copy.vertex.append(rfsm.RFTemplateVertex(v.coords[0], v.coords[1]))
+    copy.calculate_ids()
+    for face in template.faces:
+        copy.faces.append(rfsm.RFTemplateFace(*[copy.vertex[v.ident] for v in face.vertex]))
+    return copy
@@ -1,11 +1,53 @@
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen
 from PyQt5 import QtCore, QtWidgets
 
+PYRAMID_MIN_SIZE = 64  # Smallest side of the last level of the image pyramid
+
+
+def build_image_pyramid(qimage):
+    """
+    Builds the mip pyramid of an image: every level is half the size of the previous one
+    :param qimage: full resolution image
+    :return: QImage[] - from full resolution to the smallest level
+    """
+    pyramid = [qimage]
+    while min(pyramid[-1].width(), pyramid[-1].height()) >= PYRAMID_MIN_SIZE * 2:
+        last = pyramid[-1]
+        pyramid.append(last.scaled(last.width() // 2, last.height() // 2, QtCore.Qt.AspectRatioMode.IgnoreAspectRatio,
+                                   QtCore.Qt.TransformationMode.SmoothTransformation))
+    return pyramid
+
+
+class ImageLoaderSignals(QtCore.QObject):
+    loaded = QtCore.pyqtSignal(int, list)
+
+
+class ImageLoader(QtCore.QRunnable):
+    """
+    Loads an image and builds its pyramid in a worker thread
+    """
+
+    def __init__(self, image_path, request_id):
+        QtCore.QRunnable.__init__(self)
+        self.image_path = image_path
+        self.request_id = request_id
+        self.signals = ImageLoaderSignals()
+
+    def run(self):
+        qimage = QImage(self.image_path)
+        pyramid = build_image_pyramid(qimage) if not qimage.isNull() else []
+        self.signals.loaded.emit(self.request_id, pyramid)
+
 
 class ImageViewer:
     """
     Basic image viewer class to show an image with zoom and pan functionaities.
     Requirement: Qt's Qlabel widget name where the image will be drawn/displayed.
+    Images are loaded in a worker thread and every size is scaled from the closest level of its pyramid.
+    The image is drawn in 3 layers:
+     - background: the repeated image, cached until the zoom, pan or size changes
+     - overlay: over_image_drawer output, cached until invalidate_overlay is called or the size changes
+     - dynamic: dynamic_drawer output, drawn on every update
     """
 
     def __init__(self, qlabel):
@@ -13,6 +55,9 @@ class ImageViewer:
         self.qimage_scaled = QImage()
         self.qpixmap = QPixmap()
         self.qimage = None
+        self.pyramid = []  # QImage[]
+        self.loader = None
+        self.load_request_id = 0
         self.zoomX = 1
         self.position = [0, 0]
 
@@ -23,7 +68,15 @@ class ImageViewer:
         self.left_release_listeners = []
         self.right_click_listeners = []
         self.move_listeners = []
+        self.image_loaded_listeners = []
+        self.image_failed_listeners = []
         self.over_image_drawer = []
+        self.dynamic_drawer = []
+
+        self.background = QPixmap()
+        self.background_key = None
+        self.overlay = QPixmap()
+        self.overlay_key = None
 
         self.has_image = False
         self.paint_repeated = 1  # Draws the image repeated paint_repeated x paint_repeated
@@ -38,29 +91,56 @@ class ImageViewer:
         if self.has_image:
             self.qpixmap = QPixmap(self.qlabel_image.size())
             self.qpixmap.fill(QtCore.Qt.GlobalColor.gray)
-            self.qimage_scaled = self.qimage.scaled(self.qlabel_image.width() * self.zoomX, self.qlabel_image.height() *
-                                                    self.zoomX, QtCore.Qt.AspectRatioMode.KeepAspectRatio)
-            self.qimage_scaled = self.qimage_scaled.scaled(int(self.qimage_scaled.width() / self.paint_repeated),
-                                                           int(self.qimage_scaled.height() / self.paint_repeated),
-                                                           QtCore.Qt.AspectRatioMode.KeepAspectRatio)
+            self.qimage_scaled = self.scale_image(self.qlabel_image.width() * self.zoomX,
+                                                  self.qlabel_image.height() * self.zoomX)
             self.update()
 
+    def scale_image(self, width, height):
+        """
+        Scales the image to fit in width x height divided by paint_repeated, starting from the smallest pyramid level
+        that is bigger than the result
+        """
+        size = self.qimage.size().scaled(int(width), int(height), QtCore.Qt.AspectRatioMode.KeepAspectRatio)
+        size = size.scaled(int(size.width() / self.paint_repeated), int(size.height() / self.paint_repeated),
+                           QtCore.Qt.AspectRatioMode.KeepAspectRatio)
+        level = self.pyramid[0]
+        for pyramid_level in self.pyramid:
+            if pyramid_level.width() >= size.width() and pyramid_level.height() >= size.height():
+                level = pyramid_level
+        return level.scaled(size, QtCore.Qt.AspectRatioMode.IgnoreAspectRatio,
+                            QtCore.Qt.TransformationMode.SmoothTransformation)
+
     def load_image(self, image_path):
-        self.qimage = QImage(image_path)
-        self.qpixmap = QPixmap(self.qlabel_image.size())
-        if not self.qimage.isNull():
-            # reset Zoom factor and Pan position
-            self.zoomX = 1
-            self.position = [0, 0]
-            self.qimage_scaled = self.qimage.scaled(self.qlabel_image.width(), self.qlabel_image.height(),
-                                                    QtCore.Qt.AspectRatioMode.KeepAspectRatio)
-            self.qimage_scaled = self.qimage_scaled.scaled(int(self.qimage_scaled.width() / self.paint_repeated),
-                                                           int(self.qimage_scaled.height() / self.paint_repeated),
-                                                           QtCore.Qt.AspectRatioMode.KeepAspectRatio)
-            self.update()
-            self.has_image = True
+        """
+        Starts loading the image in a worker thread. set_image_pyramid is called when it finishes
+        """
+        self.load_request_id += 1
+        self.loader = ImageLoader(image_path, self.load_request_id)
+        self.loader.signals.loaded.connect(self.on_image_loaded)
+        QtCore.QThreadPool.globalInstance().start(self.loader)
+
+    def on_image_loaded(self, request_id, pyramid):
+        if request_id != self.load_request_id:
+            return  # Other image was requested after this one
+        self.loader = None
+        if len(pyramid) > 0:
+            self.set_image_pyramid(pyramid)
+            for listener in self.image_loaded_listeners:
+                listener(pyramid)
         else:
-            self.statusbar.showMessage('Cannot open this image! Try another one.', 5000)
+            for listener in self.image_failed_listeners:
+                listener()
+
+    def set_image_pyramid(self, pyramid):
+        self.pyramid = pyramid
+        self.qimage = pyramid[0]
+        self.qpixmap = QPixmap(self.qlabel_image.size())
+        # reset Zoom factor and Pan position
+        self.zoomX = 1
+        self.position = [0, 0]
+        self.qimage_scaled = self.scale_image(self.qlabel_image.width(), self.qlabel_image.height())
+        self.update()
+        self.has_image = True
 
     def update(self):
         if not self.qimage_scaled.isNull():
@@ -74,39 +154,69 @@ class ImageViewer:
             py = py if (py >= 0) else 0
             self.position = (px, py)
 
-            if self.zoomX == 1:
-                self.qpixmap.fill(QtCore.Qt.GlobalColor.white)
+            canvas_key = (self.qimage_scaled.width(), self.qimage_scaled.height(),
+                          self.qpixmap.width(), self.qpixmap.height())
+            background_key = canvas_key + (self.position[0], self.position[1], self.zoomX, self.paint_repeated)
+            if self.background_key != background_key:
+                self.paint_background()
+                self.background_key = background_key
+            if self.overlay_key != canvas_key:
+                self.paint_overlay()
+                self.overlay_key = canvas_key
 
             # the act of painting the qpixamp
             painter = QPainter()
             painter.begin(self.qpixmap)
-            for i in range(0, self.paint_repeated):
-                for j in range(0, self.paint_repeated):
-                    rect = QtCore.QRect(self.position[0], self.position[1],
-                                        self.qlabel_image.width(), self.qlabel_image.height())
-                    painter.drawImage(QtCore.QPoint(self.qimage_scaled.width() * i, self.qimage_scaled.height() * j),
-                                      self.qimage_scaled, rect)
-
-                    # separation lines
-                    pen = QPen(QtCore.Qt.GlobalColor.white, 3)
-                    painter.setPen(pen)
-                    if i < self.paint_repeated - 1:
-                        painter.drawLine(self.qimage_scaled.width() * (i+1), self.qimage_scaled.height() * j,
-                                         self.qimage_scaled.width() * (i+1), self.qimage_scaled.height() * (j+1))
-                    if j < self.paint_repeated - 1:
-                        painter.drawLine(self.qimage_scaled.width() * i, self.qimage_scaled.height() * (j+1),
-                                         self.qimage_scaled.width() * (i+1), self.qimage_scaled.height() * (j+1))
-
-            # Image drawers
-            for drawer in self.over_image_drawer:
+            painter.drawPixmap(0, 0, self.background)
+            painter.drawPixmap(0, 0, self.overlay)
+            for drawer in self.dynamic_drawer:
                 drawer(painter)
-
             painter.end()
 
             self.qlabel_image.setPixmap(self.qpixmap)
         else:
             pass
 
+    def paint_background(self):
+        self.background = QPixmap(self.qpixmap.size())
+        self.background.fill(QtCore.Qt.GlobalColor.white if self.zoomX == 1 else QtCore.Qt.GlobalColor.gray)
+
+        painter = QPainter()
+        painter.begin(self.background)
+        for i in range(0, self.paint_repeated):
+            for j in range(0, self.paint_repeated):
+                rect = QtCore.QRect(self.position[0], self.position[1],
+                                    self.qlabel_image.width(), self.qlabel_image.height())
+                painter.drawImage(QtCore.QPoint(self.qimage_scaled.width() * i, self.qimage_scaled.height() * j),
+                                  self.qimage_scaled, rect)
+
+                # separation lines
+                pen = QPen(QtCore.Qt.GlobalColor.white, 3)
+                painter.setPen(pen)
+                if i < self.paint_repeated - 1:
+                    painter.drawLine(self.qimage_scaled.width() * (i+1), self.qimage_scaled.height() * j,
+                                     self.qimage_scaled.width() * (i+1), self.qimage_scaled.height() * (j+1))
+                if j < self.paint_repeated - 1:
+                    painter.drawLine(self.qimage_scaled.width() * i, self.qimage_scaled.height() * (j+1),
+                                     self.qimage_scaled.width() * (i+1), self.qimage_scaled.height() * (j+1))
+        painter.end()
+
+    def paint_overlay(self):
+        self.overlay = QPixmap(self.qpixmap.size())
+        self.overlay.fill(QtCore.Qt.GlobalColor.transparent)
+
+        painter = QPainter()
+        painter.begin(self.overlay)
+        for drawer in self.over_image_drawer:
+            drawer(painter)
+        painter.end()
+
+    def invalidate_overlay(self):
+        """
+        Forces the over_image_drawer to paint again on next update. Must be called when the drawn data changes
+        """
+        self.overlay_key = None
+
     def mouse_press_action(self, mouse_event):
         if mouse_event.button() == QtCore.Qt.MouseButton.LeftButton and self.has_image:
             for click_listener in self.left_click_listeners:
@@ -138,9 +248,18 @@ class ImageViewer:
     def add_right_click_listener(self, listener):
         self.right_click_listeners.append(listener)
 
+    def add_image_loaded_listener(self, listener):
+        self.image_loaded_listeners.append(listener)
+
+    def add_image_failed_listener(self, listener):
+        self.image_failed_listeners.append(listener)
+
     def add_over_image_drawer(self, drawer):
         self.over_image_drawer.append(drawer)
 
+    def add_dynamic_drawer(self, drawer):
+        self.dynamic_drawer.append(drawer)
+
     def get_normalized_coords(self, mouse_event):
         mx, my = mouse_event.pos().x(), mouse_event.pos().y()
         x = mx / self.qimage_scaled.width()
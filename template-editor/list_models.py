@@ -0,0 +1,63 @@
+from PyQt5 import QtCore
+
+
+class TemplateListModel(QtCore.QAbstractListModel):
+    """
+    Virtualized list of the vertex or faces of a TemplateModel: the view only asks for the rows it displays, and the
+    template model notifies the rows that are inserted, removed or changed
+    """
+
+    def __init__(self, items, label, parent=None):
+        """
+        :param items: function returning the current item list
+        :param label: function returning the text of an item
+        """
+        QtCore.QAbstractListModel.__init__(self, parent)
+        self.items = items
+        self.label = label
+
+    def item(self, index):
+        return self.items()[index.row()]
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.items())
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and index.isValid():
+            return self.label(self.item(index))
+        return None
+
+    # TemplateModel listener
+    def begin_insert(self, row):
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+
+    def end_insert(self):
+        self.endInsertRows()
+
+    def begin_remove(self, row):
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+
+    def end_remove(self):
+        self.endRemoveRows()
+
+    def row_changed(self, row):
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [QtCore.Qt.DisplayRole])
+
+    def begin_reset(self):
+        self.beginResetModel()
+
+    def end_reset(self):
+        self.endResetModel()
+
+
+def create_vertex_list_model(template_model, parent=None):
+    model = TemplateListModel(lambda: template_model.vertex, lambda v: str(v.coords), parent)
+    template_model.vertex_listeners.append(model)
+    return model
+
+
+def create_face_list_model(template_model, parent=None):
+    model = TemplateListModel(lambda: template_model.faces, template_model.face_label, parent)
+    template_model.face_listeners.append(model)
+    return model
@@ -0,0 +1,116 @@
+import threading
+import time
+from PyQt5.QtCore import QPointF
+from PyQt5.QtGui import QPixmap, QPainter, QPen, QPolygonF
+from PyQt5 import QtCore
+
+from roofeus import models as rfsm
+from roofeus import roofeus as rfs
+
+
+def create_sample_target(tiles, skew):
+    """
+    Creates a skewed quad target that spans tiles x tiles template cells
+    :param tiles: number of tiles of each side
+    :param skew: horizontal displacement of the bottom side, relative to the size
+    :return: RFTargetVertex[]
+    """
+    target_context = rfsm.RFTargetContext()
+    offset = 0.1  # Avoids corners just over the template cell borders
+    uvs = [(offset, offset),
+           (offset + skew * tiles, offset + tiles),
+           (offset + (1 + skew) * tiles, offset + tiles),
+           (offset + tiles, offset)]
+    return [target_context.create_vertex(u, v, 0, u, v) for u, v in uvs]
+
+
+class PreviewResult:
+    """
+    Output of a preview generation
+    """
+    def __init__(self, target, vertex_list, faces, elapsed):
+        self.target = target  # RFTargetVertex[]
+        self.vertex_list = vertex_list  # RFVertexData[]
+        self.faces = [f for f in faces if len(f) >= 3]  # int[][]
+        self.elapsed = elapsed  # seconds
+
+        used_vertex = set([i for f in self.faces for i in f if i >= 0])
+        self.vertex_count = len(used_vertex) + len(target)
+        self.face_count = len(self.faces)
+
+
+class PreviewWorkerSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(int, object)  # job id, PreviewResult (None if cancelled)
+    failed = QtCore.pyqtSignal(int, str)  # job id, error message
+
+
+class PreviewWorker(QtCore.QRunnable):
+    """
+    Runs roofeus over the sample target in a worker thread. It always emits finished or failed, so the editor knows
+    when it can run the next preview
+    """
+
+    def __init__(self, job_id, template, tiles, skew, fill_uncompleted):
+        QtCore.QRunnable.__init__(self)
+        self.job_id = job_id
+        self.template = template  # Must be a copy that is not edited while running
+        self.tiles = tiles
+        self.skew = skew
+        self.fill_uncompleted = fill_uncompleted
+        self.signals = PreviewWorkerSignals()
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        Stops the generation at its next step (it finishes with a None result)
+        """
+        self.cancelled.set()
+
+    def run(self):
+        try:
+            target = create_sample_target(self.tiles, self.skew)
+            start = time.perf_counter()
+            output = rfs.create_mesh(self.template, target, self.fill_uncompleted, cancelled=self.cancelled)
+            result = None
+            if output is not None:
+                vertex_list, faces, _bounding_edge_list = output
+                result = PreviewResult(target, vertex_list, faces, time.perf_counter() - start)
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, f"{type(e).__name__}: {e}")
+        else:
+            self.signals.finished.emit(self.job_id, result)
+
+
+def draw_preview(size, result):
+    """
+    Draws the wireframe of a preview result on the UV space
+    :param size: QSize of the output
+    :param result: PreviewResult
+    :return: QPixmap
+    """
+    pixmap = QPixmap(size)
+    pixmap.fill(QtCore.Qt.GlobalColor.white)
+
+    uvs = [tv.uvs for tv in result.target]
+    min_x, max_x = min([uv[0] for uv in uvs]), max([uv[0] for uv in uvs])
+    min_y, max_y = min([uv[1] for uv in uvs]), max([uv[1] for uv in uvs])
+    margin = 10
+    scale = min((size.width() - margin * 2) / max(max_x - min_x, 0.001),
+                (size.height() - margin * 2) / max(max_y - min_y, 0.001))
+
+    def to_canvas(coords):
+        return QPointF(margin + (coords[0] - min_x) * scale, margin + (coords[1] - min_y) * scale)
+
+    def vertex_coords(index):
+        return result.vertex_list[index].coords_2d if index >= 0 else result.target[-1 - index].uvs
+
+    painter = QPainter()
+    painter.begin(pixmap)
+    painter.setPen(QPen(QtCore.Qt.GlobalColor.darkGray, 0.5))
+    for face in result.faces:
+        painter.drawPolygon(QPolygonF([to_canvas(vertex_coords(i)) for i in face]))
+
+    painter.setPen(QPen(QtCore.Qt.GlobalColor.blue, 1.5))
+    painter.drawPolygon(QPolygonF([to_canvas(uv) for uv in uvs]))
+    painter.end()
+    return pixmap
@@ -0,0 +1,79 @@
+from math import floor
+
+
+class SpatialGrid:
+    """
+    Uniform grid to find the items near a point without checking all of them.
+    Every item is stored in all the cells touched by its bounding box
+    """
+
+    def __init__(self, cell_size=0.02):
+        self.cell_size = cell_size
+        self.cells = {}  # (int, int): item[]
+        self.item_cells = {}  # id(item): (int, int)[]
+
+    def clear(self):
+        self.cells = {}
+        self.item_cells = {}
+
+    def cell_of(self, x, y):
+        return floor(x / self.cell_size), floor(y / self.cell_size)
+
+    def insert(self, item, bbox):
+        """
+        Adds an item
+        :param item: item to add
+        :param bbox: (min_x, min_y, max_x, max_y) - bounding box of the item
+        """
+        min_i, min_j = self.cell_of(bbox[0], bbox[1])
+        max_i, max_j = self.cell_of(bbox[2], bbox[3])
+        keys = []
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                self.cells.setdefault((i, j), []).append(item)
+                keys.append((i, j))
+        self.item_cells[id(item)] = keys
+
+    def insert_point(self, item, point):
+        self.insert(item, (point[0], point[1], point[0], point[1]))
+
+    def remove(self, item):
+        for key in self.item_cells.pop(id(item), []):
+            cell = self.cells[key]
+            cell.remove(item)
+            if len(cell) == 0:
+                del self.cells[key]
+
+    def move(self, item, bbox):
+        self.remove(item)
+        self.insert(item, bbox)
+
+    def move_point(self, item, point):
+        self.move(item, (point[0], point[1], point[0], point[1]))
+
+    def query(self, point, radius=0.0):
+        """
+        Returns the items whose cells are near the point, in insertion order for each cell
+        :param point: (x, y)
+        :param radius: search distance
+        :return: candidate items (they must be checked by the caller)
+        """
+        min_i, min_j = self.cell_of(point[0] - radius, point[1] - radius)
+        max_i, max_j = self.cell_of(point[0] + radius, point[1] + radius)
+        found = {}
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                for item in self.cells.get((i, j), []):
+                    found[id(item)] = item
+        return list(found.values())
+
+
+def bounding_box(points):
+    """
+    Returns the bounding box of a point list
+    :param points: (x, y)[]
+    :return: (min_x, min_y, max_x, max_y)
+    """
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return min(xs), min(ys), max(xs), max(ys)
@@ -1,12 +1,15 @@
 import sys
 import argparse
+from math import atan2
 from PyQt5 import uic
 from PyQt5.QtCore import QPoint
 from PyQt5.QtGui import QPen, QPolygon, QBrush, QColor
 from PyQt5 import QtCore, QtWidgets
 
 from image_viewer import ImageViewer
-from roofeus import models as rfsm
+from list_models import create_vertex_list_model, create_face_list_model
+from preview import PreviewWorker, draw_preview
+from template_model import TemplateModel
 from roofeus import utils as rfsu
 
 Ui_MainWindow, QtBaseClass = uic.loadUiType("ui/main.ui")
@@ -20,7 +23,9 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
         Ui_MainWindow.__init__(self)
         self.setupUi(self)
 
-        self.template = rfsm.RFTemplate()
+        self.model = TemplateModel()
+        self.vertex_list_w.setModel(create_vertex_list_model(self.model, self))
+        self.face_list_w.setModel(create_face_list_model(self.model, self))
 
         self.image_viewer = ImageViewer(self.qlabel_image)
         self.image_viewer_faces = ImageViewer(self.qlabel_image_faces)
@@ -30,20 +35,30 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
         self.vertex_y_w.setMaximum(1.00)
         self.vertex_y_w.setDecimals(3)
         self.vertex_y_w.setSingleStep(0.001)
+        self.qlabel_preview.setSizePolicy(QtWidgets.QSizePolicy.Ignored, QtWidgets.QSizePolicy.Ignored)
+
+        # Preview tab vars
+        self.preview_timer = QtCore.QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(300)
+        self.preview_job_id = 0
+        self.preview_worker = None
+        self.preview_pending = False
+        self.preview_result = None
 
         self.__connect_events()
         self.show()
 
         # Common tab vars
-        self.dirty_vertex_ids = False
-        self.last_valid_face_list = self.template.faces
-        self.last_valid_vertex_count = self.template.vertex_count
+        self.selected_vertex = None
+        self.selected_face = None
 
         # Vertex tab vars
         self.draw_temporal_vertex = False
         self.temporal_vertex_pos = ()
 
         # Face tab vars
+        self.selected_faces_vertex = []  # RFTemplateVertex[] - visible vertex with selectedInQuads
         self.image_viewer_faces.paint_repeated = 2
         self.display_repeated_faces = True
 
@@ -57,14 +72,18 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
 
         # Image viewer listeners (vertex)
         self.image_viewer.add_over_image_drawer(self.vertex_image_drawer)
+        self.image_viewer.add_dynamic_drawer(self.vertex_selection_drawer)
         self.image_viewer.add_left_click_listener(self.ivv_draw_temporal_vertex)
         self.image_viewer.add_move_listener(self.move_temporal_vertex)
         self.image_viewer.add_left_release_listener(self.add_vertex)
         self.image_viewer.add_right_click_listener(self.cancel_vertex)
         self.image_viewer.add_right_click_listener(self.select_nearest_vertex)
+        self.image_viewer.add_image_loaded_listener(self.image_viewer_faces.set_image_pyramid)
+        self.image_viewer.add_image_failed_listener(self.image_load_failed)
 
         # Image viewer listeners (faces)
         self.image_viewer_faces.add_over_image_drawer(self.faces_image_drawer)
+        self.image_viewer_faces.add_dynamic_drawer(self.faces_selection_drawer)
         self.image_viewer_faces.add_left_click_listener(self.select_nearest_vertex_in_quad)
         self.image_viewer_faces.add_right_click_listener(self.select_nearest_face)
 
@@ -72,7 +91,7 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
         self.tabs.currentChanged.connect(self.tab_changed)
 
         # UI elements actions (vertex tab)
-        self.vertex_list_w.itemClicked.connect(self.item_vertex_clicked)
+        self.vertex_list_w.clicked.connect(self.item_vertex_clicked)
         self.vertex_x_w.valueChanged.connect(self.vertex_x_spinner_value_change)
         self.vertex_y_w.valueChanged.connect(self.vertex_y_spinner_value_change)
         self.delete_vertex_w.clicked.connect(self.delete_selected)
@@ -80,35 +99,42 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
         # UI elements actions (faces tab)
         self.create_face_w.clicked.connect(self.create_face)
         self.unselect_vertex_w.clicked.connect(self.unselect_all_faces_vertex)
-        self.face_list_w.itemClicked.connect(self.item_face_clicked)
+        self.face_list_w.clicked.connect(self.item_face_clicked)
         self.delete_face_w.clicked.connect(self.delete_face)
         self.display_repeated_faces_w.stateChanged.connect(self.change_repeated)
 
+        # UI elements actions (preview tab)
+        self.preview_timer.timeout.connect(self.run_preview)
+        self.preview_tiles_w.valueChanged.connect(self.schedule_preview)
+        self.preview_skew_w.valueChanged.connect(self.schedule_preview)
+        self.preview_fill_w.currentIndexChanged.connect(self.schedule_preview)
+
     # Menu actions
     def open_template(self, template_file=None):
         if not template_file:
             template_file = QtWidgets.QFileDialog.getOpenFileName(self, "Open template")
         if template_file is not None and len(template_file[0]) > 0:
-            self.template = rfsu.read_template(template_file[0])
+            self.selected_vertex = None
+            self.selected_face = None
+            self.selected_faces_vertex = []
+            self.model.load(rfsu.read_template(template_file[0]))
             self.unselect_all_vertex()
             self.unselect_all_faces()
             self.unselect_all_faces_vertex()
-            self.update_vertex_list()
-            self.update_face_list()
-            self.dirty_vertex_ids = False
+            self.template_changed()
 
     def save_template(self):
-        if self.dirty_vertex_ids:
-            self.calculate_vertex_ids()
         template_file = QtWidgets.QFileDialog.getSaveFileName(self, "Save template")
-        rfsu.write_template(template_file[0], self.template)
+        rfsu.write_template(template_file[0], self.model.to_template())
 
     def open_texture(self, texture_file=None):
         if not texture_file:
             texture_file = QtWidgets.QFileDialog.getOpenFileName(self, "Select texture")
         if texture_file is not None and len(texture_file[0]) > 0:
             self.image_viewer.load_image(texture_file[0])
-            self.image_viewer_faces.load_image(texture_file[0])
+
+    def image_load_failed(self):
+        self.statusbar.showMessage('Cannot open this image! Try another one.', 5000)
 
     # Image viewer listeners (vertex)
     def ivv_draw_temporal_vertex(self, mouse_event):
@@ -126,13 +152,11 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
 
     def add_vertex(self, mouse_event):
         if self.draw_temporal_vertex:
-            self.set_dirty_vertex_list()
             self.unselect_all_vertex()
             self.draw_temporal_vertex = False
             x, y = self.image_viewer.get_normalized_coords(mouse_event)
-            self.template.vertex.append(rfsm.RFTemplateVertex(x, y))
-            self.select_vertex(self.template.vertex[len(self.template.vertex) - 1])
-            self.update_vertex_list()
+            self.select_vertex(self.model.add_vertex(x, y))
+            self.template_changed()
 
     def cancel_vertex(self, _mouse_event):
         self.draw_temporal_vertex = False
@@ -143,7 +167,7 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
         x, y = self.image_viewer.get_normalized_coords(mouse_event)
         mouse_pos = (x, y)
         near_vertex = []
-        for v in self.template.visible_vertex():
+        for v in self.model.vertex_index.query(mouse_pos, 0.01):
             dist = rfsu.size_vector(rfsu.sub_vectors(mouse_pos, v.coords))
             if dist < 0.01:
                 near_vertex.append((v, dist))
@@ -158,9 +182,10 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
         quad = self.image_viewer_faces.get_coords_quad(mouse_event)
         mouse_pos = (x - int(x), y - int(y))
         near_vertex = []
-        for v in self.template.visible_vertex():
+        max_dist = 0.01 * self.image_viewer_faces.paint_repeated
+        for v in self.model.vertex_index.query(mouse_pos, max_dist):
             dist = rfsu.size_vector(rfsu.sub_vectors(mouse_pos, v.coords))
-            if dist < 0.01 * self.image_viewer_faces.paint_repeated:
+            if dist < max_dist:
                 near_vertex.append((v, dist))
 
         if len(near_vertex) > 0:
@@ -173,25 +198,19 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
     def select_nearest_face(self, mouse_event):
         x, y = self.image_viewer_faces.get_normalized_coords(mouse_event)
         self.unselect_all_faces()
-        for f in self.template.faces:
-            polygon = rfsu.Polygon([v.coords for v in f.vertex])
-            inside, _dc = polygon.contains((x, y))
+        for f in self.model.face_index.query((x, y)):
+            inside, _dc = f.polygon.contains((x, y))
             if inside:
                 self.select_face(f)
-                f.selected = True
                 break
         self.image_viewer_faces.update()
 
     # UI elements actions
     def tab_changed(self):
         self.unselect_all_vertex()
-        if self.dirty_vertex_ids:
-            self.calculate_vertex_ids()
-            self.unselect_all_faces()
-            self.unselect_all_faces_vertex()
-            self.update_face_list()
         self.image_viewer.on_canvas_change()
         self.image_viewer_faces.on_canvas_change()
+        self.update_preview()
 
     # UI elements actions (vertex)
     def vertex_image_drawer(self, painter):
@@ -199,9 +218,20 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
         hfactor = self.image_viewer.qimage_scaled.height()
 
         # Draw vertex list
-        for v in self.template.visible_vertex():
-            pen = QPen(QtCore.Qt.GlobalColor.blue if v.selected else QtCore.Qt.GlobalColor.red, 1)
-            painter.setPen(pen)
+        pen = QPen(QtCore.Qt.GlobalColor.red, 1)
+        painter.setPen(pen)
+        for v in self.model.vertex:
+            painter.drawEllipse(QPoint(v.coords[0] * wfactor, v.coords[1] * hfactor), 2, 2)
+
+    def vertex_selection_drawer(self, painter):
+        wfactor = self.image_viewer.qimage_scaled.width()
+        hfactor = self.image_viewer.qimage_scaled.height()
+
+        # Draw selected vertex over the cached ones
+        pen = QPen(QtCore.Qt.GlobalColor.blue, 1)
+        painter.setPen(pen)
+        v = self.selected_vertex
+        if v is not None:
             painter.drawEllipse(QPoint(v.coords[0] * wfactor, v.coords[1] * hfactor), 2, 2)
 
         # Draw temporal vertex
@@ -211,33 +241,21 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
             painter.drawEllipse(QPoint(self.temporal_vertex_pos[0] * wfactor, self.temporal_vertex_pos[1] * hfactor),
                                 2, 2)
 
-    def item_vertex_clicked(self, item):
+    def item_vertex_clicked(self, index):
         self.unselect_all_vertex()
-        self.select_vertex(item.vertex)
+        self.select_vertex(self.vertex_list_w.model().item(index))
 
     def vertex_x_spinner_value_change(self, value):
-        pos = 0
-        for v in self.template.visible_vertex():
-            if v.selected:
-                v.coords = (value, v.coords[1])
-                item_in_list = self.vertex_list_w.item(pos)
-                if item_in_list is not None:
-                    item_in_list.setText(str(v.coords))
-                self.set_dirty_vertex_list()
-            pos = pos + 1
-        self.image_viewer.update()
+        v = self.selected_vertex
+        if v is not None and v.coords[0] != value:
+            self.model.move_vertex(v, (value, v.coords[1]))
+            self.template_changed()
 
     def vertex_y_spinner_value_change(self, value):
-        pos = 0
-        for v in self.template.visible_vertex():
-            if v.selected:
-                v.coords = (v.coords[0], value)
-                item_in_list = self.vertex_list_w.item(pos)
-                if item_in_list is not None:
-                    item_in_list.setText(str(v.coords))
-                self.set_dirty_vertex_list()
-            pos = pos + 1
-        self.image_viewer.update()
+        v = self.selected_vertex
+        if v is not None and v.coords[1] != value:
+            self.model.move_vertex(v, (v.coords[0], value))
+            self.template_changed()
 
     # UI elements actions (faces)
     def faces_image_drawer(self, painter):
@@ -245,15 +263,36 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
         hfactor = self.image_viewer_faces.qimage_scaled.height()
 
         # Draw vertex list
-        for v in self.template.visible_vertex():
+        pen = QPen(QtCore.Qt.GlobalColor.red, 1)
+        painter.setPen(pen)
+        for v in self.model.vertex:
             for i in range(0, self.image_viewer_faces.paint_repeated):
                 for j in range(0, self.image_viewer_faces.paint_repeated):
-                    quad = self.image_viewer_faces.get_quad(i, j)
-                    is_selected = quad in v.selectedInQuads
-                    pen = QPen(QtCore.Qt.GlobalColor.blue if is_selected else QtCore.Qt.GlobalColor.red, 1)
-                    painter.setPen(pen)
                     painter.drawEllipse(QPoint((v.coords[0] + j) * wfactor, (v.coords[1] + i) * hfactor), 2, 2)
 
+        col = QColor(0, 0, 255, 80)
+        col_shadow = QColor(0, 0, 40, 50)
+        for f in self.model.faces:
+            self.draw_face(painter, f, col, col_shadow, wfactor, hfactor)
+
+    def faces_selection_drawer(self, painter):
+        wfactor = self.image_viewer_faces.qimage_scaled.width()
+        hfactor = self.image_viewer_faces.qimage_scaled.height()
+
+        # Draw selected vertex and faces over the cached ones
+        pen = QPen(QtCore.Qt.GlobalColor.blue, 1)
+        painter.setPen(pen)
+        for v in self.selected_faces_vertex:
+            for quad in v.selectedInQuads:
+                i, j = divmod(quad, self.image_viewer_faces.paint_repeated)
+                painter.drawEllipse(QPoint((v.coords[0] + j) * wfactor, (v.coords[1] + i) * hfactor), 2, 2)
+
+        col_sel = QColor(255, 255, 0, 80)
+        col_shadow_sel = QColor(40, 20, 0, 50)
+        if self.selected_face is not None:
+            self.draw_face(painter, self.selected_face, col_sel, col_shadow_sel, wfactor, hfactor)
+
+    def draw_face(self, painter, f, color, color_shadow, wfactor, hfactor):
         def draw_triangle(triangle, color):
             brush = QBrush(color)
             brush.setStyle(QtCore.Qt.BrushStyle.SolidPattern)
@@ -263,30 +302,26 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
         pen = QPen(QtCore.Qt.GlobalColor.blue, 0.3)
         painter.setPen(pen)
 
-        col = QColor(0, 0, 255, 80)
-        col_sel = QColor(255, 255, 0, 80)
-        col_shadow = QColor(0, 0, 40, 50)
-        col_shadow_sel = QColor(40, 20, 0, 50)
-        for f in self.template.faces:
-            face_pol = QPolygon([QPoint((v.coords[0] * wfactor), (v.coords[1] * hfactor)) for v in f.vertex])
-            draw_triangle(face_pol, col if not f.selected else col_sel)
-
-            # draw shadow_faces
-            if self.display_repeated_faces:
-                for i in [-1, 0, 1]:
-                    for j in [-1, 0, 1]:
-                        one_inside_all = False
-                        for v in f.vertex:
-                            if 0 < (v.coords[0] + j) <= 2 and 0 < (v.coords[1] + i) <= 2:
-                                one_inside_all = True
-                        if one_inside_all and not (i == 0 and j == 0):
-                            fp_sh = QPolygon([QPoint(((v.coords[0] + j) * wfactor), ((v.coords[1] + i) * hfactor))
-                                              for v in f.vertex])
-                            draw_triangle(fp_sh, col_shadow if not f.selected else col_shadow_sel)
+        face_pol = QPolygon([QPoint((v.coords[0] * wfactor), (v.coords[1] * hfactor)) for v in f.vertex])
+        draw_triangle(face_pol, color)
+
+        # draw shadow_faces
+        if self.display_repeated_faces:
+            for i in [-1, 0, 1]:
+                for j in [-1, 0, 1]:
+                    one_inside_all = False
+                    for v in f.vertex:
+                        if 0 < (v.coords[0] + j) <= 2 and 0 < (v.coords[1] + i) <= 2:
+                            one_inside_all = True
+                    if one_inside_all and not (i == 0 and j == 0):
+                        fp_sh = QPolygon([QPoint(((v.coords[0] + j) * wfactor), ((v.coords[1] + i) * hfactor))
+                                          for v in f.vertex])
+                        draw_triangle(fp_sh, color_shadow)
 
     def unselect_all_faces_vertex(self):
-        for v in self.template.vertex:
+        for v in self.selected_faces_vertex:
             v.selectedInQuads = []
+        self.selected_faces_vertex = []
         self.image_viewer_faces.update()
         self.unselect_vertex_w.setEnabled(False)
         self.create_face_w.setEnabled(False)
@@ -294,45 +329,94 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
     def create_face(self):
         face_vertex = self.get_selected_face_vertex()
 
-        if len(face_vertex) == 3:
+        if len(face_vertex) in (3, 4):
             self.unselect_all_faces()
-            face = rfsm.RFTemplateFace(face_vertex[0], face_vertex[1], face_vertex[2])
-            face.selected = True
-            self.template.faces.append(face)
+            if len(face_vertex) == 4:
+                # Quad vertex are sorted around the center, so the selection order doesn't matter
+                center_x = sum([v.coords[0] for v in face_vertex]) / 4
+                center_y = sum([v.coords[1] for v in face_vertex]) / 4
+                face_vertex.sort(key=lambda v: atan2(v.coords[1] - center_y, v.coords[0] - center_x))
+            face = self.model.add_face(face_vertex)
             self.unselect_all_faces_vertex()
-            self.update_face_list()
             self.select_face(face)
+            self.template_changed()
         else:
             print("WARN: face_vertex len", len(face_vertex))
 
     def delete_face(self):
-        self.delete_face_w.setEnabled(False)
-        new_face_list = []
-        for f in self.template.faces:
-            if not f.selected:
-                new_face_list.append(f)
-        self.template.faces = new_face_list
-        self.update_face_list()
+        if self.selected_face is not None:
+            self.model.delete_face(self.selected_face)
+            self.unselect_all_faces()
+            self.template_changed()
 
     def change_repeated(self):
         self.display_repeated_faces = self.display_repeated_faces_w.isChecked()
+        self.image_viewer_faces.invalidate_overlay()
         self.image_viewer_faces.update()
 
-    def item_face_clicked(self, item):
+    def item_face_clicked(self, index):
         self.unselect_all_faces()
-        self.select_face(item.face)
+        self.select_face(self.face_list_w.model().item(index))
+
+    # UI elements actions (preview)
+    def schedule_preview(self):
+        """
+        Runs the preview when the template has not changed for a while
+        """
+        self.preview_timer.start()
+
+    def run_preview(self):
+        if self.preview_worker is not None:
+            # Cancels the running preview and runs again when it finishes
+            self.preview_worker.cancel()
+            self.preview_pending = True
+            return
+        self.preview_job_id += 1
+        self.preview_info_w.setText("Generating...")
+        self.preview_worker = PreviewWorker(self.preview_job_id, rfsu.copy_template(self.model.to_template()),
+                                            self.preview_tiles_w.value(), self.preview_skew_w.value(),
+                                            self.preview_fill_w.currentText())
+        self.preview_worker.signals.finished.connect(self.preview_finished)
+        self.preview_worker.signals.failed.connect(self.preview_failed)
+        QtCore.QThreadPool.globalInstance().start(self.preview_worker)
+
+    def preview_finished(self, job_id, result):
+        self.preview_worker = None
+        if self.preview_pending:
+            self.preview_pending = False
+            self.run_preview()
+        elif job_id == self.preview_job_id and result is not None:
+            self.preview_result = result
+            self.preview_info_w.setText(f"{result.vertex_count} vertex\n{result.face_count} faces\n"
+                                        f"{result.elapsed * 1000:.1f} ms")
+            self.update_preview()
+
+    def preview_failed(self, job_id, message):
+        self.preview_worker = None
+        if self.preview_pending:
+            self.preview_pending = False
+            self.run_preview()
+        elif job_id == self.preview_job_id:
+            self.preview_info_w.setText(f"Preview failed:\n{message}")
+
+    def update_preview(self):
+        if self.preview_result is not None:
+            self.qlabel_preview.setPixmap(draw_preview(self.qlabel_preview.size(), self.preview_result))
 
     # System events
     def resizeEvent(self, evt):
         self.image_viewer.on_canvas_change()
         self.image_viewer_faces.on_canvas_change()
+        self.update_preview()
 
     # Common actions
     def select_vertex(self, vertex):
         vertex.selected = True
         vertex.selectedInQuads = []
+        # The spinners are set before the vertex is selected, so their rounding doesn't move it
         self.vertex_x_w.setValue(vertex.coords[0])
         self.vertex_y_w.setValue(vertex.coords[1])
+        self.selected_vertex = vertex
         self.delete_vertex_w.setEnabled(True)
         self.vertex_x_w.setEnabled(True)
         self.vertex_y_w.setEnabled(True)
@@ -340,13 +424,16 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
 
     def select_face_vertex(self, vertex, quad):
         vertex.selectedInQuads.append(quad)
+        if vertex not in self.selected_faces_vertex:
+            self.selected_faces_vertex.append(vertex)
         face_vertex = self.get_selected_face_vertex()
-        self.create_face_w.setEnabled(len(face_vertex) == 3)
+        self.create_face_w.setEnabled(len(face_vertex) in (3, 4))
 
     def unselect_all_vertex(self):
-        for v in self.template.visible_vertex():
-            v.selected = False
-            v.selectedInQuads = []
+        if self.selected_vertex is not None:
+            self.selected_vertex.selected = False
+            self.selected_vertex.selectedInQuads = []
+            self.selected_vertex = None
         self.vertex_x_w.setValue(0)
         self.vertex_y_w.setValue(0)
         self.delete_vertex_w.setEnabled(False)
@@ -354,100 +441,40 @@ class TemplateEditor(QtWidgets.QMainWindow, Ui_MainWindow):
         self.vertex_y_w.setEnabled(False)
 
     def select_face(self, face):
+        self.selected_face = face
         face.selected = True
         self.delete_face_w.setEnabled(True)
         self.image_viewer_faces.update()
 
     def unselect_all_faces(self):
         self.delete_face_w.setEnabled(False)
-        for f in self.template.faces:
-            f.selected = False
+        if self.selected_face is not None:
+            self.selected_face.selected = False
+            self.selected_face = None
 
-    def update_vertex_list(self):
+    def template_changed(self):
+        self.image_viewer.invalidate_overlay()
         self.image_viewer.update()
-        self.vertex_list_w.clear()
-        for v in self.template.visible_vertex():
-            item = QtWidgets.QListWidgetItem(str(v.coords))
-            item.vertex = v
-            self.vertex_list_w.addItem(item)
-
-    def update_face_list(self):
+        self.image_viewer_faces.invalidate_overlay()
         self.image_viewer_faces.update()
-        self.face_list_w.clear()
-        for f in self.template.faces:
-            item = QtWidgets.QListWidgetItem(f"{f.vertex[0].ident}-{f.vertex[1].ident}-{f.vertex[2].ident}")
-            item.face = f
-            self.face_list_w.addItem(item)
+        self.schedule_preview()
 
     def delete_selected(self):
-        self.set_dirty_vertex_list()
-        new_vertex_list = []
-        for v in self.template.visible_vertex():
-            if not v.selected:
-                new_vertex_list.append(v)
-        self.template.vertex = new_vertex_list
-        self.update_vertex_list()
-        self.unselect_all_vertex()
-
-    def calculate_vertex_ids(self):
-        recalculate_faces = False
-        if self.template.total_vertex_count > 0:
-            recalculate_faces = True
-            for v in self.template.vertex:
-                v.last_ident = v.ident
-        self.template.calculate_ids()
-        self.dirty_vertex_ids = False
-        if recalculate_faces:
-            self.template.faces = []
-            for f in self.last_valid_face_list:
-                new_face = []
-                for v_ident in f:
-                    if v_ident < self.last_valid_vertex_count:
-                        for v in self.template.visible_vertex():
-                            if v.last_ident == v_ident:
-                                new_face.append(v)
-                                break
-                    elif v_ident < self.last_valid_vertex_count * 2:
-                        for v in self.template.visible_vertex():
-                            if v.last_ident == v_ident % self.last_valid_vertex_count:
-                                new_face.append(self.template.get_vertex_right(v))
-                                break
-                    elif v_ident < self.last_valid_vertex_count * 3:
-                        for v in self.template.visible_vertex():
-                            if v.last_ident == v_ident % self.last_valid_vertex_count:
-                                new_face.append(self.template.get_vertex_bottom(v))
-                                break
-                    elif v_ident < self.last_valid_vertex_count * 4:
-                        for v in self.template.visible_vertex():
-                            if v.last_ident == v_ident % self.last_valid_vertex_count:
-                                new_face.append(self.template.get_vertex_diag_cell(v))
-                                break
-                if len(new_face) == 3:
-                    face = rfsm.RFTemplateFace(new_face[0], new_face[1], new_face[2])
-                    face.selected = False
-                    self.template.faces.append(face)
-
-    def set_dirty_vertex_list(self):
-        if not self.dirty_vertex_ids:
-            self.dirty_vertex_ids = True
-            self.last_valid_face_list = [[v.ident for v in f.vertex] for f in self.template.faces]
-            self.last_valid_vertex_count = len(self.template.visible_vertex())
-            self.template.vertex = self.template.visible_vertex()
-            self.template.vertex_count = 0
-            self.template.faces = []
+        if self.selected_vertex is not None:
+            if self.selected_vertex in self.selected_faces_vertex:
+                self.selected_faces_vertex.remove(self.selected_vertex)
+            self.model.delete_vertex(self.selected_vertex)
+            self.unselect_all_vertex()
+            self.unselect_all_faces()
+            self.template_changed()
 
     def get_selected_face_vertex(self):
         face_vertex = []
-        for v in self.template.visible_vertex():
+        # In template order, as the faces were created when every vertex was scanned
+        for v in sorted(self.selected_faces_vertex, key=lambda v: v.row):
             for q in v.selectedInQuads:
-                if q == 0:
-                    face_vertex.append(v)
-                elif q == 1:
-                    face_vertex.append(self.template.get_vertex_right(v))
-                elif q == 2:
-                    face_vertex.append(self.template.get_vertex_bottom(v))
-                elif q == 3:
-                    face_vertex.append(self.template.get_vertex_diag_cell(v))
+                if 0 <= q <= 3:
+                    face_vertex.append(self.model.get_vertex_cell(v, q))
                 else:
                     print("WARN: QUAD ", q)
         return face_vertex
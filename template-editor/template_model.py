@@ -0,0 +1,203 @@
+from roofeus import models as rfsm
+from roofeus import utils as rfsu
+from spatial_index import SpatialGrid, bounding_box
+
+CELL_SUFFIX = ("", "r", "b", "d")  # Template file suffix of the vertex copies in each cell
+
+
+class TemplateModel:
+    """
+    Template being edited. Every vertex keeps its copies in the right, bottom and diagonal cells, and faces keep
+    the vertex objects they use, so adding, moving or deleting a vertex only updates that vertex, its copies and its
+    faces. The ids of a RFTemplate are only assigned when one is built (to_template).
+    Listeners (vertex_listeners, face_listeners) are notified of the rows that change: begin_insert(row),
+    end_insert(), begin_remove(row), end_remove(), row_changed(row), begin_reset() and end_reset()
+    """
+    def __init__(self):
+        self.row_shift = 0.0  # float
+        self.vertex = []  # RFTemplateVertex[] - visible vertex
+        self.faces = []  # RFTemplateFace[]
+        self.vertex_index = SpatialGrid()  # visible vertex
+        self.face_index = SpatialGrid()  # faces by their bounding box
+        self.vertex_listeners = []
+        self.face_listeners = []
+
+    # Loading and building templates
+    def load(self, template):
+        """
+        Replaces the edited template
+        :param template: RFTemplate with its ids calculated (as read by read_template)
+        """
+        self.__notify(self.vertex_listeners + self.face_listeners, 'begin_reset')
+        self.row_shift = template.row_shift
+        self.vertex = []
+        self.faces = []
+        self.vertex_index.clear()
+        self.face_index.clear()
+        for v in template.visible_vertex():
+            cells = [v, template.get_vertex_right(v), template.get_vertex_bottom(v), template.get_vertex_diag_cell(v)]
+            self.__init_vertex(v, cells)
+            self.vertex.append(v)
+        for face in template.faces:
+            self.__init_face(face)
+            self.faces.append(face)
+        self.__notify(self.vertex_listeners + self.face_listeners, 'end_reset')
+
+    def to_template(self):
+        """
+        Builds a RFTemplate with the edited vertex and faces (the objects are shared, their ids are updated)
+        :return: RFTemplate
+        """
+        template = rfsm.RFTemplate()
+        template.row_shift = self.row_shift
+        template.vertex_count = len(self.vertex)
+        for cell in range(0, 4):
+            template.vertex.extend([v.cells[cell] for v in self.vertex])
+        for ident, v in enumerate(template.vertex):
+            v.ident = ident
+        template.total_vertex_count = len(template.vertex)
+        template.faces = list(self.faces)
+        return template
+
+    # Vertex edition
+    def add_vertex(self, x, y):
+        """
+        Adds a visible vertex and its copies
+        :return: RFTemplateVertex - new vertex
+        """
+        vertex = rfsm.RFTemplateVertex(x, y)
+        cells = [vertex] + [rfsm.RFTemplateVertex(x, y) for _ in range(0, 3)]
+        self.__init_vertex(vertex, cells)
+        row = len(self.vertex)
+        self.__notify(self.vertex_listeners, 'begin_insert', row)
+        self.vertex.append(vertex)
+        self.__notify(self.vertex_listeners, 'end_insert')
+        return vertex
+
+    def move_vertex(self, vertex, coords):
+        """
+        Moves a visible vertex with its copies, and updates the faces that use it
+        :param vertex: visible RFTemplateVertex
+        :param coords: (x, y) - new position
+        """
+        for cell, v in enumerate(vertex.cells):
+            v.coords = self.__cell_coords(coords, cell)
+        self.vertex_index.move_point(vertex, vertex.coords)
+        for face in vertex.faces:
+            self.__index_face(face, move=True)
+        self.__notify(self.vertex_listeners, 'row_changed', vertex.row)
+
+    def delete_vertex(self, vertex):
+        """
+        Deletes a visible vertex with its copies and the faces that use it. The next vertex move up one row, so the
+        template keeps its order and only the ids after the vertex change (to_template)
+        :param vertex: visible RFTemplateVertex
+        """
+        for face in list(vertex.faces):
+            self.delete_face(face)
+        self.vertex_index.remove(vertex)
+        row = vertex.row
+        self.__notify(self.vertex_listeners, 'begin_remove', row)
+        self.vertex.pop(row)
+        for v in self.vertex[row:]:
+            v.row -= 1
+        self.__notify(self.vertex_listeners, 'end_remove')
+        # The labels of the faces using the next vertex include their rows
+        changed_faces = {face.row for v in self.vertex[row:] for face in v.faces}
+        for face_row in sorted(changed_faces):
+            self.__notify(self.face_listeners, 'row_changed', face_row)
+
+    # Face edition
+    def add_face(self, face_vertex):
+        """
+        Adds a face
+        :param face_vertex: RFTemplateVertex[3 or 4] - visible vertex or copies
+        :return: RFTemplateFace - new face
+        """
+        face = rfsm.RFTemplateFace(*face_vertex)
+        self.__init_face(face)
+        self.__notify(self.face_listeners, 'begin_insert', len(self.faces))
+        self.faces.append(face)
+        self.__notify(self.face_listeners, 'end_insert')
+        return face
+
+    def delete_face(self, face):
+        """
+        Deletes a face. The next faces move up one row, keeping their order
+        :param face: RFTemplateFace
+        """
+        for base in self.__face_base_vertex(face):
+            base.faces.remove(face)
+        self.face_index.remove(face)
+        row = face.row
+        self.__notify(self.face_listeners, 'begin_remove', row)
+        self.faces.pop(row)
+        for f in self.faces[row:]:
+            f.row -= 1
+        self.__notify(self.face_listeners, 'end_remove')
+
+    # Queries
+    @staticmethod
+    def get_vertex_cell(vertex, cell):
+        """
+        Returns the copy of a visible vertex in a cell
+        :param vertex: visible RFTemplateVertex
+        :param cell: 0 (same cell), 1 (right), 2 (bottom) or 3 (diagonal)
+        :return: RFTemplateVertex
+        """
+        return vertex.cells[cell]
+
+    @staticmethod
+    def vertex_label(vertex):
+        """
+        Text of a vertex in the template file notation (row and cell suffix), which only changes when the row does
+        """
+        return f"{vertex.base.row}{CELL_SUFFIX[vertex.cell]}"
+
+    def face_label(self, face):
+        return "-".join([self.vertex_label(v) for v in face.vertex])
+
+    # Private
+    def __cell_coords(self, coords, cell):
+        dx, dy = ((0, 0), (1, 0), (0, 1), (1, 1))[cell]
+        return coords[0] + dx + self.row_shift * dy, coords[1] + dy
+
+    def __init_vertex(self, vertex, cells):
+        vertex.cells = cells  # RFTemplateVertex[4] - the vertex and its copies
+        vertex.faces = []  # RFTemplateFace[] using the vertex or its copies
+        vertex.row = len(self.vertex)
+        vertex.selected = False
+        vertex.selectedInQuads = []
+        for cell, v in enumerate(cells):
+            v.base = vertex
+            v.cell = cell
+            v.coords = self.__cell_coords(vertex.coords, cell)
+        self.vertex_index.insert_point(vertex, vertex.coords)
+
+    def __init_face(self, face):
+        face.row = len(self.faces)
+        face.selected = False
+        for base in self.__face_base_vertex(face):
+            base.faces.append(face)
+        self.__index_face(face)
+
+    def __index_face(self, face, move=False):
+        coords = [v.coords for v in face.vertex]
+        face.polygon = rfsu.Polygon(coords)
+        if move:
+            self.face_index.move(face, bounding_box(coords))
+        else:
+            self.face_index.insert(face, bounding_box(coords))
+
+    @staticmethod
+    def __face_base_vertex(face):
+        bases = []
+        for v in face.vertex:
+            if v.base not in bases:
+                bases.append(v.base)
+        return bases
+
+    @staticmethod
+    def __notify(listeners, method, *args):
+        for listener in listeners:
+            getattr(listener, method)(*args)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import roofeus and compare_engines from the repository root, without blender (see headless/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,56 @@
+import random
+import threading
+
+import pytest
+
+import compare_engines as ce
+import roofeus.roofeus as rfs
+
+
+class CountingEvent(threading.Event):
+    """
+    Event that gets set after being checked a number of times
+    """
+    def __init__(self, checks_before_set):
+        threading.Event.__init__(self)
+        self.checks_before_set = checks_before_set
+        self.checks = 0
+
+    def is_set(self):
+        self.checks += 1
+        if self.checks > self.checks_before_set:
+            self.set()
+        return threading.Event.is_set(self)
+
+
+def generate_case():
+    rng = random.Random(11)
+    return ce.grid_template(3, 0.25), ce.create_target(ce.random_polygon(rng, 12), rng)
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+@pytest.mark.parametrize("fill_uncompleted", ['border', 'vertex'])
+def test_cancel_while_building_faces(fill_uncompleted, vectorized):
+    template, target = generate_case()
+    never = CountingEvent(10 ** 9)
+    output = rfs.create_mesh(template, target, fill_uncompleted, cancelled=never, vectorized=vectorized)
+    assert ce.output_signature(output) == \
+        ce.output_signature(rfs.create_mesh(template, target, fill_uncompleted, vectorized=vectorized))
+    # Between the 2 first steps and inside the face loops, not only after them
+    assert never.checks > 5
+
+    cancelled = CountingEvent(3)
+    assert rfs.create_mesh(template, target, fill_uncompleted, cancelled=cancelled, vectorized=vectorized) is None
+    assert cancelled.checks <= 5
+
+
+def test_cancel_while_filling_to_vertex():
+    template, target = generate_case()
+    vertex_list, structure = rfs.transform_to_3d_mesh(target, rfs.create_2d_mesh(template, target))
+    faces, _faces_idx, bounding_edge_list, _border_vertex = rfs.build_faces(structure, template, vertex_list, target,
+                                                                            'vertex')
+    assert len(bounding_edge_list) > 0
+    cancelled = CountingEvent(1)
+    assert rfs.fill_to_vertex(vertex_list, faces, target, bounding_edge_list=bounding_edge_list,
+                              cancelled=cancelled) == []
+    assert cancelled.checks == 2
@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+import compare_engines as ce
+
+FILL_MODES = ['border', 'vertex', 'none']
+TOLERANCE = 1e-4
+
+# Random and adversarial cases (concave and star targets, row-shifted templates...) and fixed concave ones
+CASES = ce.generate_cases(30, 7) + [
+    ('grid template, concave pentagon', ce.grid_template(3), [(3, 2), (0, 6), (0, 0), (6, 0), (6, 6)], 0.1),
+    ('grid template shifted 0.50, star', ce.grid_template(2, 0.5), ce.star_polygon(random.Random(1), 3), 0.2),
+    ('random template shifted 0.25, star', ce.shifted_template(ce.random_template(random.Random(2)), 0.25),
+     ce.star_polygon(random.Random(3), 2.5), 0.3),
+]
+
+
+@pytest.mark.parametrize("fill_uncompleted", FILL_MODES)
+@pytest.mark.parametrize("engine", sorted(ce.ENGINES.keys()))
+@pytest.mark.parametrize("case", CASES, ids=[f"case{k}" for k in range(0, len(CASES))])
+def test_engine_matches_reference(case, engine, fill_uncompleted):
+    description, template, uvs, target_seed = case
+    target = ce.create_target(uvs, random.Random(target_seed))
+    reference, reference_error, _elapsed = ce.run_engine(ce.REFERENCE, template, target, fill_uncompleted)
+    if reference_error is not None:
+        pytest.skip(f"{description}: the reference fails ({reference_error})")
+    snapshot, engine_error, _elapsed = ce.run_engine(ce.ENGINES[engine], template, target, fill_uncompleted)
+    assert engine_error is None, description
+    assert ce.compare(reference, snapshot, target, TOLERANCE) == [], description
+
+
+def test_concurrent_generation():
+    assert ce.check_concurrent_generation(CASES, FILL_MODES, 4) == 0
@@ -0,0 +1,57 @@
+import random
+from math import cos, sin, pi
+
+import compare_engines as ce
+import roofeus.models as rfsm
+import roofeus.roofeus as rfs
+
+FILL_MODES = ['border', 'vertex', 'none']
+
+
+def generate_targets():
+    rng = random.Random(8)
+    # Corners off the template vertex (the reference can't handle target edges over template edges)
+    targets = [ce.create_target([(u + 0.13, v + 0.27) for u, v in [(0, 0), (6, 0), (6, 6), (0, 6)]], rng),
+               ce.create_target([(u + 0.13, v + 0.27) for u, v in [(3, 2), (0, 6), (0, 0), (6, 0), (6, 6)]], rng)]
+    for n, radius, angle in [(3, 5, 0.3), (6, 4, 0.1), (8, 6, 0.7)]:
+        targets.append(ce.create_target([(radius * cos(angle + 2 * pi * k / n), radius * sin(angle + 2 * pi * k / n))
+                                         for k in range(0, n)], rng))
+    return targets
+
+
+def test_estimate_bounds():
+    for template in [ce.grid_template(2), ce.grid_template(3, 0.5), ce.random_template(random.Random(9))]:
+        for target in generate_targets():
+            for fill_uncompleted in FILL_MODES:
+                estimate = rfs.estimate_mesh_size(template, target, fill_uncompleted)
+                output = rfs.create_mesh(template, target, fill_uncompleted)
+                vertex_count = rfs.mesh_vertex_count(*output, target)
+                face_count = len([f for f in output[1] if len(f) >= 3])
+                assert 0.75 * vertex_count <= estimate.vertex_count <= 1.33 * vertex_count
+                assert 0.75 * face_count <= estimate.face_count <= 1.33 * face_count
+                assert estimate.seconds > 0
+
+
+def test_estimate_grows_with_the_uv_scale():
+    template = ce.grid_template(2)
+    target = generate_targets()[0]
+    counts = [rfs.estimate_mesh_size(template, rfs.scale_target(target, scale)).vertex_count
+              for scale in [0.5, 1, 2, 4]]
+    assert counts == sorted(counts)
+    quadratic, linear, constant = rfs.estimate_vertex_terms(template, target)
+    assert quadratic > 0 and linear > 0 and constant == len(target)
+
+
+def test_estimate_of_an_empty_template():
+    template = rfsm.RFTemplate()
+    template.calculate_ids()
+    estimate = rfs.estimate_mesh_size(template, generate_targets()[0])
+    assert (estimate.vertex_count, estimate.face_count, estimate.seconds) == (0, 0, 0.0)
+
+
+def test_mesh_for_budget():
+    template = ce.grid_template(3)
+    target = generate_targets()[1]
+    for budget in [500, 2000]:
+        _scale, scaled, output = rfs.create_mesh_for_budget(template, target, budget, 'border', tolerance=0.05)
+        assert abs(rfs.mesh_vertex_count(*output, scaled) - budget) <= 0.05 * budget
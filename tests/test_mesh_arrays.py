@@ -0,0 +1,46 @@
+import random
+
+import numpy as np
+
+import compare_engines as ce
+import roofeus.models as rfsm
+import roofeus.roofeus as rfs
+from roofeus.mesh_arrays import mesh_to_arrays
+
+
+def row_coords(arrays, row):
+    return tuple(arrays.positions[row].tolist())
+
+
+def test_compact_keeps_bounding_edges():
+    target = [rfsm.RFTargetVertex(0, 0, 0, 0, 0, -1), rfsm.RFTargetVertex(1, 0, 0, 1, 0, -2),
+              rfsm.RFTargetVertex(0, 1, 0, 0, 1, -3)]
+    vertex_list = [rfsm.RFVertexData(0, (0.1, 0.1), (0.1, 0.1, 0), True),
+                   rfsm.RFVertexData(1, (0.5, 0.0), (0.5, 0.0, 0), True),
+                   rfsm.RFVertexData(2, (0.0, 0.5), (0.0, 0.5, 0), True),
+                   rfsm.RFVertexData(3, (2.0, 2.0), (2.0, 2.0, 0), False)]
+    faces = [[0, -1, -2], [1, 2]]  # The second face is incomplete, so vertex 1 and 2 are only in the bounding edge
+    arrays = mesh_to_arrays(vertex_list, faces, [(1, 2), (-1, 1), (2, 3)], target)
+    assert arrays.generated_count == 3
+    assert len(arrays.face_sizes) == 1
+    edges = [(row_coords(arrays, a), row_coords(arrays, b)) for a, b in arrays.bounding_edges.tolist()]
+    assert edges == [((0.5, 0.0, 0.0), (0.0, 0.5, 0.0)), ((0.0, 0.0, 0.0), (0.5, 0.0, 0.0))]
+
+
+def test_compact_keeps_every_bounding_edge_inside():
+    rng = random.Random(8)
+    template = ce.grid_template(3, 0.25)
+    for _ in range(10):
+        target = ce.create_target(ce.random_polygon(rng, 3), rng)
+        for fill_uncompleted in ('none', 'vertex'):
+            vertex_list, faces, bounding_edge_list = rfs.create_mesh(template, target, fill_uncompleted)
+            arrays = mesh_to_arrays(vertex_list, faces, bounding_edge_list, target)
+
+            def coords(i):
+                coords_3d = vertex_list[i].coords_3d if i >= 0 else target[-1 - i].coords
+                return tuple(np.asarray(coords_3d, dtype=np.float32).tolist())  # As stored in the positions
+
+            expected = [(coords(a), coords(b)) for a, b in bounding_edge_list
+                        if all(i < 0 or vertex_list[i].inside for i in (a, b))]
+            got = [(row_coords(arrays, a), row_coords(arrays, b)) for a, b in arrays.bounding_edges.tolist()]
+            assert got == expected
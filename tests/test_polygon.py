@@ -0,0 +1,25 @@
+import random
+
+import roofeus.utils as rfsu
+
+
+def random_coord(rng):
+    # Points over the corners and the edges of the unit square are common in the templates
+    return rng.choice([0, 0.5, 1, rng.uniform(-2, 2)])
+
+
+def test_contains_many_matches_contains():
+    rng = random.Random(3)
+    for _ in range(500):
+        polygon = rfsu.Polygon([(random_coord(rng), random_coord(rng)) for _ in range(rng.choice([3, 4, 5, 6]))])
+        points = [(random_coord(rng), random_coord(rng)) for _ in range(40)]
+        try:
+            expected = [polygon.contains(p) for p in points]
+        except ZeroDivisionError:
+            continue  # Degenerated triangles the point by point check can't handle either
+        inside_list, triangle_list = polygon.contains_many(points)
+        assert list(zip(inside_list, triangle_list)) == expected
+
+
+def test_contains_many_empty():
+    assert rfsu.Polygon([(0, 0), (1, 0), (1, 1), (0, 1)]).contains_many([]) == ([], [])
@@ -0,0 +1,94 @@
+import random
+
+import numpy as np
+
+import compare_engines as ce
+import roofeus.roofeus as rfs
+from roofeus.mesh_arrays import mesh_to_arrays
+from roofeus.mesh_sinks import PlySink, NpySink
+
+
+def generate_targets():
+    rng = random.Random(4)
+    return ce.grid_template(3), [ce.create_target(ce.random_polygon(rng, 2), rng),
+                                 ce.create_target(ce.star_polygon(rng, 2), rng)]
+
+
+def expected_arrays(template, targets, fill_uncompleted):
+    """
+    Positions, uvs, face indices and face sizes of every output, one after another (like the sinks write them)
+    """
+    positions, uvs, indices, sizes = [], [], [], []
+    vertex_count = 0
+    for target in targets:
+        arrays = mesh_to_arrays(*rfs.create_mesh(template, target, fill_uncompleted), target)
+        positions.append(arrays.positions)
+        uvs.append(arrays.uvs)
+        indices.append(arrays.face_indices + vertex_count)
+        sizes.append(arrays.face_sizes)
+        vertex_count += len(arrays.positions)
+    return np.concatenate(positions), np.concatenate(uvs), np.concatenate(indices), np.concatenate(sizes)
+
+
+def read_ply(filename):
+    """
+    Reads the binary PLY files written by PlySink
+    :return: vertex (float32[N, 5] - x, y, z, s, t), face indices and face sizes
+    """
+    with open(filename, 'rb') as f:
+        data = f.read()
+    header_end = data.index(b"end_header\n") + len(b"end_header\n")
+    header = data[:header_end].decode('ascii').split("\n")
+    assert header[1] == "format binary_little_endian 1.0"
+    vertex_count = int([line for line in header if line.startswith("element vertex")][0].split()[2])
+    face_count = int([line for line in header if line.startswith("element face")][0].split()[2])
+    vertex = np.frombuffer(data, dtype='<f4', count=vertex_count * 5, offset=header_end).reshape(-1, 5)
+    position = header_end + vertex_count * 5 * 4
+    indices, sizes = [], []
+    for _ in range(0, face_count):
+        size = data[position]
+        indices.extend(np.frombuffer(data, dtype='<i4', count=size, offset=position + 1).tolist())
+        sizes.append(size)
+        position += 1 + size * 4
+    assert position == len(data)
+    return vertex, np.array(indices), np.array(sizes)
+
+
+def test_ply_sink_round_trip(tmp_path):
+    template, targets = generate_targets()
+    for fill_uncompleted in ['border', 'vertex']:
+        filename = str(tmp_path / f"{fill_uncompleted}.ply")
+        with PlySink(filename) as sink:
+            assert rfs.create_meshes(template, targets, fill_uncompleted, sink=sink) is None
+        positions, uvs, indices, sizes = expected_arrays(template, targets, fill_uncompleted)
+        vertex, ply_indices, ply_sizes = read_ply(filename)
+        np.testing.assert_array_equal(vertex[:, :3], positions)
+        np.testing.assert_array_equal(vertex[:, 3:], uvs)
+        np.testing.assert_array_equal(ply_indices, indices)
+        np.testing.assert_array_equal(ply_sizes, sizes)
+
+
+def test_npy_sink_round_trip(tmp_path):
+    template, targets = generate_targets()
+    for fill_uncompleted in ['border', 'vertex']:
+        prefix = str(tmp_path / fill_uncompleted)
+        with NpySink(prefix) as sink:
+            assert rfs.create_meshes(template, targets, fill_uncompleted, sink=sink) is None
+        positions, uvs, indices, sizes = expected_arrays(template, targets, fill_uncompleted)
+        np.testing.assert_array_equal(np.load(f"{prefix}_positions.npy", mmap_mode='r'), positions)
+        np.testing.assert_array_equal(np.load(f"{prefix}_uvs.npy", mmap_mode='r'), uvs)
+        np.testing.assert_array_equal(np.load(f"{prefix}_indices.npy", mmap_mode='r'), indices)
+        offsets = np.load(f"{prefix}_offsets.npy", mmap_mode='r')
+        assert offsets[0] == 0
+        np.testing.assert_array_equal(np.diff(offsets), sizes)
+
+
+def test_vectorized_sink_matches_reference(tmp_path):
+    template, targets = generate_targets()
+    with NpySink(str(tmp_path / "reference")) as sink:
+        rfs.create_meshes(template, targets, 'border', sink=sink)
+    with NpySink(str(tmp_path / "vectorized")) as sink:
+        rfs.create_meshes(template, targets, 'border', sink=sink, vectorized=True)
+    for name in ['positions', 'uvs', 'indices', 'offsets']:
+        np.testing.assert_array_equal(np.load(str(tmp_path / f"reference_{name}.npy")),
+                                      np.load(str(tmp_path / f"vectorized_{name}.npy")))
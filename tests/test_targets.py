@@ -0,0 +1,21 @@
+import roofeus.models as rfsm
+import roofeus.roofeus as rfs
+import compare_engines as ce
+
+
+def test_context_ids():
+    context = rfsm.RFTargetContext()
+    target = [context.create_vertex(u, v, 0, u, v) for u, v in [(0.1, 0.1), (2.1, 0.2), (1.3, 2.2)]]
+    assert [tv.ident for tv in target] == [-1, -2, -3]
+    assert rfsm.RFTargetContext().create_vertex(0, 0, 0, 0, 0).ident == -1
+
+
+def test_positional_target_vertex():
+    # Targets built as in previous versions: ids from the class counter
+    rfsm.RFTargetVertex.reset_index()
+    legacy = [rfsm.RFTargetVertex(u, v, 0, u, v) for u, v in [(0.1, 0.1), (2.1, 0.2), (1.3, 2.2)]]
+    assert [tv.ident for tv in legacy] == [-1, -2, -3]
+    context = rfsm.RFTargetContext()
+    target = [context.create_vertex(*tv.coords, *tv.uvs) for tv in legacy]
+    assert ce.output_signature(rfs.create_mesh(ce.grid_template(2), legacy, 'border')) == \
+        ce.output_signature(rfs.create_mesh(ce.grid_template(2), target, 'border'))
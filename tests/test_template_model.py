@@ -0,0 +1,67 @@
+import os
+import sys
+
+import compare_engines as ce
+import roofeus.utils as rfsu
+
+# The template model doesn't need Qt, only the editor spatial index
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "template-editor"))
+from template_model import TemplateModel  # noqa: E402
+
+
+class RowListener:
+    def __init__(self):
+        self.events = []
+
+    def __getattr__(self, method):
+        return lambda *args: self.events.append((method,) + args)
+
+
+def load_model():
+    model = TemplateModel()
+    model.load(ce.grid_template(3, 0.25))
+    return model
+
+
+def face_coords(template):
+    return [[v.coords for v in f.vertex] for f in template.faces]
+
+
+def face_ids(template):
+    return [[v.ident for v in f.vertex] for f in template.faces]
+
+
+def test_delete_face_keeps_order():
+    model = load_model()
+    expected = face_coords(model.to_template())
+    listener = RowListener()
+    model.face_listeners.append(listener)
+    model.delete_face(model.faces[2])
+    del expected[2]
+    assert listener.events == [('begin_remove', 2), ('end_remove',)]
+    assert face_coords(model.to_template()) == expected
+    assert [f.row for f in model.faces] == list(range(len(model.faces)))
+
+
+def test_delete_vertex_keeps_order():
+    model = load_model()
+    count = len(model.vertex)
+    old = model.to_template()
+    vertex = model.vertex[4]
+    coords = [v.coords for v in model.vertex if v is not vertex]
+    kept = [f.row for f in model.faces if f not in vertex.faces]
+    faces = [face_coords(old)[row] for row in kept]
+    # The ids after the deleted vertex are one lower, in every cell
+    ids = [[(ident // count) * (count - 1) + ident % count - (ident % count > 4) for ident in face_ids(old)[row]]
+           for row in kept]
+    listener = RowListener()
+    model.vertex_listeners.append(listener)
+    model.delete_vertex(vertex)
+    assert listener.events == [('begin_remove', 4), ('end_remove',)]
+    assert [v.coords for v in model.vertex] == coords
+    assert [v.row for v in model.vertex] == list(range(len(model.vertex)))
+    template = model.to_template()
+    assert face_coords(template) == faces
+    assert face_ids(template) == ids
+    assert rfsu.template_lines(template)[1:len(coords) + 1] == rfsu.template_lines(old)[1:5] + \
+        rfsu.template_lines(old)[6:count + 1]
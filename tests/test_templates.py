@@ -0,0 +1,53 @@
+import os
+import random
+
+import compare_engines as ce
+import roofeus.roofeus as rfs
+import roofeus.utils as rfsu
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def assert_same_template(template, read):
+    assert read.row_shift == template.row_shift
+    assert [v.coords for v in read.vertex] == [v.coords for v in template.vertex]
+    assert [sorted([v.ident for v in f.vertex]) for f in read.faces] == \
+        [sorted([v.ident for v in f.vertex]) for f in template.faces]  # The file has counter-clockwise faces
+    assert rfsu.template_lines(read) == rfsu.template_lines(template)
+    assert rfsu.template_hash(read) == rfsu.template_hash(template)
+
+
+def test_template_round_trip_with_shift(tmp_path):
+    for k, template in enumerate([ce.grid_template(2, 0.25), ce.grid_template(3, 0.5),
+                                  ce.shifted_template(ce.random_template(random.Random(5)), 1 / 3)]):
+        filename = str(tmp_path / f"template{k}.txt")
+        rfsu.write_template(filename, template)
+        with open(filename) as f:
+            assert f.readline().strip() == f"shift,{template.row_shift}"
+        assert_same_template(template, rfsu.read_template(filename))
+
+
+def test_template_round_trip_without_shift(tmp_path):
+    template = ce.random_template(random.Random(6))
+    filename = str(tmp_path / "template.txt")
+    rfsu.write_template(filename, template)
+    with open(filename) as f:
+        assert not any([line.startswith("shift") for line in f])
+    assert_same_template(template, rfsu.read_template(filename))
+
+
+def test_shifted_template_moves_the_next_rows():
+    template = ce.grid_template(1, 0.25)
+    v = template.vertex[0]
+    assert template.get_vertex_bottom(v).coords == (v.coords[0] + 0.25, v.coords[1] + 1.0)
+    assert template.get_vertex_diag_cell(v).coords == (v.coords[0] + 1.25, v.coords[1] + 1.0)
+
+
+def test_quad_pairs_use_every_triangle():
+    # The face order pairing left 2 triangles of the example template alone
+    for template in [rfsu.read_template(os.path.join(REPOSITORY, "images", "Template.txt")), ce.grid_template(3)]:
+        pairs = rfs.find_quad_pairs(template)
+        paired = sorted([fi for fi, _fj, _quad in pairs] + [fj for _fi, fj, _quad in pairs])
+        assert paired == list(range(0, len(template.faces)))
+        for _fi, _fj, quad in pairs:
+            assert rfsu.is_convex([v.coords for v in quad.vertex])